@@ -44,6 +44,7 @@ LOGOUT_REDIRECT_URL = 'login'
 # MIDDLEWARE
 # -----------------------------
 MIDDLEWARE = [
+    'smsapp.middleware.MetricsMiddleware',  # first, so it times everything below
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # for serving static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -124,6 +125,17 @@ EMAIL_HOST_USER = config('EMAIL_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_PASS')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# -----------------------------
+# SMS PROVIDER
+# -----------------------------
+# smsapp.providers.celcom.CelcomProvider (real sends) or
+# smsapp.providers.locmem.InMemoryProvider (no network, for tests/load tests).
+# For the HTTP stand-in, keep Celcom and point CELCOM_API_URL at `manage.py sms_standin`.
+SMS_PROVIDER_BACKEND = config("SMS_PROVIDER_BACKEND", default="smsapp.providers.celcom.CelcomProvider")
+SMS_STUB_LATENCY = config("SMS_STUB_LATENCY", default=0.0, cast=float)  # seconds per stub call
+SMS_STUB_FAILURE_RATE = config("SMS_STUB_FAILURE_RATE", default=0.0, cast=float)  # 0-1, retryable errors
+SMS_STUB_CREDIT = config("SMS_STUB_CREDIT", default=1000000.0, cast=float)  # starting stub balance
+
 # -----------------------------
 # CELCOM API CONFIGURATION
 # -----------------------------
@@ -131,6 +143,94 @@ CELCOM_PARTNER_ID = config('CELCOM_PARTNER_ID')
 CELCOM_API_KEY = config('CELCOM_API_KEY')
 CELCOM_API_URL = config("CELCOM_API_URL")
 CELCOM_BALANCE_URL = config("CELCOM_API_BALANCE_URL")
+CELCOM_CHUNK_SIZE = config("CELCOM_CHUNK_SIZE", default=100, cast=int)  # recipients per request
+CELCOM_CONCURRENCY = config("CELCOM_CONCURRENCY", default=4, cast=int)  # requests in flight
+CELCOM_POOL_SIZE = config("CELCOM_POOL_SIZE", default=CELCOM_CONCURRENCY, cast=int)  # keep-alive connections
+CELCOM_ASYNC_DISPATCH = config("CELCOM_ASYNC_DISPATCH", default=False, cast=bool)  # worker sends on asyncio/httpx
+CELCOM_ASYNC_CONCURRENCY = config("CELCOM_ASYNC_CONCURRENCY", default=100, cast=int)  # async requests in flight
+CELCOM_CONNECT_TIMEOUT = config("CELCOM_CONNECT_TIMEOUT", default=5.0, cast=float)  # seconds
+CELCOM_SEND_TIMEOUT = config("CELCOM_SEND_TIMEOUT", default=15.0, cast=float)
+CELCOM_BALANCE_TIMEOUT = config("CELCOM_BALANCE_TIMEOUT", default=10.0, cast=float)
+CELCOM_MAX_RETRIES = config("CELCOM_MAX_RETRIES", default=2, cast=int)  # connection errors only
+CELCOM_SEND_RETRIES = config("CELCOM_SEND_RETRIES", default=3, cast=int)  # per failed chunk
+CELCOM_RETRY_BACKOFF = config("CELCOM_RETRY_BACKOFF", default=1.0, cast=float)  # seconds, doubled per attempt
+CELCOM_RETRY_BACKOFF_MAX = config("CELCOM_RETRY_BACKOFF_MAX", default=30.0, cast=float)
+CELCOM_MAX_REQUESTS_PER_SECOND = config("CELCOM_MAX_REQUESTS_PER_SECOND", default=10.0, cast=float)  # all processes together; 0 = unlimited
+CELCOM_MAX_RECIPIENTS_PER_SECOND = config("CELCOM_MAX_RECIPIENTS_PER_SECOND", default=500.0, cast=float)  # all processes together; 0 = unlimited
+CELCOM_RATE_BURST_SECONDS = config("CELCOM_RATE_BURST_SECONDS", default=1.0, cast=float)  # bucket size in seconds of rate
+CELCOM_CIRCUIT_FAILURE_THRESHOLD = config("CELCOM_CIRCUIT_FAILURE_THRESHOLD", default=5, cast=int)  # consecutive failures
+CELCOM_CIRCUIT_RESET_TIMEOUT = config("CELCOM_CIRCUIT_RESET_TIMEOUT", default=30.0, cast=float)  # seconds open before a probe
+CELCOM_CIRCUIT_HALF_OPEN_CALLS = config("CELCOM_CIRCUIT_HALF_OPEN_CALLS", default=1, cast=int)
+CELCOM_DLR_TOKEN = config("CELCOM_DLR_TOKEN", default="")  # shared secret for the delivery report webhook; required
+DLR_BATCH_SIZE = config("DLR_BATCH_SIZE", default=500, cast=int)  # reports per bulk UPDATE flush
+DLR_FLUSH_INTERVAL = config("DLR_FLUSH_INTERVAL", default=2.0, cast=float)  # max seconds a report waits
+DLR_UNMATCHED_TTL = config("DLR_UNMATCHED_TTL", default=86400, cast=int)  # seconds an unmatched report is kept
+CELCOM_BALANCE_TTL = config("CELCOM_BALANCE_TTL", default=300, cast=int)  # seconds before a refresh
+CELCOM_BALANCE_MAX_STALE = config("CELCOM_BALANCE_MAX_STALE", default=86400, cast=int)  # seconds kept at all
+
+# -----------------------------
+# SMS JOB QUEUE
+# -----------------------------
+SMS_WORKER_POLL_INTERVAL = config("SMS_WORKER_POLL_INTERVAL", default=2.0, cast=float)
+SMS_JOB_STALE_AFTER = config("SMS_JOB_STALE_AFTER", default=900, cast=int)  # seconds without a worker heartbeat
+SMS_LOG_BATCH_SIZE = config("SMS_LOG_BATCH_SIZE", default=1000, cast=int)  # rows per bulk INSERT
+
+# -----------------------------
+# SMS LOG RETENTION
+# -----------------------------
+SMS_LOG_RETENTION_DAYS = config("SMS_LOG_RETENTION_DAYS", default=180, cast=int)  # raw logs kept
+SMS_ARCHIVE_BATCH_SIZE = config("SMS_ARCHIVE_BATCH_SIZE", default=1000, cast=int)  # logs per archive row
+
+# -----------------------------
+# CONTACT IMPORT
+# -----------------------------
+IMPORT_BATCH_SIZE = config("IMPORT_BATCH_SIZE", default=1000, cast=int)  # rows per bulk INSERT
+IMPORT_UPLOAD_CHUNK_SIZE = config("IMPORT_UPLOAD_CHUNK_SIZE", default=1048576, cast=int)  # bytes per stored upload row
+
+# -----------------------------
+# EXPORTS
+# -----------------------------
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)  # rows per server-side cursor fetch
+
+# -----------------------------
+# CACHING
+# -----------------------------
+# One cache shared by every web and worker process (contact payloads, balance,
+# circuit state, locks). `db` works anywhere the database does (migrate
+# creates its table); `redis` is used automatically when REDIS_URL
+# is set; `file` only shares between processes on one machine; `locmem` is
+# per process.
+CACHE_BACKENDS = {
+    "db": ("django.core.cache.backends.db.DatabaseCache", "smsapp_cache"),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379/1"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", str(BASE_DIR / ".cache")),
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "smsapp"),
+}
+REDIS_URL = config("REDIS_URL", default="")
+CACHE_BACKEND = config("CACHE_BACKEND", default="redis" if REDIS_URL else "db")
+_cache_class, _cache_location = CACHE_BACKENDS[CACHE_BACKEND]
+if CACHE_BACKEND == "redis" and REDIS_URL:
+    _cache_location = REDIS_URL
+CACHES = {
+    "default": {
+        "BACKEND": _cache_class,
+        "LOCATION": config("CACHE_LOCATION", default=_cache_location),
+        "KEY_PREFIX": config("CACHE_KEY_PREFIX", default="ministry_sms"),
+        # Redis evicts by itself; the others cull once this many keys exist
+        "OPTIONS": {} if CACHE_BACKEND == "redis" else {
+            "MAX_ENTRIES": config("CACHE_MAX_ENTRIES", default=10000, cast=int),
+        },
+    }
+}
+CONTACTS_CACHE_TIMEOUT = config("CONTACTS_CACHE_TIMEOUT", default=3600, cast=int)  # seconds
+DASHBOARD_CACHE_TIMEOUT = config("DASHBOARD_CACHE_TIMEOUT", default=600, cast=int)  # log pages and fragments
+
+# -----------------------------
+# METRICS
+# -----------------------------
+# /metrics is open to staff sessions, or to `Authorization: Bearer <METRICS_TOKEN>` for scrapers.
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+SLOW_REQUEST_THRESHOLD_MS = config("SLOW_REQUEST_THRESHOLD_MS", default=1000, cast=int)  # 0 = off
 
 # -----------------------------
 # DEFAULT PRIMARY KEY FIELD
@@ -2,9 +2,15 @@ from django.contrib import admin
 from django.urls import path
 from django.shortcuts import redirect
 from django.contrib import messages
-from .models import Category, Contact, SMSLog
-from .utils import get_celcom_balance
+from .models import (
+    Category, Contact, SMSLog, SMSJob, SMSRecipient, ImportJob, SMSDailyRollup, SMSLogArchive, Segment,
+    Region, Subregion, DeliveryReport,
+)
+from .balance import get_cached_balance
+from .search import search_contacts, search_logs
+from .audience import segment_count
 from django.utils.html import format_html
+from django.db.models import Count
 
 # ----------------------------
 # CATEGORY ADMIN
@@ -14,32 +20,147 @@ class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
+# ----------------------------
+# REGION LOOKUP ADMIN
+# ----------------------------
+@admin.register(Region)
+class RegionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'contact_count')
+    search_fields = ('name',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(contact_count=Count('contacts'))
+
+    def contact_count(self, obj):
+        return obj.contact_count
+    contact_count.short_description = "Contacts"
+    contact_count.admin_order_field = 'contact_count'
+
+@admin.register(Subregion)
+class SubregionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'region')
+    list_filter = ('region',)
+    list_select_related = ('region',)
+    search_fields = ('name',)
+
 # ----------------------------
 # CONTACT ADMIN
 # ----------------------------
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
-    list_display = ('name', 'phone', 'category')
-    list_filter = ('category',)
+    list_display = ('name', 'phone', 'category', 'region', 'subregion')
+    list_filter = ('category', 'region')
+    list_select_related = ('category', 'region', 'subregion')
+    autocomplete_fields = ('region', 'subregion')
     search_fields = ('name', 'phone')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text index on name, exact or prefix match on normalized phone (no LIKE scans)
+        return search_contacts(queryset, search_term), False
+
+# ----------------------------
+# AUDIENCE SEGMENT ADMIN
+# ----------------------------
+@admin.register(Segment)
+class SegmentAdmin(admin.ModelAdmin):
+    list_display = ('name', 'region', 'subregion', 'recipients', 'updated_at')
+    list_select_related = ('region', 'subregion')
+    autocomplete_fields = ('region', 'subregion')
+    filter_horizontal = ('categories',)
+    search_fields = ('name',)
+    exclude = ('created_by',)
+
+    def recipients(self, obj):
+        return segment_count(obj)  # cached per contacts version
+    recipients.short_description = "Recipients"
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
 # ----------------------------
 # SMSLOG ADMIN WITH BALANCE
 # ----------------------------
 @admin.register(SMSLog)
 class SMSLogAdmin(admin.ModelAdmin):
-    list_display = ('sender', 'recipients', 'message', 'sent_at', 'status', 'check_balance')
-    search_fields = ('sender__username', 'recipient', 'message')
+    list_display = ('sender', 'recipient_count', 'message', 'sent_at', 'status', 'check_balance')
+    list_select_related = ('sender',)
+    search_fields = ('sender__username', 'message')
+
+    def get_search_results(self, request, queryset, search_term):
+        return search_logs(queryset, search_term), False
 
     def check_balance(self, obj):
         return format_html('<a href="{}">Check Balance</a>', '/admin/check-balance/')
     check_balance.short_description = "Balance"
 
+# ----------------------------
+# PER-RECIPIENT DELIVERY ADMIN
+# ----------------------------
+@admin.register(SMSRecipient)
+class SMSRecipientAdmin(admin.ModelAdmin):
+    list_display = ('phone', 'status', 'sent_at', 'delivered_at', 'provider_message_id', 'log')
+    list_filter = ('status',)
+    search_fields = ('=phone', '=provider_message_id')  # exact matches use the indexes
+    raw_id_fields = ('log',)
+
+# ----------------------------
+# SMS JOB QUEUE ADMIN
+# ----------------------------
+@admin.register(SMSJob)
+class SMSJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_by', 'status', 'total', 'sent', 'failed', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    list_select_related = ('created_by',)
+    readonly_fields = ('created_at', 'started_at', 'heartbeat_at', 'finished_at')
+
+# ----------------------------
+# CONTACT IMPORT JOB ADMIN
+# ----------------------------
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'filename', 'created_by', 'status', 'rows_processed', 'rows_inserted', 'rows_updated',
+                    'rows_skipped', 'rows_failed', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    list_select_related = ('created_by',)
+    readonly_fields = ('created_at', 'started_at', 'heartbeat_at', 'finished_at')
+
+# ----------------------------
+# RETENTION: ROLLUPS AND ARCHIVES
+# ----------------------------
+@admin.register(SMSDailyRollup)
+class SMSDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'sender_username', 'status', 'message_count', 'recipient_count')
+    list_filter = ('status',)
+    date_hierarchy = 'day'
+    search_fields = ('=sender_username',)
+
+@admin.register(SMSLogArchive)
+class SMSLogArchiveAdmin(admin.ModelAdmin):
+    list_display = ('period_start', 'period_end', 'log_count', 'recipient_count', 'created_at')
+    exclude = ('payload',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('payload')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(DeliveryReport)
+class DeliveryReportAdmin(admin.ModelAdmin):
+    list_display = ('provider_message_id', 'status', 'received_at', 'attempts')
+    list_filter = ('status', 'attempts')
+    search_fields = ('=provider_message_id',)
+
+    def has_add_permission(self, request):
+        return False
+
 # ----------------------------
 # CUSTOM ADMIN VIEW TO FETCH BALANCE
 # ----------------------------
 def check_balance_view(request):
-    balance = get_celcom_balance()
+    balance = get_cached_balance(wait_if_missing=True)
     messages.info(request, f"Current Celcom Balance: {balance}")
     return redirect('/admin/smsapp/smslog/')
 
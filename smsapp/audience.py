@@ -0,0 +1,70 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+
+from .cache import get_contacts_version
+from .models import Contact, Segment
+
+logger = logging.getLogger(__name__)
+
+
+# ============================
+# SEGMENT RESOLUTION
+# ============================
+def segment_contacts(segment):
+    """
+    Contacts in `segment` as a single queryset. The category predicate is
+    a correlated subquery on the M2M table, so nothing is loaded up front.
+    """
+    chosen = Segment.categories.through.objects.filter(segment_id=segment.pk)
+    contacts = Contact.objects.filter(
+        Q(Exists(chosen.filter(category_id=OuterRef('category_id')))) | ~Exists(chosen)
+    )
+    if segment.region_id:
+        contacts = contacts.filter(region_id=segment.region_id)
+    if segment.subregion_id:
+        contacts = contacts.filter(subregion_id=segment.subregion_id)
+    return contacts
+
+
+def resolve_segment(segment):
+    """De-duplicated E.164 phone numbers for `segment`, in one query."""
+    return list(
+        segment_contacts(segment).order_by('phone').values_list('phone', flat=True).distinct()
+    )
+
+
+# ============================
+# CACHED COUNTS
+# ============================
+def segment_count_key(segment, version=None):
+    """
+    Keyed by the contacts version and the segment's own updated_at, so
+    contact writes and segment edits both start a fresh entry.
+    """
+    version = get_contacts_version() if version is None else version
+    return f"smsapp:segment:{segment.pk}:{segment.updated_at.timestamp():.6f}:{version}"
+
+
+def segment_counts(segments):
+    """Return {segment pk: recipient count}, computing only cache misses."""
+    segments = list(segments)
+    version = get_contacts_version()
+    keys = {segment_count_key(s, version): s for s in segments}
+    cached = cache.get_many(list(keys))
+
+    counts, fresh = {}, {}
+    for key, segment in keys.items():
+        if key in cached:
+            counts[segment.pk] = cached[key]
+        else:
+            counts[segment.pk] = fresh[key] = segment_contacts(segment).count()
+    if fresh:
+        cache.set_many(fresh, timeout=settings.CONTACTS_CACHE_TIMEOUT)
+    return counts
+
+
+def segment_count(segment):
+    return segment_counts([segment])[segment.pk]
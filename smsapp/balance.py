@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .utils import aget_celcom_balance, get_celcom_balance
+
+logger = logging.getLogger(__name__)
+
+BALANCE_CACHE_KEY = "smsapp:celcom_balance"
+REFRESH_LOCK_KEY = "smsapp:celcom_balance:refreshing"
+
+
+# ============================
+# CACHED CELCOM BALANCE
+# ============================
+def refresh_balance():
+    """Fetch the balance from Celcom now and store it if the call succeeded."""
+    data = get_celcom_balance()
+
+    if isinstance(data, dict) and data.get("status") == "error":
+        # Keep serving the last good value; the refresh lock expires on its
+        # own, which stops every page load from hammering a failing API.
+        return data
+
+    cache.set(
+        BALANCE_CACHE_KEY,
+        {"data": data, "fetched_at": time.time()},
+        timeout=settings.CELCOM_BALANCE_MAX_STALE,
+    )
+    cache.delete(REFRESH_LOCK_KEY)
+    return data
+
+
+async def arefresh_balance():
+    """Async refresh_balance() for ASGI views."""
+    data = await aget_celcom_balance()
+
+    if isinstance(data, dict) and data.get("status") == "error":
+        return data
+
+    await cache.aset(
+        BALANCE_CACHE_KEY,
+        {"data": data, "fetched_at": time.time()},
+        timeout=settings.CELCOM_BALANCE_MAX_STALE,
+    )
+    await cache.adelete(REFRESH_LOCK_KEY)
+    return data
+
+
+def _refresh_worker():
+    try:
+        refresh_balance()
+    except Exception:
+        logger.exception("Background balance refresh failed")
+    finally:
+        connection.close()
+
+
+def _refresh_lock_timeout():
+    return int(settings.CELCOM_CONNECT_TIMEOUT + settings.CELCOM_BALANCE_TIMEOUT) + 1
+
+
+def _start_refresh_thread():
+    threading.Thread(target=_refresh_worker, name="celcom-balance-refresh", daemon=True).start()
+    return True
+
+
+def refresh_balance_async():
+    """Start a background refresh unless one is already running."""
+    if not cache.add(REFRESH_LOCK_KEY, True, timeout=_refresh_lock_timeout()):
+        return False
+    return _start_refresh_thread()
+
+
+async def arefresh_balance_async():
+    """refresh_balance_async() for coroutines: the lock is taken without blocking the loop."""
+    if not await cache.aadd(REFRESH_LOCK_KEY, True, timeout=_refresh_lock_timeout()):
+        return False
+    return _start_refresh_thread()
+
+
+def get_cached_balance(wait_if_missing=False):
+    """
+    Return the cached Celcom balance dict, or None if nothing is cached yet.
+
+    Values older than CELCOM_BALANCE_TTL are still returned (stale-while-
+    revalidate) and a background refresh is started. With wait_if_missing
+    the first call blocks on Celcom instead of returning None.
+    """
+    entry = cache.get(BALANCE_CACHE_KEY)
+
+    if entry is None:
+        if wait_if_missing:
+            return refresh_balance()
+        refresh_balance_async()
+        return None
+
+    if time.time() - entry["fetched_at"] > settings.CELCOM_BALANCE_TTL:
+        refresh_balance_async()
+
+    return entry["data"]
+
+
+async def aget_cached_balance(wait_if_missing=False):
+    """Async get_cached_balance(); background refreshes still run in a thread."""
+    entry = await cache.aget(BALANCE_CACHE_KEY)
+
+    if entry is None:
+        if wait_if_missing:
+            return await arefresh_balance()
+        await arefresh_balance_async()
+        return None
+
+    if time.time() - entry["fetched_at"] > settings.CELCOM_BALANCE_TTL:
+        await arefresh_balance_async()
+
+    return entry["data"]
+
+
+def invalidate_balance():
+    """Mark the cached balance stale (e.g. after a send) so the next read refreshes it."""
+    entry = cache.get(BALANCE_CACHE_KEY)
+    if entry is not None:
+        entry["fetched_at"] = 0
+        cache.set(BALANCE_CACHE_KEY, entry, timeout=settings.CELCOM_BALANCE_MAX_STALE)
@@ -0,0 +1,300 @@
+import io
+import platform
+import time
+import tracemalloc
+
+import django
+import openpyxl
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .importer import process_import_job
+from .jobs import claim_next_job, enqueue_sms, process_job
+from .models import Category, Contact, ImportJob, Region, SMSLog, Subregion
+from .providers import locmem
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CATEGORIES = ["Regional Overseer", "Subregional Pastor", "Pastor"]
+
+# Private cache for the run, so cache.clear() never touches the configured one
+BENCHMARK_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "smsapp-benchmark"},
+}
+
+
+# ============================
+# MEASUREMENT HELPERS
+# ============================
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def timed_request(client, url, params=None, **headers):
+    """(seconds, query count, response) for one GET."""
+    with CaptureQueriesContext(connection) as ctx:
+        started = time.perf_counter()
+        response = client.get(url, params or {}, **headers)
+        elapsed = time.perf_counter() - started
+    return elapsed, len(ctx.captured_queries), response
+
+
+# ============================
+# SEEDING
+# ============================
+def seed(contacts, logs, user, regions=8, subregions_per_region=6, batch_size=2000):
+    """Generate `contacts` contacts spread over categories/regions and `logs` SMS logs."""
+    started = time.perf_counter()
+    categories = [Category.objects.get_or_create(name=name)[0] for name in CATEGORIES]
+    region_rows = [Region.objects.get_or_create(key=f"region {r}", defaults={"name": f"Region {r}"})[0]
+                   for r in range(regions)]
+    subregion_rows = [
+        Subregion.objects.get_or_create(region=region, key=f"subregion {r}-{s}",
+                                        defaults={"name": f"Subregion {r}-{s}"})[0]
+        for r, region in enumerate(region_rows) for s in range(subregions_per_region)
+    ]
+
+    batch = []
+    for i in range(contacts):
+        subregion = subregion_rows[i % len(subregion_rows)]
+        batch.append(Contact(
+            category=categories[i % len(categories)],
+            name=f"Contact {i}",
+            phone=f"+2547{i:08d}",
+            region_id=subregion.region_id,
+            subregion=subregion,
+        ))
+        if len(batch) >= batch_size:
+            Contact.objects.bulk_create(batch)
+            batch = []
+    Contact.objects.bulk_create(batch)
+
+    SMSLog.objects.bulk_create(
+        (SMSLog(sender=user, message=f"Benchmark message {i}", recipient_count=10, status="ok")
+         for i in range(logs)),
+        batch_size=batch_size,
+    )
+    return {"contacts": contacts, "logs": logs, "regions": regions,
+            "subregions": len(subregion_rows), "seconds": round(time.perf_counter() - started, 3)}
+
+
+# ============================
+# BENCHMARKS
+# ============================
+def bench_get_pastors(client, repeat):
+    """GetPastorsView latency and query counts: cold (cache cleared), warm, and 304 revalidation."""
+    url = reverse("smsapp:get_pastors")
+    cases = {
+        "all": {},
+        "category": {"category": CATEGORIES[-1]},
+        "region": {"region": "Region 1"},
+        "region_subregion": {"region": "Region 1", "subregion": "Subregion 1-1"},
+        "fields": {"fields": "name,phone"},
+    }
+    results = {}
+    for name, params in cases.items():
+        cold, warm, not_modified = [], [], []
+        queries = payload_bytes = rows = 0
+        for _ in range(repeat):
+            cache.clear()
+            elapsed, queries, response = timed_request(client, url, params)
+            cold.append(elapsed)
+            payload_bytes = len(response.content)
+            rows = len(response.json()["pastors"])
+
+            elapsed, warm_queries, response = timed_request(client, url, params)
+            warm.append(elapsed)
+
+            elapsed, _, _ = timed_request(client, url, params, HTTP_IF_NONE_MATCH=response["ETag"])
+            not_modified.append(elapsed)
+
+        results[name] = {
+            "rows": rows,
+            "payload_bytes": payload_bytes,
+            "queries_cold": queries,
+            "queries_warm": warm_queries,
+            "cold": summarize(cold),
+            "warm": summarize(warm),
+            "not_modified": summarize(not_modified),
+        }
+    return results
+
+
+def bench_sms_log_pages(client, repeat, pages=10):
+    """Keyset-paginated log API: first page vs. the page `pages` deep."""
+    url = reverse("smsapp:sms_log_list")
+    first, deep = [], []
+    queries = 0
+    for _ in range(repeat):
+        elapsed, queries, response = timed_request(client, url)
+        first.append(elapsed)
+        cursor = response.json()["next_cursor"]
+        elapsed = 0.0
+        for _ in range(pages - 1):
+            if not cursor:
+                break
+            elapsed, _, response = timed_request(client, url, {"cursor": cursor})
+            cursor = response.json()["next_cursor"]
+        deep.append(elapsed)
+    return {"queries_per_page": queries, "first_page": summarize(first), f"page_{pages}": summarize(deep)}
+
+
+def build_workbook(rows, offset=0):
+    """In-memory .xlsx with `rows` contacts in the upload format."""
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet()
+    sheet.append(["Name", "Phone", "Category", "Region", "Subregion"])
+    for i in range(offset, offset + rows):
+        sheet.append([f"Imported {i}", f"07{i:08d}", CATEGORIES[i % 3], f"Region {i % 8}", f"Subregion {i % 8}-{i % 6}"])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _upload_and_import(client, workbook):
+    upload = SimpleUploadedFile(
+        "benchmark.xlsx", workbook,
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+    started = time.perf_counter()
+    response = client.post(reverse("smsapp:upload_contacts"), {"excel_file": upload},
+                           HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+    upload_seconds = time.perf_counter() - started
+    job = process_import_job(claim_next_job(ImportJob))
+    return response, job, upload_seconds, time.perf_counter() - started
+
+
+def bench_import(client, rows):
+    """
+    Upload through UploadContactsView, then run the import worker step.
+    Timing and memory come from separate uploads (new numbers each time),
+    because tracemalloc itself slows the import down.
+
+    python_peak_mb is the tracemalloc peak during the import alone;
+    rss_peak_growth_mb is how far the import raised the process's peak RSS
+    (0 when an earlier step had already peaked higher).
+    """
+    workbook = build_workbook(rows, offset=50_000_000)
+    rss_before = peak_rss_mb()
+    response, job, upload_seconds, total_seconds = _upload_and_import(client, workbook)
+    rss_after = peak_rss_mb()
+
+    tracemalloc.start()
+    _upload_and_import(client, build_workbook(rows, offset=60_000_000))
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "rows": rows,
+        "file_bytes": len(workbook),
+        "upload_status": response.status_code,
+        "job_status": job.status,
+        "inserted": job.rows_inserted,
+        "upload_ms": round(upload_seconds * 1000, 3),
+        "seconds": round(total_seconds, 3),
+        "rows_per_second": round(rows / total_seconds, 1) if total_seconds else None,
+        "python_peak_mb": round(traced_peak / (1024 * 1024), 1),
+        "rss_peak_growth_mb": round(rss_after - rss_before, 1) if rss_before is not None else None,
+    }
+
+
+def bench_broadcast(recipients, chunk_size, stub_latency, async_dispatch):
+    """Enqueue one broadcast and run it through process_job against the in-memory provider."""
+    phones = list(Contact.objects.order_by("id").values_list("phone", flat=True)[:recipients])
+    with override_settings(
+        SMS_PROVIDER_BACKEND="smsapp.providers.locmem.InMemoryProvider",
+        SMS_STUB_LATENCY=stub_latency,
+        SMS_STUB_FAILURE_RATE=0.0,
+        CELCOM_CHUNK_SIZE=chunk_size,
+        CELCOM_ASYNC_DISPATCH=async_dispatch,
+    ):
+        locmem.clear_outbox()
+        started = time.perf_counter()
+        enqueue_sms(None, "Benchmark broadcast", phones)
+        job = process_job(claim_next_job())
+        elapsed = time.perf_counter() - started
+
+    return {
+        "recipients": len(phones),
+        "chunk_size": chunk_size,
+        "stub_latency_s": stub_latency,
+        "async_dispatch": async_dispatch,
+        "status": job.status,
+        "sent": job.sent,
+        "requests": len(locmem.outbox),
+        "seconds": round(elapsed, 3),
+        "recipients_per_second": round(len(phones) / elapsed, 1) if elapsed else None,
+    }
+
+
+def run_benchmarks(contacts=5000, logs=5000, import_rows=5000, recipients=2000, repeat=5,
+                   chunk_size=100, stub_latency=0.05):
+    """
+    Run every benchmark against the current (throwaway) database and
+    return the results as a JSON-serializable dict. The cache is swapped
+    for a private one while it runs.
+    """
+    with override_settings(CACHES=BENCHMARK_CACHES):
+        return _run_benchmarks(contacts, logs, import_rows, recipients, repeat, chunk_size, stub_latency)
+
+
+def _run_benchmarks(contacts, logs, import_rows, recipients, repeat, chunk_size, stub_latency):
+    user = get_user_model().objects.create_user("benchmark", password="benchmark", is_staff=True)
+    client = Client()
+    client.force_login(user)
+
+    results = {
+        "meta": {
+            "started_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "params": {
+                "contacts": contacts, "logs": logs, "import_rows": import_rows,
+                "recipients": recipients, "repeat": repeat, "chunk_size": chunk_size,
+                "stub_latency": stub_latency,
+            },
+        },
+        "seed": seed(contacts, logs, user),
+    }
+    results["get_pastors"] = bench_get_pastors(client, repeat)
+    results["sms_log_pages"] = bench_sms_log_pages(client, repeat)
+    results["import"] = bench_import(client, import_rows)
+    results["broadcast"] = {
+        "threads": bench_broadcast(recipients, chunk_size, stub_latency, async_dispatch=False),
+        "async": bench_broadcast(recipients, chunk_size, stub_latency, async_dispatch=True),
+    }
+    results["meta"]["peak_rss_mb"] = peak_rss_mb()
+    return results
@@ -0,0 +1,107 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import urlencode
+
+from .models import Category
+
+CONTACTS_VERSION_KEY = "smsapp:contacts:version"
+LOGS_VERSION_KEY = "smsapp:logs:version"
+
+
+# ============================
+# DATA VERSIONS
+# ============================
+# Cached entries embed a version number in their key; bumping the version
+# invalidates all of them at once and old entries simply expire.
+def _get_version(key):
+    # Seeded from the clock so a flushed cache never reuses an old ETag
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def _bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        _get_version(key)
+        return cache.incr(key)
+
+
+def get_contacts_version():
+    """Current version of the Contact/Category/Region data."""
+    return _get_version(CONTACTS_VERSION_KEY)
+
+
+def bump_contacts_version():
+    """
+    Invalidate every cached contact payload and ETag.
+    Called by model signals; bulk writes (bulk_create/update) skip signals
+    and must call this themselves.
+    """
+    return _bump_version(CONTACTS_VERSION_KEY)
+
+
+def get_logs_version():
+    """Current version of the SMS log data."""
+    return _get_version(LOGS_VERSION_KEY)
+
+
+def bump_logs_version():
+    """
+    Invalidate cached log pages and dashboard fragments. Called on SMSLog
+    saves; bulk deletes (archiving) call it directly.
+    """
+    return _bump_version(LOGS_VERSION_KEY)
+
+
+def params_digest(params):
+    """Stable short hash of the query parameters that shape a response."""
+    encoded = urlencode(sorted((k, v) for k, v in params.items() if v))
+    return hashlib.md5(encoded.encode()).hexdigest()[:16]
+
+
+def get_or_build(key, build, timeout):
+    """Return the cached value for key, building and storing it on a miss."""
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout=timeout)
+    return value
+
+
+# ============================
+# CACHED READS
+# ============================
+def contacts_payload_key(version, params):
+    return f"smsapp:contacts:{version}:{params_digest(params)}"
+
+
+def get_contacts_payload(params, build):
+    """
+    Return the rendered JSON bytes for a contact query, building them with
+    build() on a miss. Old versions simply expire.
+    """
+    key = contacts_payload_key(get_contacts_version(), params)
+    return get_or_build(key, build, settings.CONTACTS_CACHE_TIMEOUT)
+
+
+def get_categories():
+    """All categories as [{"id", "name"}], cached until contacts change."""
+    key = f"smsapp:categories:{get_contacts_version()}"
+    return get_or_build(
+        key, lambda: list(Category.objects.order_by('name').values('id', 'name')),
+        settings.CONTACTS_CACHE_TIMEOUT,
+    )
+
+
+def get_log_page_payload(params, build):
+    """JSON bytes for one page of the log API, cached until any log changes."""
+    key = f"smsapp:logs:{get_logs_version()}:{params_digest(params)}"
+    return get_or_build(key, build, settings.DASHBOARD_CACHE_TIMEOUT)
@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .circuit import get_breaker
+from .ratelimit import get_limiter, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+CELCOM_LATENCY = metrics.histogram(
+    "celcom_request_duration_seconds",
+    "Outbound Celcom API calls by endpoint and HTTP status ('error' = no response).",
+    labels=("endpoint", "status"),
+)
+
+
+# ============================
+# CELCOM HTTP CLIENT
+# ============================
+class CelcomClient:
+    """
+    Keep-alive HTTP client for the Celcom Africa API.
+
+    One instance is shared by every thread in a process (see get_client()).
+    Transport retries live here: only connection failures are retried, because
+    a POST that reached Celcom may already have been delivered. Every call
+    also passes through the process circuit breaker and rate limiter.
+    """
+
+    def __init__(self, send_url, balance_url, pool_size=4, connect_timeout=5,
+                 send_timeout=15, balance_timeout=10, max_retries=2):
+        self.send_url = send_url
+        self.balance_url = balance_url
+        self.connect_timeout = connect_timeout
+        self.send_timeout = send_timeout
+        self.balance_timeout = balance_timeout
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=0,
+            backoff_factor=0.5,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=2,  # send host + balance host
+            pool_maxsize=max(1, pool_size),
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            send_url=settings.CELCOM_API_URL,
+            balance_url=settings.CELCOM_BALANCE_URL,
+            pool_size=settings.CELCOM_POOL_SIZE,
+            connect_timeout=settings.CELCOM_CONNECT_TIMEOUT,
+            send_timeout=settings.CELCOM_SEND_TIMEOUT,
+            balance_timeout=settings.CELCOM_BALANCE_TIMEOUT,
+            max_retries=settings.CELCOM_MAX_RETRIES,
+        )
+
+    def post(self, url, payload, read_timeout, recipients=0, headers=None):
+        """
+        POST a JSON payload and return the requests.Response.
+        Raises CircuitOpenError without touching the network while Celcom is
+        considered down.
+        """
+        breaker = get_breaker()
+        breaker.before_call()
+        recorded = False
+        try:
+            limiter = get_limiter()
+            limiter.acquire(requests=1, recipients=recipients)
+
+            started = time.perf_counter()
+            try:
+                response = self.session.post(
+                    url, json=payload, headers=headers, timeout=(self.connect_timeout, read_timeout)
+                )
+            except requests.exceptions.RequestException:
+                _observe_latency(self.endpoint(url), "error", started)
+                limiter.record_response(None)
+                recorded = True
+                breaker.record_failure()
+                raise
+
+            _observe_latency(self.endpoint(url), response.status_code, started)
+            recorded = True
+            _record_outcome(breaker, limiter, response)
+            return response
+        finally:
+            if not recorded:
+                breaker.release_probe()
+
+    def endpoint(self, url):
+        """Metrics label for a request URL."""
+        return "send" if url == self.send_url else "balance"
+
+    def send(self, payload, idempotency_key=None):
+        recipients, headers = _send_args(payload, idempotency_key)
+        return self.post(self.send_url, payload, self.send_timeout, recipients=recipients, headers=headers)
+
+    def balance(self, payload):
+        return self.post(self.balance_url, payload, self.balance_timeout)
+
+    def close(self):
+        self.session.close()
+
+
+def _send_args(payload, idempotency_key):
+    recipients = len([m for m in str(payload.get("mobile", "")).split(",") if m])
+    headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+    return recipients, headers
+
+
+def _observe_latency(endpoint, status, started):
+    elapsed = time.perf_counter() - started
+    CELCOM_LATENCY.observe(elapsed, endpoint=endpoint, status=status)
+    metrics.record_celcom_call(elapsed)
+
+
+def _record_outcome(breaker, limiter, response):
+    """Feed an HTTP response (requests or httpx) to the breaker and limiter."""
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+    retry_after = parse_retry_after(response.headers.get("Retry-After")) if response.status_code == 429 else None
+    limiter.record_response(response.status_code, retry_after)
+
+
+# ============================
+# ASYNC CELCOM HTTP CLIENT
+# ============================
+class AsyncCelcomClient:
+    """
+    asyncio counterpart of CelcomClient on a pooled httpx.AsyncClient.
+
+    Same rules: only connection failures are retried by the transport, and
+    every call goes through the process circuit breaker and the shared rate
+    limiter (waiting with asyncio.sleep rather than blocking a thread). An
+    AsyncClient belongs to one event loop, so get_async_client() keeps one
+    per loop.
+    """
+
+    def __init__(self, send_url, balance_url, max_connections=100, connect_timeout=5,
+                 send_timeout=15, balance_timeout=10, max_retries=2):
+        self.send_url = send_url
+        self.balance_url = balance_url
+        self.connect_timeout = connect_timeout
+        self.send_timeout = send_timeout
+        self.balance_timeout = balance_timeout
+
+        limits = httpx.Limits(
+            max_connections=max(1, max_connections),
+            max_keepalive_connections=max(1, max_connections),
+        )
+        self.client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(retries=max_retries, limits=limits),
+            timeout=httpx.Timeout(send_timeout, connect=connect_timeout),
+        )
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            send_url=settings.CELCOM_API_URL,
+            balance_url=settings.CELCOM_BALANCE_URL,
+            max_connections=settings.CELCOM_ASYNC_CONCURRENCY,
+            connect_timeout=settings.CELCOM_CONNECT_TIMEOUT,
+            send_timeout=settings.CELCOM_SEND_TIMEOUT,
+            balance_timeout=settings.CELCOM_BALANCE_TIMEOUT,
+            max_retries=settings.CELCOM_MAX_RETRIES,
+        )
+
+    async def post(self, url, payload, read_timeout, recipients=0, headers=None):
+        """
+        POST a JSON payload and return the httpx.Response.
+        Raises CircuitOpenError while Celcom is considered down.
+        """
+        breaker = get_breaker()
+        breaker.before_call()
+        recorded = False
+        try:
+            # The shared limiter state is a database row
+            limiter = get_limiter()
+            delay = await sync_to_async(limiter.reserve)(requests=1, recipients=recipients)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            started = time.perf_counter()
+            try:
+                response = await self.client.post(
+                    url, json=payload, headers=headers,
+                    timeout=httpx.Timeout(read_timeout, connect=self.connect_timeout),
+                )
+            except httpx.HTTPError:
+                _observe_latency(self.endpoint(url), "error", started)
+                await sync_to_async(limiter.record_response)(None)
+                recorded = True
+                breaker.record_failure()
+                raise
+
+            _observe_latency(self.endpoint(url), response.status_code, started)
+            recorded = True
+            await sync_to_async(_record_outcome)(breaker, limiter, response)
+            return response
+        finally:
+            # Cancellation or an unexpected error must not keep the probe slot
+            if not recorded:
+                breaker.release_probe()
+
+    def endpoint(self, url):
+        return "send" if url == self.send_url else "balance"
+
+    async def send(self, payload, idempotency_key=None):
+        recipients, headers = _send_args(payload, idempotency_key)
+        return await self.post(self.send_url, payload, self.send_timeout, recipients=recipients, headers=headers)
+
+    async def balance(self, payload):
+        return await self.post(self.balance_url, payload, self.balance_timeout)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return this process's CelcomClient, creating it on first use.
+    A forked worker (e.g. gunicorn --preload) gets its own pool rather than
+    sharing sockets with its parent.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = CelcomClient.from_settings()
+                _client_pid = pid
+                logger.debug(f"Created Celcom client for pid {pid}")
+    return _client
+
+
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncCelcomClient
+
+
+def get_async_client():
+    """Return the AsyncCelcomClient for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncCelcomClient.from_settings()
+        logger.debug(f"Created async Celcom client for pid {os.getpid()}")
+    return client
+
+
+async def close_async_client():
+    """Close and forget the running loop's client (for short-lived loops, e.g. async_to_sync)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def reset_client():
+    """Drop the cached clients (used when settings change, e.g. in tests)."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _client_pid = None
+        _async_clients.clear()
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CACHE_KEY = "smsapp:celcom_circuit"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Celcom while the circuit is open."""
+
+
+# ============================
+# CIRCUIT BREAKER
+# ============================
+class CircuitBreaker:
+    """
+    Classic three-state breaker around the Celcom API.
+
+    CLOSED: calls go through; `failure_threshold` consecutive failures open it.
+    OPEN: calls fail immediately with CircuitOpenError for `reset_timeout` seconds.
+    HALF_OPEN: up to `half_open_calls` probe calls are let through; a success
+    closes the circuit, a failure opens it again.
+
+    State changes are also written to the Django cache so the dashboard can
+    show what the worker process sees when the cache is shared.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_calls=1, name="celcom"):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            failure_threshold=settings.CELCOM_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.CELCOM_CIRCUIT_RESET_TIMEOUT,
+            half_open_calls=settings.CELCOM_CIRCUIT_HALF_OPEN_CALLS,
+        )
+
+    def _set_state(self, state):
+        """Change state (caller holds the lock); True if it changed and must be published."""
+        if state == self.state:
+            return False
+        logger.warning(f"Circuit '{self.name}' {self.state} -> {state}")
+        self.state = state
+        return True
+
+    def _publish(self):
+        """
+        Write the current state to the shared cache. Called after the lock is
+        released; inside an event loop the (possibly database) write runs on a
+        short-lived thread instead of blocking the loop.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_state()
+        else:
+            threading.Thread(
+                target=self._write_state, kwargs={"close_connection": True},
+                name="circuit-publish", daemon=True,
+            ).start()
+
+    def _write_state(self, close_connection=False):
+        try:
+            # Read the state now, so a late write never publishes an outdated value
+            cache.set(CIRCUIT_CACHE_KEY, {"state": self.state, "changed_at": time.time()}, timeout=None)
+        except Exception:
+            logger.exception("Could not publish circuit state")
+        finally:
+            if close_connection:
+                connection.close()
+
+    def is_open(self):
+        """True while calls would be rejected (open and not yet due for a probe)."""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not be made."""
+        changed = False
+        try:
+            with self._lock:
+                if self.state == self.OPEN:
+                    remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+                    if remaining > 0:
+                        raise CircuitOpenError(f"Celcom circuit open; calls resume in {math.ceil(remaining)}s")
+                    changed = self._set_state(self.HALF_OPEN)
+                    self.probes = 0
+
+                if self.state == self.HALF_OPEN:
+                    if self.probes >= self.half_open_calls:
+                        raise CircuitOpenError("Celcom circuit half-open; probe already in flight")
+                    self.probes += 1
+        finally:
+            if changed:
+                self._publish()
+
+    def release_probe(self):
+        """
+        Give back a half-open probe slot whose call ended without an outcome
+        (cancelled, or crashed before Celcom answered), so the next call can
+        probe instead of the circuit staying half-open for good.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN and self.probes > 0:
+                self.probes -= 1
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            changed = self._set_state(self.CLOSED)
+        if changed:
+            self._publish()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            changed = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                changed = self._set_state(self.OPEN)
+        if changed:
+            self._publish()
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_breaker():
+    """Return this process's Celcom circuit breaker."""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker.from_settings()
+    return _breaker
+
+
+def reset_breaker():
+    global _breaker
+    with _breaker_lock:
+        _breaker = None
+
+
+def get_circuit_state():
+    """Circuit state for display: the shared (cached) value, else this process's."""
+    published = cache.get(CIRCUIT_CACHE_KEY)
+    if published:
+        return published["state"]
+    return get_breaker().state
+
+
+metrics.register_gauge(
+    "celcom_circuit_state",
+    "Celcom circuit breaker state (0 closed, 1 half-open, 2 open), as published to the cache.",
+    lambda: CircuitBreaker.STATE_VALUES[get_circuit_state()],
+)
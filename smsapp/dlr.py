@@ -0,0 +1,242 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DeliveryReport, SMSRecipient
+
+logger = logging.getLogger(__name__)
+
+# Provider status words -> our delivery status. Anything else (BUFFERED,
+# pending, sent, ...) is an intermediate state and is ignored.
+DELIVERED_STATUSES = {"delivrd", "delivered", "deliveredtoterminal", "success", "successful"}
+UNDELIVERED_STATUSES = {
+    "undeliv", "undelivered", "expired", "rejectd", "rejected", "failed",
+    "deliveryimpossible", "deliveredtonetwork_failed", "blacklisted", "invalid",
+}
+
+MESSAGE_ID_KEYS = ("messageid", "messageID", "message_id", "msgid", "msgId", "id")
+STATUS_KEYS = ("status", "deliveryStatus", "dlrStatus", "delivery_status", "description")
+
+
+# ============================
+# PARSING
+# ============================
+def _first(report, keys):
+    for key in keys:
+        value = report.get(key)
+        if value not in (None, ""):
+            return str(value).strip()
+    return None
+
+
+def map_status(value):
+    key = (value or "").replace(" ", "").lower()
+    if key in DELIVERED_STATUSES:
+        return SMSRecipient.STATUS_DELIVERED
+    if key in UNDELIVERED_STATUSES:
+        return SMSRecipient.STATUS_UNDELIVERED
+    return None
+
+
+def parse_reports(data):
+    """
+    Turn a webhook body into [(provider_message_id, status), ...].
+    Accepts a single report, a list of reports or {"reports": [...]}.
+    """
+    if isinstance(data, dict):
+        data = data.get("reports") or data.get("responses") or [data]
+    if not isinstance(data, list):
+        return []
+
+    reports = []
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        message_id = _first(item, MESSAGE_ID_KEYS)
+        status = map_status(_first(item, STATUS_KEYS))
+        if message_id and status:
+            reports.append((message_id[:64], status))
+    return reports
+
+
+# ============================
+# STORAGE AND BULK APPLY
+# ============================
+def store_reports(reports):
+    """Persist parsed reports (one INSERT) so they survive a restart; returns the count."""
+    DeliveryReport.objects.bulk_create(
+        [DeliveryReport(provider_message_id=message_id, status=status) for message_id, status in reports],
+        batch_size=settings.DLR_BATCH_SIZE,
+    )
+    return len(reports)
+
+
+def _apply(rows):
+    """
+    Apply stored reports to SMSRecipient: one UPDATE per distinct status per
+    500 ids, matched on the indexed provider_message_id. Matched reports are
+    deleted; the rest are marked as attempted and kept.
+    :return: (recipients updated, reports left unmatched)
+    """
+    latest = {}
+    for row in sorted(rows, key=lambda r: r.pk):
+        latest[row.provider_message_id] = row.status  # latest report wins
+
+    by_status = {}
+    for message_id, status in latest.items():
+        by_status.setdefault(status, []).append(message_id)
+
+    now = timezone.now()
+    updated = 0
+    matched = set()
+    with transaction.atomic():
+        for status, ids in by_status.items():
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                recipients = SMSRecipient.objects.filter(provider_message_id__in=batch)
+                matched.update(recipients.values_list('provider_message_id', flat=True))
+                updated += recipients.update(status=status, delivered_at=now)
+
+        pks = [row.pk for row in rows]
+        DeliveryReport.objects.filter(pk__in=pks, provider_message_id__in=matched).delete()
+        unmatched = DeliveryReport.objects.filter(pk__in=pks).exclude(provider_message_id__in=matched)
+        left = unmatched.update(attempts=F('attempts') + 1)
+    return updated, left
+
+
+def apply_pending_reports():
+    """
+    Apply every report that has not been tried yet, DLR_BATCH_SIZE at a
+    time, then drop unmatched reports older than DLR_UNMATCHED_TTL.
+    :return: number of recipients updated.
+    """
+    updated = applied = left = 0
+    while True:
+        rows = list(DeliveryReport.objects.filter(attempts=0).order_by('id')[:settings.DLR_BATCH_SIZE])
+        if not rows:
+            break
+        batch_updated, batch_left = _apply(rows)
+        updated += batch_updated
+        applied += len(rows)
+        left += batch_left
+
+    if applied:
+        logger.info(f"Applied {applied} delivery report(s) to {updated} recipient(s); {left} kept for retry")
+
+    expired, _ = DeliveryReport.objects.filter(
+        received_at__lt=timezone.now() - timedelta(seconds=settings.DLR_UNMATCHED_TTL)
+    ).delete()
+    if expired:
+        logger.warning(f"Dropped {expired} delivery report(s) that never matched a sent message")
+    return updated
+
+
+def apply_reports_for(message_ids):
+    """
+    Retry stored reports for these provider message ids; called once the
+    ids have been recorded, for reports that arrived before them.
+    """
+    message_ids = list(message_ids)
+    updated = 0
+    for start in range(0, len(message_ids), 500):
+        rows = list(DeliveryReport.objects.filter(provider_message_id__in=message_ids[start:start + 500]))
+        if rows:
+            updated += _apply(rows)[0]
+    if updated:
+        logger.info(f"Applied {updated} early delivery report(s)")
+    return updated
+
+
+class DeliveryReportBuffer:
+    """
+    Batches the apply step of the delivery report webhook.
+
+    Each request stores its reports before it is acknowledged; this only
+    decides when stored reports are applied: as soon as `batch_size` have
+    arrived, or `flush_interval` seconds after the first one (a timer thread
+    covers quiet periods). A storm of thousands of reports therefore still
+    becomes a handful of bulk UPDATEs, and nothing acknowledged is lost if
+    the process dies before a flush: the next flush, in any process, picks
+    it up.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=2.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._waiting = 0
+        self._first_at = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, reports):
+        """Store reports and schedule a flush; returns how many were accepted."""
+        accepted = store_reports(reports)
+        with self._lock:
+            self._waiting += accepted
+            if self._waiting and self._first_at is None:
+                self._first_at = time.monotonic()
+            due = (
+                self._waiting >= self.batch_size
+                or (self._first_at and time.monotonic() - self._first_at >= self.flush_interval)
+            )
+            if not due and self._waiting and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if due:
+            self.flush()
+        return accepted
+
+    def _reset(self):
+        with self._lock:
+            self._waiting = 0
+            self._first_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def flush(self):
+        """Apply every stored report; returns the number of rows updated."""
+        self._reset()
+        return apply_pending_reports()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Delivery report flush failed")
+        finally:
+            connection.close()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Return this process's delivery report buffer."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = DeliveryReportBuffer(
+                    batch_size=settings.DLR_BATCH_SIZE,
+                    flush_interval=settings.DLR_FLUSH_INTERVAL,
+                )
+    return _buffer
+
+
+def reset_buffer():
+    """Drop this process's buffer and its pending timer (used in tests)."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer._reset()
+        _buffer = None
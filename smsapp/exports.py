@@ -0,0 +1,152 @@
+import csv
+import tempfile
+from datetime import datetime
+from itertools import islice
+
+import openpyxl
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .logs import filter_logs
+from .models import Contact, SMSRecipient
+
+FILE_BLOCK_SIZE = 64 * 1024
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class Echo:
+    """File-like object whose write() just returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    """Cell value safe for CSV/XLSX: aware datetimes become local naive ones."""
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+# ============================
+# RESPONSES
+# ============================
+# Under ASGI Django reads a synchronous streaming body with
+# sync_to_async(list), i.e. all of it, before sending the first byte. ASGI
+# requests therefore get async iterators: rows are fetched one chunk per
+# sync_to_async call and files are read block by block.
+def streams_async(request):
+    return isinstance(request, ASGIRequest)
+
+
+async def _arows(rows):
+    # Not QuerySet.aiterator(): for values_list() it runs the query on the event loop
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    iterator = rows.iterator(chunk_size=chunk_size)  # lazy until the first next()
+
+    def next_chunk():
+        return list(islice(iterator, chunk_size))
+
+    while chunk := await sync_to_async(next_chunk)():
+        for row in chunk:
+            yield row
+
+
+def csv_response(filename, header, rows, asynchronous=False):
+    """Stream a values_list() queryset as CSV; one chunk of rows is held in memory at a time."""
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            yield writer.writerow([_plain(v) for v in row])
+
+    async def alines():
+        yield writer.writerow(header)
+        async for row in _arows(rows):
+            yield writer.writerow([_plain(v) for v in row])
+
+    response = StreamingHttpResponse(alines() if asynchronous else lines(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+async def _file_blocks(fh):
+    try:
+        while block := await sync_to_async(fh.read)(FILE_BLOCK_SIZE):
+            yield block
+    finally:
+        fh.close()
+
+
+def xlsx_response(filename, header, rows, asynchronous=False):
+    """
+    Write rows with openpyxl's write-only workbook (rows are flushed to a
+    temporary file, not kept in memory) and stream that file back.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=filename[:31])
+    ws.append(header)
+    for row in rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        ws.append([_plain(v) for v in row])
+
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    size = tmp.tell()
+    tmp.seek(0)
+    if not asynchronous:
+        return FileResponse(tmp, as_attachment=True, filename=f"{filename}.xlsx", content_type=XLSX_CONTENT_TYPE)
+
+    response = StreamingHttpResponse(_file_blocks(tmp), content_type=XLSX_CONTENT_TYPE)
+    response["Content-Length"] = str(size)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.xlsx"'
+    return response
+
+
+def export_response(request, filename, header, rows):
+    """CSV (default) or ?format=xlsx download of `rows`, streamed to suit the server interface."""
+    asynchronous = streams_async(request)
+    if request.GET.get("format") == "xlsx":
+        return xlsx_response(filename, header, rows, asynchronous)
+    return csv_response(filename, header, rows, asynchronous)
+
+
+# ============================
+# DATASETS
+# ============================
+def sms_log_rows(params):
+    """(header, values_list queryset) for broadcasts matching the log filters."""
+    header = ["id", "sent_at", "sender", "status", "recipients", "message"]
+    rows = (
+        filter_logs(params)
+        .order_by("-sent_at", "-id")
+        .values_list("id", "sent_at", "sender__username", "status", "recipient_count", "message")
+    )
+    return header, rows
+
+
+def sms_recipient_rows(params):
+    """(header, values_list queryset) with one line per delivered-to number."""
+    header = ["log_id", "phone", "status", "sent_at", "delivered_at", "provider_message_id"]
+    rows = (
+        SMSRecipient.objects.filter(log__in=filter_logs(params).values("id"))
+        .order_by("log_id", "id")
+        .values_list("log_id", "phone", "status", "sent_at", "delivered_at", "provider_message_id")
+    )
+    return header, rows
+
+
+def contact_rows(params):
+    """(header, values_list queryset) for the contact book, optionally one category."""
+    header = ["id", "name", "phone", "category", "region", "subregion"]
+    contacts = Contact.objects.all()
+    if params.get("category"):
+        contacts = contacts.filter(category__name__iexact=params["category"])
+    rows = (
+        contacts.order_by("id")
+        .values_list("id", "name", "phone", "category__name", "region__name", "subregion__name")
+    )
+    return header, rows
@@ -0,0 +1,186 @@
+import logging
+import tempfile
+
+import openpyxl
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_contacts_version
+from .models import Category, Contact, ImportJob, ImportUploadChunk, Region
+from .phone import normalize_phone
+from .regions import RegionLookup
+
+logger = logging.getLogger(__name__)
+
+
+def _clean(value):
+    """Cell value as a stripped string, or None when blank."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+# ============================
+# CONTACT IMPORT
+# ============================
+def import_contacts(excel_file, batch_size=None, on_progress=None):
+    """
+    Import contacts from an .xlsx file.
+
+    Expected columns (row 1 is a header): name, phone, category, region, subregion.
+    The workbook is streamed in read-only mode, categories, regions and
+    subregions are resolved from in-memory maps and contacts are upserted with bulk_create in batches,
+    so memory stays bounded by batch_size rather than the file size. Each
+    batch commits in its own transaction so progress is visible while the
+    import runs.
+
+    Phone numbers are normalized to E.164 and used as the upsert key, so
+    re-uploading a sheet updates existing contacts instead of duplicating them.
+
+    :param on_progress: Optional callback called with the stats after every batch.
+    :return: dict with "processed", "inserted", "updated", "skipped" and
+             "failed" row counts.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    stats = {"processed": 0, "inserted": 0, "updated": 0, "skipped": 0, "failed": 0}
+    max_name = Contact._meta.get_field('name').max_length
+    max_region = Region._meta.get_field('name').max_length
+
+    def flush(batch):
+        # batch is keyed by phone: one row per number, last occurrence wins
+        with transaction.atomic():
+            existing = Contact.objects.filter(phone__in=list(batch)).count()
+            Contact.objects.bulk_create(
+                batch.values(),
+                update_conflicts=True,
+                unique_fields=['phone'],
+                update_fields=['name', 'category', 'region', 'subregion'],
+            )
+        stats["inserted"] += len(batch) - existing
+        stats["updated"] += existing
+        if on_progress:
+            on_progress(stats)
+
+    wb = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        sheet = wb.active
+        categories = {c.name: c for c in Category.objects.all()}
+        regions = RegionLookup()
+        batch = {}
+
+        for row in sheet.iter_rows(min_row=2, values_only=True):
+            cells = [_clean(v) for v in row[:5]] + [None] * (5 - len(row[:5]))
+            if not any(cells):
+                continue  # blank/formatted-only rows
+
+            stats["processed"] += 1
+            name, phone, category_name, region, subregion = cells
+
+            if not (name and phone and category_name):
+                stats["skipped"] += 1
+                continue
+
+            phone = normalize_phone(phone)
+            if (not phone or len(name) > max_name
+                    or len(category_name) > max_name
+                    or len(region or "") > max_region or len(subregion or "") > max_region):
+                stats["failed"] += 1
+                continue
+
+            category = categories.get(category_name)
+            if category is None:
+                category = categories[category_name] = Category.objects.create(name=category_name)
+
+            region_id, subregion_id = regions.resolve(region, subregion, create=True)
+
+            if phone in batch:
+                stats["updated"] += 1  # repeated within the sheet
+            batch[phone] = Contact(
+                name=name,
+                phone=phone,
+                category=category,
+                region_id=region_id,
+                subregion_id=subregion_id
+            )
+
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = {}
+
+        if batch:
+            flush(batch)
+    finally:
+        wb.close()
+        if stats["inserted"] or stats["updated"]:
+            # bulk_create bypasses post_save, so invalidate cached contact lists here
+            bump_contacts_version()
+
+    logger.info(f"Contact import finished: {stats}")
+    return stats
+
+
+# ============================
+# BACKGROUND IMPORT JOBS
+# ============================
+def enqueue_import(user, uploaded_file):
+    """
+    Queue an ImportJob for `process_import_jobs` with the workbook stored as
+    IMPORT_UPLOAD_CHUNK_SIZE database rows, copied one chunk at a time. The
+    web and importer processes share the database, not a filesystem.
+    """
+    with transaction.atomic():
+        job = ImportJob.objects.create(
+            created_by=user if user and user.is_authenticated else None,
+            filename=uploaded_file.name[:255],
+        )
+        # read(size) rather than chunks(): in-memory uploads ignore the chunk size
+        uploaded_file.seek(0)
+        index = 0
+        while data := uploaded_file.read(settings.IMPORT_UPLOAD_CHUNK_SIZE):
+            ImportUploadChunk.objects.create(job=job, index=index, data=data)
+            index += 1
+    logger.info(f"Queued import job #{job.pk} ({job.filename})")
+    return job
+
+
+def _spool_upload(job):
+    """Copy the job's chunks into a temporary file, one row in memory at a time."""
+    workbook = tempfile.TemporaryFile()
+    chunks = job.chunks.order_by('index').values_list('data', flat=True)
+    for data in chunks.iterator(chunk_size=1):
+        workbook.write(data)
+    workbook.seek(0)
+    return workbook
+
+
+def process_import_job(job):
+    """Run a claimed ImportJob, saving row counts after every batch."""
+    logger.info(f"Processing import job #{job.pk} ({job.filename})")
+
+    def record_progress(stats):
+        job.rows_processed = stats["processed"]
+        job.rows_inserted = stats["inserted"]
+        job.rows_updated = stats["updated"]
+        job.rows_skipped = stats["skipped"]
+        job.rows_failed = stats["failed"]
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=[
+            'rows_processed', 'rows_inserted', 'rows_updated', 'rows_skipped', 'rows_failed', 'heartbeat_at',
+        ])
+
+    try:
+        with _spool_upload(job) as workbook:
+            stats = import_contacts(workbook, on_progress=record_progress)
+        record_progress(stats)
+        job.status = ImportJob.STATUS_DONE
+    except Exception as e:
+        logger.exception(f"Import job #{job.pk} failed")
+        job.status = ImportJob.STATUS_FAILED
+        job.error = f"Error processing file: {str(e)}"
+
+    job.chunks.all().delete()
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
@@ -0,0 +1,239 @@
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .balance import invalidate_balance
+from .dlr import apply_reports_for
+from .models import SMSJob, SMSLog, SMSRecipient
+from .phone import normalize_recipients
+from .celcom import close_async_client
+from .utils import asend_sms_batch, extract_message_ids, send_sms_batch
+
+logger = logging.getLogger(__name__)
+
+
+# ============================
+# ENQUEUE
+# ============================
+def enqueue_sms(user, message, recipients, category="", sender_id="BelovedChurch"):
+    """
+    Queue a broadcast for the background worker and return the job.
+    The HTTP request never waits on Celcom; `process_sms_jobs` does the sending.
+    Recipients are normalized to E.164 and de-duplicated, so a number that
+    appears twice (or in two spellings) is only charged once.
+    """
+    recipients, _ = normalize_recipients(recipients)
+    job = SMSJob.objects.create(
+        created_by=user if user and user.is_authenticated else None,
+        category=category or "",
+        message=message,
+        sender_id=sender_id,
+        recipients=recipients,
+        total=len(recipients),
+    )
+    logger.info(f"Queued SMS job #{job.pk} for {job.total} recipients")
+    return job
+
+
+def retry_failed(job):
+    """
+    Put a finished job with failed recipients back on the queue.
+    Returns False when there is nothing to resend.
+    """
+    if not job.is_finished or not job.failed:
+        return False
+
+    requeued = SMSJob.objects.filter(
+        pk=job.pk, status__in=[SMSJob.STATUS_DONE, SMSJob.STATUS_FAILED]
+    ).update(status=SMSJob.STATUS_QUEUED, error="", started_at=None, heartbeat_at=None, finished_at=None)
+    if requeued:
+        logger.info(f"Re-queued SMS job #{job.pk} for {job.failed} failed recipient(s)")
+    return bool(requeued)
+
+
+# ============================
+# CLAIM / REQUEUE
+# ============================
+def claim_next_job(model=SMSJob):
+    """
+    Atomically move the oldest queued job of `model` to RUNNING and return it.
+    The conditional UPDATE makes this safe with several workers: only one of
+    them sees a row count of 1 for a given job.
+    """
+    while True:
+        pk = (
+            model.objects.filter(status=model.STATUS_QUEUED)
+            .order_by('created_at', 'pk')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if pk is None:
+            return None
+
+        now = timezone.now()
+        claimed = model.objects.filter(pk=pk, status=model.STATUS_QUEUED).update(
+            status=model.STATUS_RUNNING,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            return model.objects.select_related('created_by').get(pk=pk)
+
+
+def requeue_stale_jobs(model=SMSJob):
+    """
+    Put jobs left RUNNING by a crashed worker back on the queue.
+    A job is stale when its heartbeat is older than SMS_JOB_STALE_AFTER, so a
+    long broadcast that is still making progress is never picked up twice.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.SMS_JOB_STALE_AFTER)
+    count = model.objects.filter(
+        status=model.STATUS_RUNNING, heartbeat_at__lt=cutoff
+    ).update(status=model.STATUS_QUEUED, started_at=None, heartbeat_at=None)
+    if count:
+        logger.warning(f"Re-queued {count} stale {model._meta.verbose_name}(s)")
+    return count
+
+
+# ============================
+# PROCESS
+# ============================
+def start_log(job):
+    """
+    Create the broadcast SMSLog and one queued SMSRecipient per number.
+    Rows are written with batched bulk_create, so a 5k-recipient job costs a
+    handful of INSERTs rather than one per number.
+    """
+    if job.log_id:
+        return job.log
+
+    with transaction.atomic():
+        log = SMSLog.objects.create(
+            sender=job.created_by,
+            message=job.message,
+            recipient_count=len(job.recipients),
+            status="queued"
+        )
+        SMSRecipient.objects.bulk_create(
+            [SMSRecipient(log=log, phone=phone) for phone in job.recipients],
+            batch_size=settings.SMS_LOG_BATCH_SIZE,
+        )
+        job.log = log
+        job.save(update_fields=['log'])
+    return log
+
+
+def record_message_ids(log, response):
+    """Store Celcom's per-number message ids so delivery reports can be matched."""
+    message_ids = extract_message_ids(response)
+    if not message_ids:
+        return
+
+    rows = list(SMSRecipient.objects.filter(log=log, phone__in=list(message_ids)).only('id', 'phone'))
+    for row in rows:
+        row.provider_message_id = message_ids[row.phone]
+    SMSRecipient.objects.bulk_update(rows, ['provider_message_id'], batch_size=settings.SMS_LOG_BATCH_SIZE)
+    # Reports can arrive before the send call returns
+    apply_reports_for(row.provider_message_id for row in rows)
+
+
+def hold_job(job, log, held_count):
+    """Return a job whose chunks were refused by the circuit breaker to the queue."""
+    log.status = "held"
+    log.save(update_fields=['status'])
+
+    job.status = SMSJob.STATUS_QUEUED
+    job.started_at = None
+    job.heartbeat_at = None
+    job.error = f"Celcom unavailable; {held_count} recipient(s) held until it recovers."
+    job.save(update_fields=['status', 'sent', 'failed', 'error', 'started_at', 'heartbeat_at'])
+    logger.warning(f"SMS job #{job.pk} held: {held_count} recipient(s) waiting for the circuit to close")
+    return job
+
+
+async def _async_dispatch(*args, **kwargs):
+    # async_to_sync runs each job on a fresh event loop; close its pool with it
+    try:
+        return await asend_sms_batch(*args, **kwargs)
+    finally:
+        await close_async_client()
+
+
+def process_job(job):
+    """
+    Send a claimed job through the SMS provider in chunks and record the outcome.
+    Numbers already marked sent are skipped, so a retried job only pays for
+    the recipients that failed last time; pending numbers are read in id
+    order so a rerun cuts the same chunks and reuses their idempotency keys.
+    Chunks refused by an open circuit breaker stay queued and the job goes
+    back on the queue (held) instead of being marked failed.
+    """
+    log = start_log(job)
+    pending = list(
+        log.deliveries.filter(
+            status__in=[SMSRecipient.STATUS_QUEUED, SMSRecipient.STATUS_FAILED]
+        ).order_by('id').values_list('phone', flat=True)
+    )
+    job.sent = job.total - len(pending)
+    job.failed = 0
+    held = []
+    errors = []
+    logger.info(f"Processing SMS job #{job.pk} ({len(pending)} of {job.total} recipients pending)")
+
+    def record_chunk(result):
+        if result.get("circuit_open"):
+            held.extend(result["recipients"])
+            return
+
+        if result.get("status") == "ok":
+            job.sent += len(result["recipients"])
+            status = SMSRecipient.STATUS_SENT
+        else:
+            job.failed += len(result["recipients"])
+            status = SMSRecipient.STATUS_FAILED
+            errors.append(result.get("message") or str(result.get("response", "")))
+
+        SMSRecipient.objects.filter(log=log, phone__in=result["recipients"]).update(
+            status=status, sent_at=timezone.now(), dispatch_key=result["idempotency_key"]
+        )
+        if status == SMSRecipient.STATUS_SENT:
+            record_message_ids(log, result.get("response"))
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=['sent', 'failed', 'heartbeat_at'])
+
+    try:
+        # CELCOM_ASYNC_DISPATCH keeps hundreds of chunks in flight on one event loop
+        dispatch = async_to_sync(_async_dispatch) if settings.CELCOM_ASYNC_DISPATCH else send_sms_batch
+        dispatch(
+            job.message, pending, job.sender_id,
+            on_result=record_chunk,
+            idempotency_prefix=f"job{job.pk}",
+        )
+    except Exception as e:
+        logger.exception(f"SMS job #{job.pk} crashed")
+        job.failed = job.total - job.sent
+        errors.append(str(e))
+
+    if held:
+        return hold_job(job, log, len(held))
+
+    if job.sent and not job.failed:
+        log.status = "ok"
+    elif job.sent:
+        log.status = "partial"
+    else:
+        log.status = "error"
+    log.save(update_fields=['status'])
+
+    if job.sent:
+        invalidate_balance()
+
+    job.status = SMSJob.STATUS_DONE if job.sent else SMSJob.STATUS_FAILED
+    job.error = "; ".join(e for e in dict.fromkeys(errors) if e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'sent', 'failed', 'error', 'finished_at'])
+    return job
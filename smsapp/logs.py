@@ -0,0 +1,121 @@
+import base64
+from datetime import datetime, time
+
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import SMSLog
+from .search import search_logs
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+# ============================
+# KEYSET CURSORS
+# ============================
+def encode_cursor(log):
+    """Opaque cursor pointing just past `log` in (-sent_at, -id) order."""
+    raw = f"{log.sent_at.isoformat()}|{log.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (sent_at, id) from a cursor, or None if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sent_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        sent_at = parse_datetime(sent_at)
+        return (sent_at, int(pk)) if sent_at else None
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+# ============================
+# FILTERED LOG PAGES
+# ============================
+def _day_bound(value, end=False):
+    day = parse_date(value or "")
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.combine(day, time.max if end else time.min))
+
+
+def filter_logs(params):
+    """
+    Apply sender/status/date filters from a QueryDict-like `params`:
+    sender (user id or username), status, date_from and date_to (YYYY-MM-DD),
+    and q (full-text search over the message).
+    """
+    logs = SMSLog.objects.all()
+
+    sender = (params.get("sender") or "").strip()
+    if sender:
+        if sender.isdigit():
+            logs = logs.filter(sender_id=int(sender))
+        else:
+            # Resolve the username once so the log query stays on the sender_id index
+            sender_id = (
+                get_user_model().objects.filter(username__iexact=sender)
+                .values_list("pk", flat=True).first()
+            )
+            logs = logs.filter(sender_id=sender_id) if sender_id else logs.none()
+
+    status = (params.get("status") or "").strip()
+    if status:
+        logs = logs.filter(status=status)
+
+    date_from = _day_bound(params.get("date_from"))
+    if date_from:
+        logs = logs.filter(sent_at__gte=date_from)
+    date_to = _day_bound(params.get("date_to"), end=True)
+    if date_to:
+        logs = logs.filter(sent_at__lte=date_to)
+
+    q = (params.get("q") or "").strip()
+    if q:
+        logs = search_logs(logs, q)
+
+    return logs
+
+
+def get_log_page(params):
+    """
+    One page of SMS logs, newest first, using keyset pagination on
+    (sent_at, id) so page N costs the same as page 1.
+    :return: dict with "logs", "next_cursor" and "limit".
+    """
+    try:
+        limit = min(MAX_PAGE_SIZE, max(1, int(params.get("limit") or DEFAULT_PAGE_SIZE)))
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+
+    logs = filter_logs(params).select_related("sender").order_by("-sent_at", "-id")
+
+    position = decode_cursor(params.get("cursor") or "")
+    if position:
+        sent_at, pk = position
+        logs = logs.filter(Q(sent_at__lt=sent_at) | Q(sent_at=sent_at, id__lt=pk))
+
+    rows = list(logs[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "logs": rows,
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+        "limit": limit,
+    }
+
+
+def log_as_dict(log):
+    return {
+        "id": log.pk,
+        "sender": log.sender.username if log.sender else None,
+        "message": log.message,
+        "recipient_count": log.recipient_count,
+        "status": log.status,
+        "sent_at": log.sent_at.isoformat(),
+    }
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from smsapp.retention import archive_logs
+
+
+class Command(BaseCommand):
+    help = (
+        "Move SMS logs older than the retention period into compressed archive rows, "
+        "after rolling them up into daily totals. Safe to run repeatedly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help="Keep this many days of raw logs (default: SMS_LOG_RETENTION_DAYS)."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help="Logs per archive row / transaction (default: SMS_ARCHIVE_BATCH_SIZE)."
+        )
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help="Stop after this many batches (to bound run time)."
+        )
+
+    def handle(self, *args, **options):
+        days = settings.SMS_LOG_RETENTION_DAYS if options['days'] is None else options['days']
+        archived, batches = archive_logs(
+            retention_days=days,
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(f"Archived {archived} log(s) older than {days} day(s) in {batches} batch(es).")
@@ -0,0 +1,59 @@
+import contextlib
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from smsapp.benchmarks import run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the contact listing, log browsing, import and broadcast hot paths "
+        "against a throwaway test database and print the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--contacts', type=int, default=5000, help="Contacts to seed (default: 5000).")
+        parser.add_argument('--logs', type=int, default=5000, help="SMS logs to seed (default: 5000).")
+        parser.add_argument('--import-rows', type=int, default=5000, help="Rows in the generated XLSX upload.")
+        parser.add_argument('--recipients', type=int, default=2000, help="Recipients per benchmark broadcast.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per latency measurement.")
+        parser.add_argument('--chunk-size', type=int, default=100, help="Recipients per provider request.")
+        parser.add_argument(
+            '--stub-latency', type=float, default=0.05, help="Seconds per stub provider call (default: 0.05)."
+        )
+        parser.add_argument('--output', help="Write the JSON here instead of stdout.")
+
+    def handle(self, *args, **options):
+        # Same isolation as the test runner: a fresh test database, dropped afterwards
+        setup_test_environment()
+        # createcachetable reports on stdout, which must stay pure JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            old_config = setup_databases(
+                verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set()
+            )
+        try:
+            results = run_benchmarks(
+                contacts=options['contacts'],
+                logs=options['logs'],
+                import_rows=options['import_rows'],
+                recipients=options['recipients'],
+                repeat=max(1, options['repeat']),
+                chunk_size=options['chunk_size'],
+                stub_latency=options['stub_latency'],
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + "\n")
+            self.stdout.write(f"Benchmark results written to {options['output']}")
+        else:
+            self.stdout.write(output)
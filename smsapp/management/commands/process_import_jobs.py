@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from smsapp.importer import process_import_job
+from smsapp.jobs import claim_next_job, requeue_stale_jobs
+from smsapp.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = "Process uploaded contact workbooks queued by the upload page."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Process every queued import and exit instead of polling forever."
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help="Seconds to sleep when the queue is empty (default: SMS_WORKER_POLL_INTERVAL)."
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval'] or settings.SMS_WORKER_POLL_INTERVAL
+        self.stdout.write("Import worker started.")
+
+        while True:
+            requeue_stale_jobs(ImportJob)
+            job = claim_next_job(ImportJob)
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            job = process_import_job(job)
+            self.stdout.write(
+                f"Import #{job.pk}: {job.status} ({job.rows_inserted} inserted, {job.rows_updated} updated, "
+                f"{job.rows_skipped} skipped, {job.rows_failed} failed)"
+            )
+
+        self.stdout.write("Import worker finished.")
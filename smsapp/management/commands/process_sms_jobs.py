@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from smsapp.circuit import get_breaker
+from smsapp.jobs import claim_next_job, process_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Drain the outbound SMS job queue (run as a separate worker process)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Process every queued job and exit instead of polling forever."
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help="Seconds to sleep when the queue is empty (default: SMS_WORKER_POLL_INTERVAL)."
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval'] or settings.SMS_WORKER_POLL_INTERVAL
+        self.stdout.write("SMS worker started.")
+
+        breaker = get_breaker()
+
+        while True:
+            if breaker.is_open():
+                # Celcom is down: leave jobs queued rather than failing them
+                if options['once']:
+                    self.stdout.write("Celcom circuit open; queued jobs held.")
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            requeue_stale_jobs()
+            job = claim_next_job()
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            job = process_job(job)
+            self.stdout.write(f"Job #{job.pk}: {job.status} ({job.sent}/{job.total} sent)")
+
+        self.stdout.write("SMS worker finished.")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from smsapp.search import install_search_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the full-text search indexes for SMS messages and contact names. "
+        "Needed on SQLite after a migration rebuilds smsapp_smslog or smsapp_contact."
+    )
+
+    def handle(self, *args, **options):
+        with connection.schema_editor() as schema_editor:
+            install_search_indexes(schema_editor)
+        self.stdout.write(f"Search indexes rebuilt ({connection.vendor}).")
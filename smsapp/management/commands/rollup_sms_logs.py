@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from smsapp.retention import rollup_days
+
+
+class Command(BaseCommand):
+    help = "Rebuild daily per-sender/per-status SMS rollups (run daily, e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=2,
+            help="Number of most recent days to recompute, including today (default: 2)."
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        start = today - timedelta(days=max(1, options['days']) - 1)
+        written = rollup_days(start, today + timedelta(days=1))
+        self.stdout.write(f"Wrote {written} rollup row(s) for {start} to {today}.")
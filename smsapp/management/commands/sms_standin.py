@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from smsapp.providers.standin import StandInServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local HTTP stand-in for the Celcom API. Point CELCOM_API_URL and "
+        "CELCOM_API_BALANCE_URL at it to load-test sending without spending credit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8025)
+        parser.add_argument('--latency', type=float, default=0.1, help="Seconds per request (default: 0.1).")
+        parser.add_argument('--jitter', type=float, default=0.0, help="+/- seconds of random latency.")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 500.")
+        parser.add_argument('--max-rps', type=float, default=0.0, help="Requests/sec before 429s (0 = no cap).")
+        parser.add_argument(
+            '--max-recipients', type=float, default=0.0, help="Recipients/sec before 429s (0 = no cap)."
+        )
+
+    def handle(self, *args, **options):
+        server = StandInServer(
+            (options['host'], options['port']),
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            max_rps=options['max_rps'],
+            max_recipients=options['max_recipients'],
+        )
+        host, port = server.server_address[:2]
+        self.stdout.write(f"Celcom stand-in listening on http://{host}:{port}/ (Ctrl+C to stop)")
+        started = time.monotonic()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"Stand-in stats after {elapsed:.0f}s: {server.stats}")
@@ -0,0 +1,219 @@
+import contextlib
+import contextvars
+import threading
+import time
+
+_lock = threading.Lock()
+_gauges = {}
+
+
+# ============================
+# IN-PROCESS METRICS REGISTRY
+# ============================
+def register_gauge(name, help_text, func):
+    """
+    Register a gauge whose value is read from func() at collection time.
+    Re-registering a name replaces the previous callback.
+    """
+    with _lock:
+        _gauges[name] = (help_text, func)
+
+
+def collect_gauges():
+    """Return {name: (help_text, value)} for every registered gauge."""
+    with _lock:
+        gauges = dict(_gauges)
+
+    values = {}
+    for name, (help_text, func) in gauges.items():
+        try:
+            values[name] = (help_text, float(func()))
+        except Exception:
+            continue
+    return values
+
+
+# ============================
+# COUNTERS AND HISTOGRAMS
+# ============================
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = {}  # name -> Counter / Histogram
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        """[(sample name, {label: value}, value)] for exposition."""
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, Prometheus style."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(row) for key, row in self._values.items()}
+
+        samples = []
+        for key, row in sorted(values.items()):
+            labels = dict(zip(self.labels, key))
+            for bound, count in zip(self.buckets, row):
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count))
+            samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, row[-1]))
+            samples.append((f"{self.name}_sum", labels, row[-2]))
+            samples.append((f"{self.name}_count", labels, row[-1]))
+        return samples
+
+
+def _register(cls, name, *args, **kwargs):
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+
+def counter(name, help_text, labels=()):
+    """Return the counter called `name`, creating it on first use."""
+    return _register(Counter, name, help_text, labels)
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    """Return the histogram called `name`, creating it on first use."""
+    return _register(Histogram, name, help_text, labels, buckets)
+
+
+# ============================
+# PROMETHEUS EXPOSITION
+# ============================
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample_line(name, labels, value):
+    if labels:
+        rendered = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        return f"{name}{{{rendered}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+def render_prometheus():
+    """
+    Every gauge, counter and histogram in the Prometheus text format (0.0.4).
+    Values are per process: each web worker reports its own traffic.
+    """
+    lines = []
+    for name, (help_text, value) in sorted(collect_gauges().items()):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", _sample_line(name, {}, value)]
+
+    with _lock:
+        metrics = sorted(_metrics.items())
+    for name, metric in metrics:
+        lines += [f"# HELP {name} {metric.help_text}", f"# TYPE {name} {metric.kind}"]
+        lines += [_sample_line(*sample) for sample in metric.samples()]
+    return "\n".join(lines) + "\n"
+
+
+# ============================
+# PER-REQUEST TIMINGS
+# ============================
+class RequestStats:
+    """Where one request's time went: DB queries and outbound Celcom calls."""
+
+    __slots__ = ("queries", "db_seconds", "celcom_calls", "celcom_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.celcom_calls = 0
+        self.celcom_seconds = 0.0
+
+
+_request_stats = contextvars.ContextVar("smsapp_request_stats", default=None)
+
+
+@contextlib.contextmanager
+def request_scope():
+    """
+    Collect RequestStats for the code inside the block. The stats live in a
+    context variable, so DB work done through sync_to_async in an async view
+    is still attributed to its request.
+    """
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+
+
+def record_celcom_call(seconds):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.celcom_calls += 1
+        stats.celcom_seconds += seconds
+
+
+def query_timer(execute, sql, params, many, context):
+    """connection.execute_wrapper hook that times queries run inside a request_scope()."""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver: add query_timer to every new DB connection."""
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
@@ -0,0 +1,86 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = metrics.histogram(
+    "http_request_duration_seconds",
+    "Time from the first middleware to the response, per view.",
+    labels=("view", "method"),
+)
+REQUEST_COUNT = metrics.counter(
+    "http_requests_total",
+    "Responses sent, per view and status code.",
+    labels=("view", "method", "status"),
+)
+REQUEST_QUERIES = metrics.histogram(
+    "http_request_db_queries",
+    "SQL queries run while handling one request.",
+    labels=("view",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+REQUEST_DB_TIME = metrics.histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in SQL while handling one request.",
+    labels=("view",),
+)
+
+
+# ============================
+# REQUEST METRICS MIDDLEWARE
+# ============================
+class MetricsMiddleware:
+    """
+    Record latency, status and SQL query count/time for every request, and
+    log requests slower than SLOW_REQUEST_THRESHOLD_MS with a breakdown of
+    SQL vs. Celcom time. Works for sync and async views alike.
+
+    For streaming responses (exports) only the time to the first byte is
+    measured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with metrics.request_scope() as stats:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        with metrics.request_scope() as stats:
+            started = time.perf_counter()
+            response = await self.get_response(request)
+            self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, stats, elapsed):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+
+        REQUEST_LATENCY.observe(elapsed, view=view, method=request.method)
+        REQUEST_COUNT.inc(view=view, method=request.method, status=response.status_code)
+        REQUEST_QUERIES.observe(stats.queries, view=view)
+        REQUEST_DB_TIME.observe(stats.db_seconds, view=view)
+
+        threshold = settings.SLOW_REQUEST_THRESHOLD_MS
+        if threshold and elapsed * 1000 >= threshold:
+            logger.warning(
+                f"Slow request {request.method} {request.path} ({view}) -> {response.status_code}: "
+                f"{elapsed * 1000:.0f}ms total, {stats.queries} queries in {stats.db_seconds * 1000:.0f}ms, "
+                f"{stats.celcom_calls} Celcom calls in {stats.celcom_seconds * 1000:.0f}ms"
+            )
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+LEGACY_STATUS_MAP = {'ok': 'sent', 'error': 'failed'}
+
+
+def split_legacy_recipients(apps, schema_editor):
+    """Turn each old comma-joined `recipients` string into SMSRecipient rows."""
+    SMSLog = apps.get_model('smsapp', 'SMSLog')
+    SMSRecipient = apps.get_model('smsapp', 'SMSRecipient')
+
+    batch = []
+    for log in SMSLog.objects.only('id', 'recipients', 'status', 'sent_at').iterator(chunk_size=500):
+        phones = [p.strip()[:15] for p in (log.recipients or '').split(',') if p.strip()]
+        status = LEGACY_STATUS_MAP.get(log.status, log.status or 'queued')
+        batch.extend(
+            SMSRecipient(log_id=log.id, phone=phone, status=status, sent_at=log.sent_at)
+            for phone in phones
+        )
+        SMSLog.objects.filter(pk=log.pk).update(recipient_count=len(phones))
+
+        if len(batch) >= 1000:
+            SMSRecipient.objects.bulk_create(batch)
+            batch = []
+
+    SMSRecipient.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0008_smsjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smsjob',
+            name='log',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='job', to='smsapp.smslog'),
+        ),
+        migrations.AddField(
+            model_name='smslog',
+            name='recipient_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='SMSRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=15)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('sent', 'Sent'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('log', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='smsapp.smslog')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['phone', 'sent_at'], name='smsapp_smsr_phone_88d904_idx'), models.Index(fields=['status', 'sent_at'], name='smsapp_smsr_status_30b1d5_idx'), models.Index(fields=['sent_at'], name='smsapp_smsr_sent_at_328561_idx')],
+            },
+        ),
+        migrations.RunPython(split_legacy_recipients, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='smslog',
+            name='recipients',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0010_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='rows_updated',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:45
+
+import logging
+import re
+from collections import defaultdict
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(value, country_code="254"):
+    """
+    Frozen copy of smsapp.phone.normalize_phone() as of this migration, so
+    later changes to the app code cannot change what it does.
+    """
+    if value is None:
+        return None
+
+    raw = str(value).strip()
+    if raw.endswith(".0"):  # numeric Excel cell read as float
+        raw = raw[:-2]
+
+    international = raw.startswith("+") or raw.startswith("00")
+    digits = _NON_DIGITS.sub("", raw)
+    if raw.startswith("00"):
+        digits = digits[2:]
+
+    if not international:
+        if digits.startswith(country_code) and len(digits) == len(country_code) + 9:
+            pass
+        elif digits.startswith("0") and len(digits) == 10:
+            digits = country_code + digits[1:]
+        elif len(digits) == 9 and digits[0] in "17":
+            digits = country_code + digits
+        else:
+            return None
+
+    if digits.startswith(country_code) and len(digits) != len(country_code) + 9:
+        return None
+    if not 8 <= len(digits) <= 15:
+        return None
+
+    return "+" + digits
+
+
+def normalize_and_dedupe_phones(apps, schema_editor):
+    """
+    Rewrite Contact.phone in E.164 form and drop duplicate contacts
+    (keeping the oldest row) so the unique index can be created.
+
+    Only numbers that normalize are merged; every deleted row is logged.
+    Unparseable or blank phones are left as they are and reported. If the
+    same unparseable value is shared by several contacts the migration stops,
+    since those rows cannot be told apart safely; fix them and migrate again.
+    """
+    Contact = apps.get_model('smsapp', 'Contact')
+    kept = {}
+    invalid = defaultdict(list)
+    duplicate_ids = []
+    changed = []
+
+    for contact in Contact.objects.only('id', 'phone').order_by('id').iterator(chunk_size=1000):
+        phone = normalize_phone(contact.phone)
+        if phone is None:
+            invalid[(contact.phone or '').strip()].append(contact.id)
+            continue
+        if phone in kept:
+            logger.warning(f"Deleting contact #{contact.id} ({contact.phone}): duplicate of #{kept[phone]}")
+            duplicate_ids.append(contact.id)
+            continue
+        kept[phone] = contact.id
+        if phone != contact.phone:
+            contact.phone = phone
+            changed.append(contact)
+
+    for raw, ids in invalid.items():
+        logger.warning(f"Contact(s) {ids} keep invalid phone {raw!r}")
+    clashes = {raw: ids for raw, ids in invalid.items() if len(ids) > 1 or raw in kept}
+    if clashes:
+        details = "; ".join(f"{raw!r}: contacts {ids}" for raw, ids in clashes.items())
+        raise RuntimeError(f"Contacts share an invalid phone number; fix them before migrating: {details}")
+
+    for start in range(0, len(duplicate_ids), 500):
+        Contact.objects.filter(id__in=duplicate_ids[start:start + 500]).delete()
+    Contact.objects.bulk_update(changed, ['phone'], batch_size=500)
+    if duplicate_ids:
+        logger.warning(f"Deleted {len(duplicate_ids)} duplicate contact(s)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0011_importjob_rows_updated'),
+    ]
+
+    operations = [
+        # E.164 allows 15 digits, i.e. 16 characters with the "+"
+        migrations.AlterField(
+            model_name='contact',
+            name='phone',
+            field=models.CharField(max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='pastor',
+            name='phone',
+            field=models.CharField(max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='smsrecipient',
+            name='phone',
+            field=models.CharField(max_length=16),
+        ),
+        migrations.RunPython(normalize_and_dedupe_phones, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='contact',
+            name='phone',
+            field=models.CharField(max_length=16, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0012_unique_contact_phone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smsrecipient',
+            name='dispatch_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
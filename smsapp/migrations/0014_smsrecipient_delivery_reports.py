@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0013_smsrecipient_dispatch_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smsrecipient',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='smsrecipient',
+            name='provider_message_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='smsrecipient',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('sent', 'Sent'), ('failed', 'Failed'), ('delivered', 'Delivered'), ('undelivered', 'Undelivered')], default='queued', max_length=20),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0014_smsrecipient_delivery_reports'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='smslog',
+            index=models.Index(fields=['-sent_at', '-id'], name='smslog_sent_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='smslog',
+            index=models.Index(fields=['status', '-sent_at'], name='smslog_status_sent_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='smslog',
+            index=models.Index(fields=['sender', '-sent_at'], name='smslog_sender_sent_at_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0015_smslog_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SMSLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField()),
+                ('period_end', models.DateTimeField()),
+                ('log_count', models.PositiveIntegerField(default=0)),
+                ('recipient_count', models.PositiveIntegerField(default=0)),
+                ('payload', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['period_start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SMSDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sender_username', models.CharField(blank=True, max_length=150)),
+                ('status', models.CharField(max_length=20)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('recipient_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day', 'sender_username', 'status'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'sender_username', 'status'), name='smsrollup_day_sender_status_uniq')],
+            },
+        ),
+    ]
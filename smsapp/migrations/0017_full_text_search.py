@@ -0,0 +1,80 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:20
+
+import logging
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+# Postgres text search configuration, as smsapp.search.PG_CONFIG
+PG_CONFIG = 'simple'
+
+# model -> (indexed text column, Postgres index base name)
+SEARCH_TARGETS = {
+    'smslog': ('message', 'smslog_message_fts'),
+    'contact': ('name', 'contact_name_fts'),
+}
+
+
+def sqlite_statements(table, column):
+    """
+    Frozen copy of the FTS5 DDL in smsapp.search: an external-content table
+    kept in sync with `table` by triggers. The first four drop it.
+    """
+    fts = f'{table}_fts'
+    return [
+        f"DROP TRIGGER IF EXISTS {fts}_ai",
+        f"DROP TRIGGER IF EXISTS {fts}_ad",
+        f"DROP TRIGGER IF EXISTS {fts}_au",
+        f"DROP TABLE IF EXISTS {fts}",
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({column}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def install(apps, schema_editor):
+    # GIN over to_tsvector() on Postgres, FTS5 table + triggers on SQLite
+    connection = schema_editor.connection
+    for model_name, (column, name) in SEARCH_TARGETS.items():
+        model = apps.get_model('smsapp', model_name)
+        if connection.vendor == 'postgresql':
+            from django.contrib.postgres.indexes import GinIndex
+            from django.contrib.postgres.search import SearchVector
+
+            schema_editor.add_index(model, GinIndex(SearchVector(column, config=PG_CONFIG), name=f'{name}_idx'))
+        elif connection.vendor == 'sqlite':
+            try:
+                for sql in sqlite_statements(model._meta.db_table, column):
+                    schema_editor.execute(sql)
+            except Exception as e:
+                logger.warning(f"FTS5 unavailable, {model_name} search will use LIKE: {e}")
+
+
+def remove(apps, schema_editor):
+    connection = schema_editor.connection
+    for model_name, (column, name) in SEARCH_TARGETS.items():
+        model = apps.get_model('smsapp', model_name)
+        if connection.vendor == 'postgresql':
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}_idx")
+        elif connection.vendor == 'sqlite':
+            for sql in sqlite_statements(model._meta.db_table, column)[:4]:
+                schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0016_sms_retention'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, remove),
+    ]
@@ -0,0 +1,184 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:40
+
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+MODELS = ('contact', 'pastor', 'segment')
+
+
+def _clean(value):
+    return " ".join(str(value or "").split())
+
+
+def _key(value):
+    return _clean(value).casefold()
+
+
+def canonicalize_regions(apps, schema_editor):
+    """
+    Turn the free-text region/subregion columns into Region/Subregion rows.
+    Spelling variants that differ only in case or spacing share one row,
+    named after the most common variant.
+    """
+    Region = apps.get_model('smsapp', 'Region')
+    Subregion = apps.get_model('smsapp', 'Subregion')
+
+    region_names = defaultdict(Counter)   # key -> variant counts
+    subregion_names = defaultdict(Counter)  # (region key, key) -> variant counts
+    pairs = {}
+    for model_name in MODELS:
+        model = apps.get_model('smsapp', model_name)
+        rows = model.objects.values_list('pk', 'region_text', 'subregion_text')
+        pairs[model_name] = list(rows)
+        for _, region, subregion in pairs[model_name]:
+            if _key(region):
+                region_names[_key(region)][_clean(region)] += 1
+            if _key(subregion):
+                subregion_names[(_key(region), _key(subregion))][_clean(subregion)] += 1
+
+    regions = {
+        key: Region.objects.create(key=key, name=variants.most_common(1)[0][0])
+        for key, variants in region_names.items()
+    }
+    subregions = {
+        (region_key, key): Subregion.objects.create(
+            region=regions.get(region_key), key=key, name=variants.most_common(1)[0][0]
+        )
+        for (region_key, key), variants in subregion_names.items()
+    }
+
+    for model_name, rows in pairs.items():
+        model = apps.get_model('smsapp', model_name)
+        updates = []
+        for pk, region, subregion in rows:
+            region_obj = regions.get(_key(region))
+            subregion_obj = subregions.get((_key(region), _key(subregion)))
+            if region_obj or subregion_obj:
+                updates.append(model(pk=pk, region=region_obj, subregion=subregion_obj))
+        model.objects.bulk_update(updates, ['region', 'subregion'], batch_size=500)
+
+
+def restore_region_text(apps, schema_editor):
+    for model_name in MODELS:
+        model = apps.get_model('smsapp', model_name)
+        blank = '' if model_name == 'segment' else None  # segment columns are NOT NULL
+        updates = [
+            model(pk=obj.pk,
+                  region_text=obj.region.name if obj.region else blank,
+                  subregion_text=obj.subregion.name if obj.subregion else blank)
+            for obj in model.objects.select_related('region', 'subregion')
+        ]
+        model.objects.bulk_update(updates, ['region_text', 'subregion_text'], batch_size=500)
+
+
+# Contact FTS5 table and triggers, as created by migration 0017
+CONTACT_FTS_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS smsapp_contact_fts_ai",
+    "DROP TRIGGER IF EXISTS smsapp_contact_fts_ad",
+    "DROP TRIGGER IF EXISTS smsapp_contact_fts_au",
+    "DROP TABLE IF EXISTS smsapp_contact_fts",
+    "CREATE VIRTUAL TABLE smsapp_contact_fts USING fts5(name, content='smsapp_contact', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER smsapp_contact_fts_ai AFTER INSERT ON smsapp_contact BEGIN "
+    "INSERT INTO smsapp_contact_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER smsapp_contact_fts_ad AFTER DELETE ON smsapp_contact BEGIN "
+    "INSERT INTO smsapp_contact_fts(smsapp_contact_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER smsapp_contact_fts_au AFTER UPDATE OF name ON smsapp_contact BEGIN "
+    "INSERT INTO smsapp_contact_fts(smsapp_contact_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO smsapp_contact_fts(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO smsapp_contact_fts(smsapp_contact_fts) VALUES ('rebuild')",
+]
+
+
+def reinstall_contact_search(apps, schema_editor):
+    # SQLite may have rebuilt smsapp_contact, dropping its FTS triggers;
+    # the Postgres GIN index is untouched by the column changes
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        tables = schema_editor.connection.introspection.table_names(cursor)
+    if 'smsapp_contact_fts' not in tables:
+        return  # FTS5 was unavailable when 0017 ran
+    for sql in CONTACT_FTS_STATEMENTS:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0018_segment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Region',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(editable=False, max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Subregion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(db_index=True, editable=False, max_length=100)),
+                ('region', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subregions', to='smsapp.region')),
+            ],
+            options={
+                'ordering': ['name'],
+                'constraints': [models.UniqueConstraint(fields=('region', 'key'), name='subregion_region_key_uniq')],
+            },
+        ),
+        # Keep the old text while the lookup rows are built
+        migrations.RenameField(model_name='contact', old_name='region', new_name='region_text'),
+        migrations.RenameField(model_name='contact', old_name='subregion', new_name='subregion_text'),
+        migrations.RenameField(model_name='pastor', old_name='region', new_name='region_text'),
+        migrations.RenameField(model_name='pastor', old_name='subregion', new_name='subregion_text'),
+        migrations.RenameField(model_name='segment', old_name='region', new_name='region_text'),
+        migrations.RenameField(model_name='segment', old_name='subregion', new_name='subregion_text'),
+        migrations.AddField(
+            model_name='contact',
+            name='region',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='contacts', to='smsapp.region'),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='subregion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='contacts', to='smsapp.subregion'),
+        ),
+        migrations.AddField(
+            model_name='pastor',
+            name='region',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pastors', to='smsapp.region'),
+        ),
+        migrations.AddField(
+            model_name='pastor',
+            name='subregion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pastors', to='smsapp.subregion'),
+        ),
+        migrations.AddField(
+            model_name='segment',
+            name='region',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='smsapp.region'),
+        ),
+        migrations.AddField(
+            model_name='segment',
+            name='subregion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='smsapp.subregion'),
+        ),
+        migrations.RunPython(canonicalize_regions, restore_region_text),
+        migrations.RemoveField(model_name='contact', name='region_text'),
+        migrations.RemoveField(model_name='contact', name='subregion_text'),
+        migrations.RemoveField(model_name='pastor', name='region_text'),
+        migrations.RemoveField(model_name='pastor', name='subregion_text'),
+        migrations.RemoveField(model_name='segment', name='region_text'),
+        migrations.RemoveField(model_name='segment', name='subregion_text'),
+        migrations.RunPython(reinstall_contact_search, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:10
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # Only does anything for DatabaseCache backends, and skips existing tables;
+    # run `manage.py createcachetable` again after changing CACHE_LOCATION.
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0019_regions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
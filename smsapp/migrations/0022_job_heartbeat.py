@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:27
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_heartbeat(apps, schema_editor):
+    # Jobs running during the deploy count from their start, as before
+    for name in ('SMSJob', 'ImportJob'):
+        apps.get_model('smsapp', name).objects.filter(status='running').update(heartbeat_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0021_delivery_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='smsjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_heartbeat, migrations.RunPython.noop),
+    ]
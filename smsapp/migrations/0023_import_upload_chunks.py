@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 1048576
+
+
+def move_payloads_to_chunks(apps, schema_editor):
+    # Unfinished jobs keep their workbook; finished ones had it cleared already
+    ImportJob = apps.get_model('smsapp', 'ImportJob')
+    ImportUploadChunk = apps.get_model('smsapp', 'ImportUploadChunk')
+    jobs = ImportJob.objects.filter(status__in=['queued', 'running']).exclude(payload=b'')
+    for job in jobs.iterator(chunk_size=1):
+        payload = bytes(job.payload)
+        ImportUploadChunk.objects.bulk_create(
+            ImportUploadChunk(job=job, index=index, data=payload[start:start + CHUNK_SIZE])
+            for index, start in enumerate(range(0, len(payload), CHUNK_SIZE))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0022_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportUploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='smsapp.importjob')),
+            ],
+            options={
+                'ordering': ['job', 'index'],
+                'constraints': [models.UniqueConstraint(fields=('job', 'index'), name='importchunk_job_index_uniq')],
+            },
+        ),
+        migrations.RunPython(move_payloads_to_chunks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='importjob',
+            name='payload',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smsapp', '0023_import_upload_chunks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('request_tat', models.FloatField(default=0.0)),
+                ('recipient_tat', models.FloatField(default=0.0)),
+                ('factor', models.FloatField(default=1.0)),
+                ('paused_until', models.FloatField(default=0.0)),
+            ],
+        ),
+    ]
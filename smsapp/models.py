@@ -2,6 +2,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from .phone import normalize_phone
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -9,42 +11,327 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+def region_key(value):
+    """Canonical lookup key: whitespace collapsed, case folded ('' when blank)."""
+    return " ".join(str(value or "").split()).casefold()
+
+
+# Canonical regions; `key` makes "Nairobi", " nairobi " and "NAIROBI" one row.
+class Region(models.Model):
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, unique=True, editable=False)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.name = " ".join(self.name.split())
+        self.key = region_key(self.name)
+        super().save(*args, **kwargs)
+
+
+class Subregion(models.Model):
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, null=True, blank=True, related_name='subregions')
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, editable=False, db_index=True)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(fields=['region', 'key'], name='subregion_region_key_uniq'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.name = " ".join(self.name.split())
+        self.key = region_key(self.name)
+        super().save(*args, **kwargs)
+
+
 class Contact(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
-    phone = models.CharField(max_length=15)
+    phone = models.CharField(max_length=16, unique=True)  # E.164, see phone.normalize_phone
 
-    # Add optional region and subregion fields
-    region = models.CharField(max_length=100, blank=True, null=True)
-    subregion = models.CharField(max_length=100, blank=True, null=True)
+    # Optional region and subregion (indexed lookups, see regions.py)
+    region = models.ForeignKey(Region, on_delete=models.SET_NULL, null=True, blank=True, related_name='contacts')
+    subregion = models.ForeignKey(Subregion, on_delete=models.SET_NULL, null=True, blank=True, related_name='contacts')
 
     def __str__(self):
         return f"{self.name} ({self.phone})"
 
+    def clean(self):
+        if self.phone and not normalize_phone(self.phone):
+            raise ValidationError({'phone': "Enter a valid phone number, e.g. 0712345678 or +254712345678."})
+
+    def save(self, *args, **kwargs):
+        self.phone = normalize_phone(self.phone) or self.phone
+        super().save(*args, **kwargs)
+
 # Pastor model
 class Pastor(models.Model):
     name = models.CharField(max_length=100)
-    phone = models.CharField(max_length=15)
-    region = models.CharField(max_length=100, blank=True, null=True)
-    subregion = models.CharField(max_length=100, blank=True, null=True)
+    phone = models.CharField(max_length=16)
+    region = models.ForeignKey(Region, on_delete=models.SET_NULL, null=True, blank=True, related_name='pastors')
+    subregion = models.ForeignKey(Subregion, on_delete=models.SET_NULL, null=True, blank=True, related_name='pastors')
 
     def __str__(self):
         return f"{self.name} ({self.phone})"
 
+    def save(self, *args, **kwargs):
+        self.phone = normalize_phone(self.phone) or self.phone
+        super().save(*args, **kwargs)
+
+
+# Saved audience: contacts matching every predicate that is set.
+# No categories means all categories; blank region/subregion means any.
+class Segment(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    categories = models.ManyToManyField(Category, blank=True, related_name='segments')
+    region = models.ForeignKey(Region, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    subregion = models.ForeignKey(Subregion, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # part of the cached count key
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
 
 class SMSLog(models.Model):
+    """One broadcast; per-number outcomes live in SMSRecipient."""
     sender = models.ForeignKey(
         settings.AUTH_USER_MODEL,  # <-- use this
         on_delete=models.SET_NULL,
         null=True,
         blank=True
     )
-    recipients = models.CharField(max_length=15)
+    recipient_count = models.PositiveIntegerField(default=0)
     sent_at = models.DateTimeField(auto_now_add=True)
-    sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     message = models.TextField()
     status = models.CharField(max_length=20)
-    
+
+    class Meta:
+        indexes = [
+            # keyset pagination: ORDER BY sent_at DESC, id DESC
+            models.Index(fields=['-sent_at', '-id'], name='smslog_sent_at_id_idx'),
+            models.Index(fields=['status', '-sent_at'], name='smslog_status_sent_at_idx'),
+            models.Index(fields=['sender', '-sent_at'], name='smslog_sender_sent_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"SMS sent by {self.sender} on {self.sent_at}"
+
+
+class SMSRecipient(models.Model):
+    """Delivery record for one phone number in a broadcast."""
+    STATUS_QUEUED = 'queued'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_DELIVERED = 'delivered'
+    STATUS_UNDELIVERED = 'undelivered'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_DELIVERED, 'Delivered'),
+        (STATUS_UNDELIVERED, 'Undelivered'),
+    ]
+
+    log = models.ForeignKey(SMSLog, on_delete=models.CASCADE, related_name='deliveries')
+    phone = models.CharField(max_length=16)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    dispatch_key = models.CharField(max_length=64, blank=True)  # idempotency key of the last submit
+    provider_message_id = models.CharField(max_length=64, blank=True, db_index=True)  # matches DLRs
+    delivered_at = models.DateTimeField(null=True, blank=True)  # time of the delivery report
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['phone', 'sent_at']),
+            models.Index(fields=['status', 'sent_at']),
+            models.Index(fields=['sent_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.phone} ({self.status})"
+
+
+# Delivery reports are stored before the webhook acknowledges them and
+# deleted once applied; rows that match no recipient yet wait for a retry.
+class DeliveryReport(models.Model):
+    provider_message_id = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=SMSRecipient.STATUS_CHOICES)
+    received_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)  # flushes that found no matching recipient
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['attempts', 'id'], name='dlr_attempts_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider_message_id}: {self.status}"
+
+
+# Daily per-sender/per-status totals, kept after raw logs are archived
+class SMSDailyRollup(models.Model):
+    day = models.DateField()
+    sender_username = models.CharField(max_length=150, blank=True)
+    status = models.CharField(max_length=20)
+    message_count = models.PositiveIntegerField(default=0)
+    recipient_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day', 'sender_username', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'sender_username', 'status'], name='smsrollup_day_sender_status_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.sender_username or '-'} {self.status}: {self.message_count}"
+
+
+# Old SMSLog rows (with their recipients) moved out of the hot tables;
+# payload is zlib-compressed JSON lines, one line per broadcast.
+class SMSLogArchive(models.Model):
+    period_start = models.DateTimeField()
+    period_end = models.DateTimeField()
+    log_count = models.PositiveIntegerField(default=0)
+    recipient_count = models.PositiveIntegerField(default=0)
+    payload = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['period_start']
+
+    def __str__(self):
+        return f"Archive {self.period_start:%Y-%m-%d} to {self.period_end:%Y-%m-%d} ({self.log_count} logs)"
+
+
+# Shared lifecycle for background jobs drained by management commands
+class BackgroundJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Bumped by the worker as it makes progress; stale-job detection uses it
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['created_at']
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def as_dict(self):
+        return {
+            "id": self.pk,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+# Outbound SMS job queue
+class SMSJob(BackgroundJob):
+    log = models.OneToOneField(SMSLog, on_delete=models.SET_NULL, null=True, blank=True, related_name='job')
+    category = models.CharField(max_length=100, blank=True)
+    message = models.TextField()
+    sender_id = models.CharField(max_length=20)
+    recipients = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+
+    class Meta(BackgroundJob.Meta):
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"SMS job #{self.pk} ({self.status})"
+
+    def as_dict(self):
+        return {
+            **super().as_dict(),
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+
+# Contact import queue; the uploaded workbook is kept in ImportUploadChunk
+# rows so the importer process can read it without a shared filesystem.
+class ImportJob(BackgroundJob):
+    filename = models.CharField(max_length=255)
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_inserted = models.PositiveIntegerField(default=0)
+    rows_updated = models.PositiveIntegerField(default=0)
+    rows_skipped = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+
+    class Meta(BackgroundJob.Meta):
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"Import job #{self.pk} ({self.status})"
+
+    def as_dict(self):
+        return {
+            **super().as_dict(),
+            "filename": self.filename,
+            "processed": self.rows_processed,
+            "inserted": self.rows_inserted,
+            "updated": self.rows_updated,
+            "skipped": self.rows_skipped,
+            "failed": self.rows_failed,
+        }
+
+
+
+# One slice of an uploaded workbook, in order; deleted once the import finishes
+class ImportUploadChunk(models.Model):
+    job = models.ForeignKey(ImportJob, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        ordering = ['job', 'index']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'index'], name='importchunk_job_index_uniq'),
+        ]
+
+
+# Celcom rate-limit state shared by every process that calls Celcom;
+# see ratelimit.AdaptiveRateLimiter. Times are Unix timestamps.
+class RateLimitState(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    request_tat = models.FloatField(default=0.0)  # when the requests bucket is next empty
+    recipient_tat = models.FloatField(default=0.0)
+    factor = models.FloatField(default=1.0)  # fraction of the configured rates in use
+    paused_until = models.FloatField(default=0.0)
 
     def __str__(self):
-        return f"SMS sent by {self.sender} on {self.sent_at}"
\ No newline at end of file
+        return f"{self.name} rate limit (x{self.factor:.2f})"
@@ -0,0 +1,93 @@
+import re
+
+DEFAULT_COUNTRY_CODE = "254"  # Kenya
+_NON_DIGITS = re.compile(r"\D")
+_PHONE_CHARS = re.compile(r"\+?[\d\s\-]+")
+
+
+# ============================
+# PHONE NORMALIZATION
+# ============================
+def normalize_phone(value, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    Return `value` in E.164 form (e.g. "+254712345678"), or None if it is not
+    a usable number.
+
+    Accepts the Kenyan spellings seen in uploads: 0712345678, 712345678
+    (Excel drops the leading zero), 254712345678, +254 712 345 678 and
+    0712-345-678. Other international numbers need a "+" or "00" prefix.
+    """
+    if value is None:
+        return None
+
+    raw = str(value).strip()
+    if raw.endswith(".0"):  # numeric Excel cell read as float
+        raw = raw[:-2]
+
+    international = raw.startswith("+") or raw.startswith("00")
+    digits = _NON_DIGITS.sub("", raw)
+    if raw.startswith("00"):
+        digits = digits[2:]
+
+    if not international:
+        if digits.startswith(country_code) and len(digits) == len(country_code) + 9:
+            pass
+        elif digits.startswith("0") and len(digits) == 10:
+            digits = country_code + digits[1:]
+        elif len(digits) == 9 and digits[0] in "17":
+            digits = country_code + digits
+        else:
+            return None
+
+    if digits.startswith(country_code) and len(digits) != len(country_code) + 9:
+        return None
+    if not 8 <= len(digits) <= 15:  # E.164 maximum; 16 characters with the "+"
+        return None
+
+    return "+" + digits
+
+
+def normalize_phone_prefix(value, country_code=DEFAULT_COUNTRY_CODE, min_digits=4):
+    """
+    Return the E.164 prefix a partly typed number stands for (e.g. "0712" ->
+    "+254712"), or None if `value` does not look like the start of a number.
+    """
+    raw = str(value or "").strip()
+    if not _PHONE_CHARS.fullmatch(raw):
+        return None
+
+    digits = _NON_DIGITS.sub("", raw)
+    if len(digits) < min_digits:
+        return None
+    if raw.startswith("00"):
+        digits = digits[2:]
+    elif raw.startswith("+") or digits.startswith(country_code):
+        pass
+    elif digits.startswith("0"):
+        digits = country_code + digits[1:]
+    else:
+        digits = country_code + digits
+
+    if not digits or len(digits) > 15:
+        return None
+    return "+" + digits
+
+
+def normalize_recipients(recipients):
+    """
+    Normalize and de-duplicate a recipient list, keeping first-seen order.
+    :return: (valid E.164 numbers, raw values that could not be parsed)
+    """
+    valid, invalid = {}, []
+    for raw in recipients:
+        phone = normalize_phone(raw)
+        if phone:
+            valid.setdefault(phone, None)
+        elif raw and str(raw).strip():
+            invalid.append(str(raw).strip())
+    return list(valid), invalid
+
+
+def to_msisdn(phone):
+    """Celcom expects international numbers without the leading "+"."""
+    return str(phone).strip().lstrip("+")
@@ -0,0 +1,34 @@
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .base import BaseSMSProvider
+
+_provider = None
+_lock = threading.Lock()
+
+
+def get_provider():
+    """The process-wide SMS backend named by settings.SMS_PROVIDER_BACKEND."""
+    global _provider
+    if _provider is None:
+        with _lock:
+            if _provider is None:
+                _provider = import_string(settings.SMS_PROVIDER_BACKEND)()
+    return _provider
+
+
+def reset_provider():
+    """Forget the cached backend (after changing settings, e.g. in tests)."""
+    global _provider
+    with _lock:
+        _provider = None
+
+
+@receiver(setting_changed)
+def _provider_setting_changed(setting, **kwargs):
+    if setting == "SMS_PROVIDER_BACKEND" or setting.startswith("SMS_STUB_"):
+        reset_provider()
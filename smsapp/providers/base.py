@@ -0,0 +1,37 @@
+from asgiref.sync import sync_to_async
+
+
+class BaseSMSProvider:
+    """
+    Interface every SMS gateway backend implements.
+
+    `recipients` is a list of E.164 numbers. Send results are plain dicts:
+    {"status": "ok", "response": ...} on success, otherwise
+    {"status": "error", ...} with "retryable": True only when the provider
+    certainly did not accept the message (no connection made, or refused
+    with HTTP 429), and "circuit_open": True when the provider refused the
+    call without trying it. Failures that may have been delivered (read
+    timeouts, 5xx) are never retryable; the operator resends them with
+    retry_failed().
+    """
+    name = "base"
+
+    def send(self, message, recipients, sender_id, idempotency_key=None):
+        raise NotImplementedError
+
+    async def asend(self, message, recipients, sender_id, idempotency_key=None):
+        # Providers without native async I/O run the sync call in a worker thread
+        return await sync_to_async(self.send, thread_sensitive=False)(
+            message, recipients, sender_id, idempotency_key=idempotency_key
+        )
+
+    def balance(self):
+        """Account balance dict, or {"status": "error", ...}."""
+        raise NotImplementedError
+
+    async def abalance(self):
+        return await sync_to_async(self.balance, thread_sensitive=False)()
+
+    def extract_message_ids(self, response):
+        """Map E.164 number -> provider message id from a successful send response."""
+        return {}
@@ -0,0 +1,179 @@
+import logging
+
+import httpx
+import requests
+from django.conf import settings
+from urllib3.exceptions import ConnectTimeoutError
+
+from ..celcom import get_async_client, get_client
+from ..circuit import CircuitOpenError
+from ..phone import to_msisdn
+from .base import BaseSMSProvider
+
+logger = logging.getLogger(__name__)
+
+# Reply for a send whose fate is unknown: never resent automatically
+OUTCOME_UNKNOWN = "Celcom may have accepted this chunk, so it was not resent automatically."
+
+
+def request_never_sent(exc):
+    """
+    True when a requests/httpx error happened before the POST reached Celcom
+    (no connection made), so resending it cannot deliver the chunk twice.
+    """
+    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout,
+                        requests.exceptions.ConnectTimeout)):
+        return True
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        reason = getattr(exc.args[0], "reason", None) if exc.args else None
+        return isinstance(reason, ConnectTimeoutError)  # includes NewConnectionError
+    return False
+
+
+class CelcomProvider(BaseSMSProvider):
+    """Celcom Africa bulk SMS over the pooled clients in smsapp.celcom."""
+    name = "celcom"
+
+    # ============================
+    # PAYLOADS / RESPONSES
+    # ============================
+    def send_payload(self, message, recipients, sender_id, idempotency_key=None):
+        mobile = ",".join(to_msisdn(r) for r in recipients)
+        payload = {
+            "partnerID": settings.CELCOM_PARTNER_ID,
+            "apikey": settings.CELCOM_API_KEY,
+            "mobile": mobile,
+            "shortcode": sender_id,
+            "message": message,
+            "pass_type": "plain"
+        }
+        if idempotency_key:
+            payload["clientsmsid"] = idempotency_key
+
+        logger.info(f"Sending SMS to {mobile} via Celcom API...")
+        logger.debug(f"Payload: {payload}")
+        return payload
+
+    def send_result(self, response):
+        """send() result dict from a Celcom HTTP response (requests or httpx)."""
+        try:
+            data = response.json()
+        except ValueError:
+            data = {"raw": response.text}
+
+        if response.status_code >= 400:
+            logger.error(f"Celcom returned HTTP error {response.status_code}: {data}")
+            result = {
+                "status": "error",
+                "http_status": response.status_code,
+                "response": data,
+                # Only a 429 is known to be refused; a 5xx may come after Celcom queued the chunk
+                "retryable": response.status_code == 429,
+            }
+            if response.status_code >= 500:
+                result["message"] = OUTCOME_UNKNOWN
+            return result
+
+        logger.info(f"Celcom SMS Response: {data}")
+
+        return {"status": "ok", "response": data}
+
+    def balance_payload(self):
+        logger.info("Checking Celcom Balance...")
+        return {
+            "partnerID": settings.CELCOM_PARTNER_ID,
+            "apikey": settings.CELCOM_API_KEY
+        }
+
+    def balance_result(self, response):
+        try:
+            data = response.json()
+        except ValueError:
+            data = {"raw": response.text}
+
+        if response.status_code >= 400:
+            logger.error(f"Balance API error {response.status_code}: {data}")
+            return {"status": "error", "response": data}
+
+        logger.info(f"Celcom Balance Response: {data}")
+
+        return data
+
+    def extract_message_ids(self, response):
+        """
+        Celcom replies {"responses": [{"mobile": 2547..., "messageid": 123, ...}, ...]}.
+        """
+        items = response.get("responses", []) if isinstance(response, dict) else []
+        message_ids = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            mobile = item.get("mobile")
+            message_id = item.get("messageid") or item.get("messageID")
+            if mobile and message_id:
+                message_ids["+" + to_msisdn(mobile)] = str(message_id)
+        return message_ids
+
+    # ============================
+    # SEND
+    # ============================
+    def transport_error(self, exc):
+        """send() result for a transport error: retryable only if nothing reached Celcom."""
+        logger.error(f"Exception sending SMS: {str(exc)}")
+        if request_never_sent(exc):
+            return {"status": "error", "message": str(exc), "retryable": True}
+        return {"status": "error", "message": f"{exc}. {OUTCOME_UNKNOWN}", "retryable": False}
+
+    def send(self, message, recipients, sender_id, idempotency_key=None):
+        payload = self.send_payload(message, recipients, sender_id, idempotency_key)
+        try:
+            response = get_client().send(payload, idempotency_key=idempotency_key)
+            return self.send_result(response)
+
+        except CircuitOpenError as e:
+            # Not retried here: the worker holds the job until the circuit closes
+            logger.warning(f"SMS not sent: {str(e)}")
+            return {"status": "error", "message": str(e), "circuit_open": True}
+
+        except requests.exceptions.RequestException as e:
+            return self.transport_error(e)
+
+    async def asend(self, message, recipients, sender_id, idempotency_key=None):
+        payload = self.send_payload(message, recipients, sender_id, idempotency_key)
+        try:
+            response = await get_async_client().send(payload, idempotency_key=idempotency_key)
+            return self.send_result(response)
+
+        except CircuitOpenError as e:
+            logger.warning(f"SMS not sent: {str(e)}")
+            return {"status": "error", "message": str(e), "circuit_open": True}
+
+        except httpx.HTTPError as e:
+            return self.transport_error(e)
+
+    # ============================
+    # BALANCE
+    # ============================
+    def balance(self):
+        try:
+            return self.balance_result(get_client().balance(self.balance_payload()))
+
+        except CircuitOpenError as e:
+            logger.warning(f"Balance not fetched: {str(e)}")
+            return {"status": "error", "message": str(e), "circuit_open": True}
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Exception fetching balance: {str(e)}")
+            return {"status": "error", "message": str(e)}
+
+    async def abalance(self):
+        try:
+            return self.balance_result(await get_async_client().balance(self.balance_payload()))
+
+        except CircuitOpenError as e:
+            logger.warning(f"Balance not fetched: {str(e)}")
+            return {"status": "error", "message": str(e), "circuit_open": True}
+
+        except httpx.HTTPError as e:
+            logger.error(f"Exception fetching balance: {str(e)}")
+            return {"status": "error", "message": str(e)}
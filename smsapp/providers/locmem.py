@@ -0,0 +1,77 @@
+import asyncio
+import itertools
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from .base import BaseSMSProvider
+
+logger = logging.getLogger(__name__)
+
+# Every message "sent" in this process, like django.core.mail.outbox
+outbox = []
+_lock = threading.Lock()
+_message_ids = itertools.count(1)
+
+
+class InMemoryProvider(BaseSMSProvider):
+    """
+    Stub gateway that never leaves the process: sends are appended to
+    `outbox` and answered in Celcom's response shape with fake message ids.
+    SMS_STUB_LATENCY (seconds per call) and SMS_STUB_FAILURE_RATE (0-1,
+    retryable errors) make it usable for load tests of the dispatch path.
+    """
+    name = "locmem"
+
+    def __init__(self, latency=None, failure_rate=None, credit=None):
+        self.latency = settings.SMS_STUB_LATENCY if latency is None else latency
+        self.failure_rate = settings.SMS_STUB_FAILURE_RATE if failure_rate is None else failure_rate
+        self.credit = float(settings.SMS_STUB_CREDIT if credit is None else credit)
+
+    def _deliver(self, message, recipients, sender_id, idempotency_key):
+        if self.failure_rate and random.random() < self.failure_rate:
+            return {"status": "error", "http_status": 429, "response": {"error": "stub throttled"}, "retryable": True}
+
+        with _lock:
+            responses = [
+                {"mobile": phone.lstrip("+"), "messageid": f"stub-{next(_message_ids)}", "respose-code": 200}
+                for phone in recipients
+            ]
+            outbox.append({
+                "message": message,
+                "recipients": list(recipients),
+                "sender_id": sender_id,
+                "idempotency_key": idempotency_key,
+                "message_ids": [r["messageid"] for r in responses],
+            })
+            self.credit -= len(recipients)
+        logger.debug(f"Stub SMS to {len(recipients)} recipient(s)")
+        return {"status": "ok", "response": {"responses": responses}}
+
+    def send(self, message, recipients, sender_id, idempotency_key=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._deliver(message, recipients, sender_id, idempotency_key)
+
+    async def asend(self, message, recipients, sender_id, idempotency_key=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._deliver(message, recipients, sender_id, idempotency_key)
+
+    def balance(self):
+        return {"credit": self.credit}
+
+    async def abalance(self):
+        return self.balance()
+
+    def extract_message_ids(self, response):
+        items = response.get("responses", []) if isinstance(response, dict) else []
+        return {"+" + item["mobile"]: item["messageid"] for item in items}
+
+
+def clear_outbox():
+    with _lock:
+        outbox.clear()
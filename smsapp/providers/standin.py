@@ -0,0 +1,126 @@
+import itertools
+import json
+import logging
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+# ============================
+# LOCAL CELCOM STAND-IN
+# ============================
+class StandInServer(ThreadingHTTPServer):
+    """
+    Local HTTP server that answers like Celcom's send and balance endpoints,
+    for load-testing the real CelcomProvider path (pool, limiter, breaker,
+    retries) without spending credit.
+
+    Every POST with a "mobile" field is a send; anything else is a balance
+    query. Each request waits latency +/- jitter seconds, fails with HTTP 500
+    at `error_rate`, and gets 429 + Retry-After once `max_rps` requests/sec
+    or `max_recipients` recipients/sec is exceeded (0 disables a cap).
+    """
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self, address, latency=0.1, jitter=0.0, error_rate=0.0,
+                 max_rps=0.0, max_recipients=0.0, credit=1000000.0):
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.max_recipients = max_recipients
+        self.credit = credit
+        self.request_bucket = TokenBucket(max_rps, max_rps) if max_rps else None
+        self.recipient_bucket = TokenBucket(max_recipients, max_recipients) if max_recipients else None
+        self.message_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "recipients": 0, "errors": 0, "throttled": 0}
+
+    def admit(self, recipients):
+        """
+        Charge the throughput caps; return None or the seconds until capacity
+        frees up. A request larger than a cap is admitted once that bucket is
+        full and leaves it in debt, as ratelimit.TokenBucket is designed to.
+        """
+        with self.lock:
+            now = time.monotonic()
+            waits = []
+            for bucket, amount in ((self.request_bucket, 1), (self.recipient_bucket, recipients)):
+                if bucket is None or not amount:
+                    continue
+                bucket.refill(now, bucket.rate)
+                needed = min(amount, bucket.capacity)
+                if bucket.tokens < needed:
+                    waits.append((needed - bucket.tokens) / bucket.rate)
+            if waits:
+                self.stats["throttled"] += 1
+                return max(waits)
+            for bucket, amount in ((self.request_bucket, 1), (self.recipient_bucket, recipients)):
+                if bucket is not None and amount:
+                    bucket.take(amount, bucket.rate)
+            return None
+
+    def send(self, payload):
+        mobiles = [m for m in str(payload.get("mobile", "")).split(",") if m]
+        with self.lock:
+            responses = [
+                {"respose-code": 200, "response-description": "Success", "mobile": int(m),
+                 "messageid": next(self.message_ids), "networkid": "1"}
+                for m in mobiles if m.isdigit()
+            ]
+            self.credit -= len(responses)
+            self.stats["recipients"] += len(responses)
+        return {"responses": responses}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def reply(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError:
+            return self.reply(400, {"error": "invalid JSON"})
+
+        with server.lock:
+            server.stats["requests"] += 1
+
+        recipients = len([m for m in str(payload.get("mobile", "")).split(",") if m])
+        wait = server.admit(recipients)
+        if wait is not None:
+            return self.reply(429, {"error": "rate limited"}, {"Retry-After": str(max(1, math.ceil(wait)))})
+
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if server.error_rate and random.random() < server.error_rate:
+            with server.lock:
+                server.stats["errors"] += 1
+            return self.reply(500, {"error": "stand-in failure"})
+
+        if "mobile" in payload:
+            return self.reply(200, server.send(payload))
+        return self.reply(200, {"credit": round(server.credit, 2), "partner-id": payload.get("partnerID")})
+
+    def log_message(self, format, *args):
+        logger.debug("stand-in: " + format % args)
@@ -0,0 +1,261 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+
+from . import metrics
+from .models import RateLimitState
+
+logger = logging.getLogger(__name__)
+
+
+# ============================
+# TOKEN BUCKET
+# ============================
+class TokenBucket:
+    """
+    Token bucket that lets callers go into debt: a request larger than the
+    bucket (e.g. a 500-recipient chunk) is allowed, and the caller is told how
+    long to wait until the balance is back at zero.
+    In-memory and not thread-safe on its own; the stand-in server holds a
+    lock around it. The Celcom limiter below keeps its state in the database.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now, rate):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def take(self, amount, rate):
+        """Remove `amount` tokens and return the seconds to wait before using them."""
+        self.tokens -= amount
+        return 0.0 if self.tokens >= 0 else -self.tokens / rate
+
+
+# ============================
+# ADAPTIVE RATE LIMITER
+# ============================
+class AdaptiveRateLimiter:
+    """
+    Limits outbound Celcom traffic in requests/sec and recipients/sec across
+    every process that calls Celcom (web servers and all workers).
+
+    The state lives in one RateLimitState row and only changes through
+    conditional UPDATEs, as in claim_next_job(), so the configured rates hold
+    for the whole deployment rather than once per process. Each bucket is a
+    "theoretical arrival time" (GCRA): a call for `amount` pushes it
+    amount/rate seconds ahead, and the caller waits until it is at most one
+    burst ahead of now. A call larger than the burst (e.g. a 500-recipient
+    chunk) is allowed and simply waits longer.
+
+    When Celcom answers 429 or 5xx the effective rate is halved (down to
+    min_factor of the configured rate) and then recovers additively with each
+    successful response. A 429 Retry-After header pauses all dispatch.
+    A rate of 0 disables that bucket.
+
+    If the database is unavailable (locked SQLite, dropped connection) the
+    call is limited by in-process TokenBuckets instead, so a send is never
+    failed by the limiter itself; the limits then hold per process only.
+    """
+
+    def __init__(self, request_rate, recipient_rate, burst_seconds=1.0,
+                 min_factor=0.1, recovery_step=0.05, name="celcom"):
+        self.request_rate = float(request_rate)
+        self.recipient_rate = float(recipient_rate)
+        self.min_factor = min_factor
+        self.recovery_step = recovery_step
+        self.name = name
+        # (tat field, configured rate, bucket size in units)
+        self._buckets = [
+            (field, rate, max(1.0, rate * burst_seconds))
+            for field, rate in (("request_tat", self.request_rate), ("recipient_tat", self.recipient_rate))
+            if rate
+        ]
+        self._row_ready = False
+        # In-process fallback, used while the database is unavailable
+        self._local_lock = threading.Lock()
+        self._local_buckets = {field: TokenBucket(rate, size) for field, rate, size in self._buckets}
+        self._local_factor = 1.0
+        self._local_paused_until = 0.0
+        self._degraded = False
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            request_rate=settings.CELCOM_MAX_REQUESTS_PER_SECOND,
+            recipient_rate=settings.CELCOM_MAX_RECIPIENTS_PER_SECOND,
+            burst_seconds=settings.CELCOM_RATE_BURST_SECONDS,
+        )
+
+    def _state(self):
+        if not self._row_ready:
+            RateLimitState.objects.get_or_create(name=self.name)
+            self._row_ready = True
+        return RateLimitState.objects.filter(name=self.name)
+
+    def _database_failed(self, exc):
+        if not self._degraded:
+            logger.warning(f"Rate limit state unavailable ({exc}); limiting this process locally")
+            self._degraded = True
+
+    def _database_ok(self):
+        if self._degraded:
+            logger.info("Rate limit state available again")
+            self._degraded = False
+
+    def reserve(self, requests=1, recipients=0):
+        """
+        Claim capacity for a call and return how many seconds the caller must
+        wait before making it. Does not sleep; async callers run it with
+        sync_to_async and await the delay.
+        """
+        try:
+            delay = self._reserve_shared(requests, recipients)
+        except DatabaseError as e:
+            self._database_failed(e)
+            return self._reserve_local(requests, recipients)
+        self._database_ok()
+        return delay
+
+    def _reserve_shared(self, requests, recipients):
+        now = time.time()
+        amounts = {"request_tat": requests, "recipient_tat": recipients}
+        updates = {
+            field: Greatest(F(field), Value(now)) + Value(amounts[field] / rate) / F("factor")
+            for field, rate, _ in self._buckets
+            if amounts[field]
+        }
+        state = self._state()
+        with transaction.atomic():
+            if updates:
+                state.update(**updates)
+            row = state.values("request_tat", "recipient_tat", "factor", "paused_until").get()
+
+        delay = max(0.0, row["paused_until"] - now)
+        for field, rate, size in self._buckets:
+            if field in updates:
+                delay = max(delay, row[field] - now - size / (rate * row["factor"]))
+        return delay
+
+    def _reserve_local(self, requests, recipients):
+        amounts = {"request_tat": requests, "recipient_tat": recipients}
+        with self._local_lock:
+            now = time.monotonic()
+            delay = max(0.0, self._local_paused_until - now)
+            for field, rate, _ in self._buckets:
+                if amounts[field]:
+                    bucket = self._local_buckets[field]
+                    bucket.refill(now, rate * self._local_factor)
+                    delay = max(delay, bucket.take(amounts[field], rate * self._local_factor))
+            return delay
+
+    def acquire(self, requests=1, recipients=0):
+        """Block until the call may be made."""
+        delay = self.reserve(requests, recipients)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def record_response(self, status_code=None, retry_after=None):
+        """
+        Feed back the outcome of a call. status_code None means the request
+        failed without a response (timeout/connection error).
+        """
+        throttled = status_code is None or status_code == 429 or status_code >= 500
+        if not throttled and status_code >= 400:
+            return
+        try:
+            self._record_shared(throttled, status_code, retry_after)
+        except DatabaseError as e:
+            self._database_failed(e)
+            self._record_local(throttled, retry_after)
+            return
+        self._database_ok()
+
+    def _record_shared(self, throttled, status_code, retry_after):
+        state = self._state()
+        if throttled:
+            updates = {"factor": Greatest(F("factor") / 2, Value(self.min_factor))}
+            if retry_after:
+                updates["paused_until"] = Greatest(F("paused_until"), Value(time.time() + retry_after))
+            with transaction.atomic():
+                old = state.values_list("factor", flat=True).get()
+                state.update(**updates)
+            new = max(self.min_factor, old / 2)
+            if new != old:
+                logger.warning(f"Celcom throttling (HTTP {status_code}); rate factor {old:.2f} -> {new:.2f}")
+        else:
+            state.filter(factor__lt=1.0).update(factor=Least(F("factor") + self.recovery_step, Value(1.0)))
+
+    def _record_local(self, throttled, retry_after):
+        with self._local_lock:
+            if throttled:
+                self._local_factor = max(self.min_factor, self._local_factor / 2)
+                if retry_after:
+                    self._local_paused_until = max(self._local_paused_until, time.monotonic() + retry_after)
+            else:
+                self._local_factor = min(1.0, self._local_factor + self.recovery_step)
+
+    def snapshot(self):
+        """Current token levels and rate factor, for metrics and the dashboard."""
+        now = time.time()
+        row = self._state().values("request_tat", "recipient_tat", "factor").get()
+        data = {"rate_factor": row["factor"]}
+        for field, rate, size in self._buckets:
+            name = "request_tokens" if field == "request_tat" else "recipient_tokens"
+            data[name] = size - max(0.0, row[field] - now) * rate * row["factor"]
+        return data
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds form only)."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Return this process's handle on the shared rate limiter, creating it on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = AdaptiveRateLimiter.from_settings()
+    return _limiter
+
+
+def reset_limiter():
+    global _limiter
+    with _limiter_lock:
+        _limiter = None
+
+
+metrics.register_gauge(
+    "celcom_ratelimit_request_tokens",
+    "Tokens left in the Celcom requests/sec bucket.",
+    lambda: get_limiter().snapshot().get("request_tokens", 0),
+)
+metrics.register_gauge(
+    "celcom_ratelimit_recipient_tokens",
+    "Tokens left in the Celcom recipients/sec bucket.",
+    lambda: get_limiter().snapshot().get("recipient_tokens", 0),
+)
+metrics.register_gauge(
+    "celcom_ratelimit_rate_factor",
+    "Current fraction of the configured Celcom rate (drops on 429/5xx).",
+    lambda: get_limiter().snapshot()["rate_factor"],
+)
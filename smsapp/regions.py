@@ -0,0 +1,84 @@
+import threading
+
+from django.db import IntegrityError, transaction
+
+from .cache import get_contacts_version
+from .models import Region, Subregion, region_key
+
+
+# ============================
+# IN-MEMORY REGION LOOKUP
+# ============================
+class RegionLookup:
+    """
+    Name -> id maps for regions and subregions, loaded with two queries.
+
+    The importer builds one per run (create=True adds unseen names);
+    read paths share `get_region_lookup()`, which reloads whenever the
+    contacts version moves.
+    """
+
+    def __init__(self):
+        self.regions = dict(Region.objects.values_list('key', 'id'))
+        self.subregions = {}  # (region id, key) -> id
+        self.subregions_by_key = {}  # key -> [ids] across regions
+        for pk, region_id, key in Subregion.objects.values_list('id', 'region_id', 'key'):
+            self._add_subregion(pk, region_id, key)
+
+    def _add_subregion(self, pk, region_id, key):
+        self.subregions[(region_id, key)] = pk
+        self.subregions_by_key.setdefault(key, []).append(pk)
+
+    def region_id(self, name, create=False):
+        key = region_key(name)
+        if not key:
+            return None
+        if key not in self.regions and create:
+            self.regions[key] = self._get_or_create(Region, {'key': key}, name).pk
+        return self.regions.get(key)
+
+    def subregion_id(self, name, region_id=None, create=False):
+        key = region_key(name)
+        if not key:
+            return None
+        if (region_id, key) not in self.subregions and create:
+            obj = self._get_or_create(Subregion, {'region_id': region_id, 'key': key}, name)
+            self._add_subregion(obj.pk, region_id, key)
+        return self.subregions.get((region_id, key))
+
+    def subregion_ids(self, name, region_id=None):
+        """Every subregion with this name, optionally limited to one region."""
+        key = region_key(name)
+        if region_id is not None:
+            pk = self.subregions.get((region_id, key))
+            return [pk] if pk else []
+        return list(self.subregions_by_key.get(key, []))
+
+    def resolve(self, region, subregion, create=False):
+        """(region id, subregion id) for a pair of free-text names."""
+        region_id = self.region_id(region, create=create)
+        return region_id, self.subregion_id(subregion, region_id, create=create)
+
+    @staticmethod
+    def _get_or_create(model, lookup, name):
+        # Another importer may create the same name concurrently
+        try:
+            with transaction.atomic():
+                return model.objects.get_or_create(**lookup, defaults={'name': name})[0]
+        except IntegrityError:
+            return model.objects.get(**lookup)
+
+
+_lookup = None
+_lookup_version = None
+_lock = threading.Lock()
+
+
+def get_region_lookup():
+    """Shared read-only lookup, rebuilt after any contact/region change."""
+    global _lookup, _lookup_version
+    version = get_contacts_version()
+    with _lock:
+        if _lookup is None or _lookup_version != version:
+            _lookup, _lookup_version = RegionLookup(), version
+        return _lookup
@@ -0,0 +1,158 @@
+import json
+import logging
+import zlib
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .cache import bump_logs_version
+from .models import SMSDailyRollup, SMSLog, SMSLogArchive, SMSRecipient
+
+logger = logging.getLogger(__name__)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+# ============================
+# DAILY ROLLUPS
+# ============================
+def archived_until():
+    """End of the newest archived period; rollups before it must not be rebuilt."""
+    return SMSLogArchive.objects.aggregate(end=Max('period_end'))['end']
+
+
+def rollup_days(start_day, end_day):
+    """
+    Recompute SMSDailyRollup rows for [start_day, end_day) from raw SMSLog rows.
+    Each day's rows are replaced as a whole (delete + insert in one
+    transaction), so groups that no longer exist, e.g. a log that moved from
+    queued to ok, don't linger. The newest archived day is skipped along with
+    everything before it: some of its raw rows are gone, and archive_logs()
+    rolled it up before archiving any of them.
+    :return: number of rollup rows written.
+    """
+    boundary = archived_until()
+    if boundary is not None:
+        start_day = max(start_day, timezone.localtime(boundary).date() + timedelta(days=1))
+    if start_day >= end_day:
+        return 0
+
+    groups = (
+        SMSLog.objects.filter(sent_at__gte=_day_start(start_day), sent_at__lt=_day_start(end_day))
+        .annotate(day=TruncDate('sent_at'))
+        .values('day', 'sender__username', 'status')
+        .annotate(messages=Count('id'), recipients=Coalesce(Sum('recipient_count'), 0))
+    )
+    rows = [
+        SMSDailyRollup(
+            day=g['day'],
+            sender_username=g['sender__username'] or '',
+            status=g['status'] or '',
+            message_count=g['messages'],
+            recipient_count=g['recipients'],
+        )
+        for g in groups
+    ]
+
+    with transaction.atomic():
+        SMSDailyRollup.objects.filter(day__gte=start_day, day__lt=end_day).delete()
+        SMSDailyRollup.objects.bulk_create(rows, batch_size=500)
+    logger.info(f"Rolled up {len(rows)} day/sender/status group(s) for {start_day}..{end_day}")
+    return len(rows)
+
+
+# ============================
+# ARCHIVAL
+# ============================
+def _serialize(logs, recipients_by_log):
+    lines = []
+    for log in logs:
+        lines.append(json.dumps({
+            "id": log["id"],
+            "sender": log["sender__username"],
+            "message": log["message"],
+            "status": log["status"],
+            "sent_at": log["sent_at"],
+            "recipient_count": log["recipient_count"],
+            "recipients": recipients_by_log.get(log["id"], []),
+        }, cls=DjangoJSONEncoder))
+    return zlib.compress("\n".join(lines).encode(), 9)
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Move the oldest `batch_size` logs sent before `cutoff` (and their
+    recipients) into one compressed SMSLogArchive row.
+    :return: number of logs archived (0 when nothing is left).
+    """
+    logs = list(
+        SMSLog.objects.filter(sent_at__lt=cutoff)
+        .order_by('sent_at', 'id')
+        .values('id', 'sender__username', 'message', 'status', 'sent_at', 'recipient_count')[:batch_size]
+    )
+    if not logs:
+        return 0
+
+    ids = [log["id"] for log in logs]
+    recipients_by_log = {}
+    recipient_total = 0
+    for row in (
+        SMSRecipient.objects.filter(log_id__in=ids).order_by('id')
+        .values('log_id', 'phone', 'status', 'sent_at', 'delivered_at', 'provider_message_id')
+        .iterator(chunk_size=2000)
+    ):
+        recipients_by_log.setdefault(row.pop('log_id'), []).append(row)
+        recipient_total += 1
+
+    with transaction.atomic():
+        SMSLogArchive.objects.create(
+            period_start=logs[0]["sent_at"],
+            period_end=logs[-1]["sent_at"],
+            log_count=len(logs),
+            recipient_count=recipient_total,
+            payload=_serialize(logs, recipients_by_log),
+        )
+        SMSLog.objects.filter(id__in=ids).delete()  # cascades to SMSRecipient
+    bump_logs_version()
+
+    return len(logs)
+
+
+def archive_logs(retention_days=None, batch_size=None, max_batches=None):
+    """
+    Roll up and then archive every log older than `retention_days` whole days.
+    :return: (logs archived, batches written)
+    """
+    retention_days = settings.SMS_LOG_RETENTION_DAYS if retention_days is None else retention_days
+    batch_size = batch_size or settings.SMS_ARCHIVE_BATCH_SIZE
+
+    cutoff_day = timezone.localdate() - timedelta(days=retention_days)
+    cutoff = _day_start(cutoff_day)
+
+    oldest = SMSLog.objects.filter(sent_at__lt=cutoff).order_by('sent_at').values_list('sent_at', flat=True).first()
+    if oldest is None:
+        return 0, 0
+    rollup_days(timezone.localtime(oldest).date(), cutoff_day)
+
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(cutoff, batch_size)
+        if not moved:
+            break
+        archived += moved
+        batches += 1
+        logger.info(f"Archived batch {batches}: {moved} log(s)")
+    return archived, batches
+
+
+def read_archive(archive):
+    """Decompress an SMSLogArchive back into a list of dicts."""
+    text = zlib.decompress(bytes(archive.payload)).decode()
+    return [json.loads(line) for line in text.splitlines() if line]
@@ -0,0 +1,180 @@
+import logging
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Contact, SMSLog
+from .phone import normalize_phone, normalize_phone_prefix
+
+logger = logging.getLogger(__name__)
+
+# Postgres text search configuration; 'simple' does no stemming, which suits
+# short SMS bodies and personal names in several languages.
+PG_CONFIG = "simple"
+
+# model -> (indexed text column, index / FTS table base name)
+SEARCH_TARGETS = {
+    SMSLog: ("message", "smslog_message_fts"),
+    Contact: ("name", "contact_name_fts"),
+}
+
+_fts_tables = {}  # (alias, db name) -> set of installed SQLite FTS tables
+
+
+# ============================
+# INDEX INSTALLATION
+# ============================
+def _fts_table(model):
+    return f"{model._meta.db_table}_fts"
+
+
+def _sqlite_statements(model):
+    column = SEARCH_TARGETS[model][0]
+    table = model._meta.db_table
+    fts = _fts_table(model)
+    return [
+        f"DROP TRIGGER IF EXISTS {fts}_ai",
+        f"DROP TRIGGER IF EXISTS {fts}_ad",
+        f"DROP TRIGGER IF EXISTS {fts}_au",
+        f"DROP TABLE IF EXISTS {fts}",
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({column}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def _pg_index(model):
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    column, name = SEARCH_TARGETS[model]
+    return GinIndex(SearchVector(column, config=PG_CONFIG), name=f"{name}_idx")
+
+
+def install_search_indexes(schema_editor, models=None):
+    """
+    Create (or recreate) the full-text index for each searchable model:
+    a GIN index over to_tsvector() on Postgres, an external-content FTS5
+    table kept in sync by triggers on SQLite. Other backends are skipped
+    and search falls back to icontains.
+    """
+    connection = schema_editor.connection
+    for model in models or SEARCH_TARGETS:
+        if connection.vendor == "postgresql":
+            index = _pg_index(model)
+            with connection.cursor() as cursor:
+                existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            if index.name not in existing:
+                schema_editor.add_index(model, index)
+        elif connection.vendor == "sqlite":
+            try:
+                for sql in _sqlite_statements(model):
+                    schema_editor.execute(sql)
+            except Exception as e:
+                logger.warning(f"FTS5 unavailable, {model.__name__} search will use LIKE: {e}")
+    _fts_tables.clear()
+
+
+def remove_search_indexes(schema_editor, models=None):
+    connection = schema_editor.connection
+    for model in models or SEARCH_TARGETS:
+        if connection.vendor == "postgresql":
+            schema_editor.execute(f"DROP INDEX IF EXISTS {SEARCH_TARGETS[model][1]}_idx")
+        elif connection.vendor == "sqlite":
+            for sql in _sqlite_statements(model)[:4]:
+                schema_editor.execute(sql)
+    _fts_tables.clear()
+
+
+# ============================
+# QUERYING
+# ============================
+def _sqlite_fts_available(connection, model):
+    key = (connection.alias, connection.settings_dict["NAME"])
+    if key not in _fts_tables:
+        _fts_tables[key] = set(connection.introspection.table_names())
+    return _fts_table(model) in _fts_tables[key]
+
+
+def fts_match_expression(term):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    words = re.findall(r"\w+", term)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def full_text_q(model, term):
+    """
+    Q object matching `term` against the model's indexed text column using
+    whatever full-text support the current database has.
+    """
+    column = SEARCH_TARGETS[model][0]
+    connection = connections[router.db_for_read(model)]
+
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import SearchQuery, SearchVector, SearchVectorExact
+
+        # The vector must match the indexed expression exactly for the GIN index to be used
+        return Q(SearchVectorExact(
+            SearchVector(column, config=PG_CONFIG),
+            SearchQuery(term, config=PG_CONFIG, search_type="websearch"),
+        ))
+
+    if connection.vendor == "sqlite" and _sqlite_fts_available(connection, model):
+        expression = fts_match_expression(term)
+        if not expression:
+            return Q(pk__in=[])
+        fts = _fts_table(model)
+        return Q(pk__in=RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", (expression,)))
+
+    return Q(**{f"{column}__icontains": term})
+
+
+def search_logs(queryset, term):
+    """SMS logs whose message matches `term`, or sent by a user with that exact username."""
+    term = (term or "").strip()
+    if not term:
+        return queryset
+    condition = full_text_q(SMSLog, term)
+    # Resolve the username first: OR-ing across the user join defeats the index on sender
+    sender_ids = list(
+        get_user_model()._default_manager.filter(username__iexact=term).values_list("pk", flat=True)
+    )
+    if sender_ids:
+        condition |= Q(sender_id__in=sender_ids)
+    return queryset.filter(condition)
+
+
+def _phone_prefix_q(prefix, field="phone"):
+    """
+    Q for values starting with `prefix`, written as a range so the index on
+    `field` is used (LIKE 'x%' cannot use it on SQLite or non-C collations).
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": upper})
+
+
+def search_contacts(queryset, term):
+    """
+    Contacts whose name matches `term`. A term that parses as a phone number
+    matches it exactly; a partly typed number ("0712 34") matches as a prefix.
+    """
+    term = (term or "").strip()
+    if not term:
+        return queryset
+    condition = full_text_q(Contact, term)
+    phone = normalize_phone(term)
+    if phone:
+        condition |= Q(phone=phone)
+    elif prefix := normalize_phone_prefix(term):
+        condition |= _phone_prefix_q(prefix)
+    return queryset.filter(condition)
@@ -0,0 +1,31 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_contacts_version, bump_logs_version
+from .models import Category, Contact, Region, Segment, SMSLog, Subregion
+
+
+@receiver([post_save, post_delete], sender=Contact)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Region)
+@receiver([post_save, post_delete], sender=Subregion)
+def invalidate_contact_cache(sender, **kwargs):
+    bump_contacts_version()
+
+
+# post_save only: a post_delete receiver would fire once per row when the
+# archiver bulk-deletes logs, so archive_batch() bumps the version itself.
+@receiver(post_save, sender=SMSLog)
+def invalidate_log_cache(sender, **kwargs):
+    bump_logs_version()
+
+
+@receiver(m2m_changed, sender=Segment.categories.through)
+def touch_segment(sender, instance, action, reverse, **kwargs):
+    # Category changes don't go through Segment.save(); refresh updated_at so cached counts rotate
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        if reverse:
+            Segment.objects.filter(categories=instance).update(updated_at=timezone.now())
+        else:
+            Segment.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
@@ -23,4 +23,33 @@ document.addEventListener("DOMContentLoaded", function() {
       uploadBtn.disabled = false;
     }, 3000);
   });
+
+  // Poll the background import started by the last upload
+  const progress = document.getElementById("importProgress");
+
+  function pollImport() {
+    fetch(progress.dataset.url)
+      .then(res => res.json())
+      .then(data => {
+        const job = data.job;
+        if (!job) {
+          progress.textContent = data.message || "Import job not found.";
+          return;
+        }
+        const counts = `${job.processed} rows read, ${job.inserted} added, ${job.updated} updated, ${job.skipped} skipped, ${job.failed} invalid`;
+        if (job.status === 'done') {
+          progress.className = 'msg success';
+          progress.textContent = `Import finished: ${counts}.`;
+        } else if (job.status === 'failed') {
+          progress.className = 'msg error';
+          progress.textContent = job.error || "Import failed.";
+        } else {
+          progress.textContent = job.status === 'queued' ? "Waiting for the importer to start..." : `Importing: ${counts}`;
+          setTimeout(pollImport, 2000);
+        }
+      })
+      .catch(err => console.error("Error checking import progress:", err));
+  }
+
+  if (progress) pollImport();
 });
@@ -1,3 +1,1073 @@
-from django.test import TestCase
+import asyncio
+import io
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import openpyxl
+import requests
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.db.models.query import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metrics
+from .audience import resolve_segment, segment_count
+from .balance import BALANCE_CACHE_KEY, REFRESH_LOCK_KEY
+from .cache import get_categories
+from .dlr import apply_pending_reports, apply_reports_for, reset_buffer
+from .celcom import AsyncCelcomClient, CelcomClient
+from .circuit import CIRCUIT_CACHE_KEY, CircuitBreaker, CircuitOpenError
+from .importer import enqueue_import, import_contacts, process_import_job
+from .logs import decode_cursor, get_log_page
+from .jobs import claim_next_job, enqueue_sms, process_job, requeue_stale_jobs, retry_failed
+from .middleware import REQUEST_QUERIES
+from .models import (
+    Category, Contact, DeliveryReport, ImportJob, ImportUploadChunk, Pastor, Region, Segment, SMSDailyRollup,
+    SMSJob, SMSLog, SMSLogArchive, SMSRecipient, Subregion,
+)
+from .phone import normalize_phone, normalize_phone_prefix, normalize_recipients
+from .providers import locmem
+from .providers.celcom import CelcomProvider
+from .providers.standin import StandInServer
+from .ratelimit import AdaptiveRateLimiter
+from .retention import archive_logs, rollup_days
+from .search import search_contacts, search_logs
+from .utils import backoff_delay, send_chunk, send_sms_batch
+
+
+class GetPastorsViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('operator', password='pass')
+        cls.pastor = Category.objects.create(name='Pastor')
+        cls.regional = Category.objects.create(name='Regional Overseer')
+        nairobi = Region.objects.create(name='Nairobi')
+        mombasa = Region.objects.create(name='Mombasa')
+        kasarani = Subregion.objects.create(region=nairobi, name='Kasarani')
+        likoni = Subregion.objects.create(region=mombasa, name='Likoni')
+        Contact.objects.create(category=cls.pastor, name='Alice', phone='0711000001', region=nairobi, subregion=kasarani)
+        Contact.objects.create(category=cls.pastor, name='Bob', phone='0711000002', region=mombasa, subregion=likoni)
+        Contact.objects.create(category=cls.regional, name='Carol', phone='0711000003', region=nairobi)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('smsapp:get_pastors')
+
+    def fetch(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['pastors']
+
+    def count_queries(self, **params):
+        cache.clear()  # measure the database path, not the payload cache
+        with CaptureQueriesContext(connection) as ctx:
+            self.fetch(**params)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_contacts(self):
+        baseline = self.count_queries()
+        Contact.objects.bulk_create(
+            Contact(category=self.pastor, name=f'Extra {i}', phone=f'07220000{i:02d}')
+            for i in range(25)
+        )
+        self.assertEqual(self.count_queries(), baseline)
+
+    def test_category_name_is_included(self):
+        data = self.fetch(category='pastor')
+        self.assertEqual({c['category'] for c in data}, {'Pastor'})
+        self.assertEqual(len(data), 2)
+
+    def test_region_and_subregion_filters(self):
+        self.assertEqual(len(self.fetch(region='nairobi')), 2)
+        data = self.fetch(region='Nairobi', subregion='Kasarani')
+        self.assertEqual([c['name'] for c in data], ['Alice'])
+        self.assertEqual(data[0]['subregion'], 'Kasarani')
+        self.assertEqual(self.fetch(subregion='likoni')[0]['region'], 'Mombasa')
+        self.assertEqual(self.fetch(region='Kisumu'), [])
+
+    def test_fields_projection(self):
+        data = self.fetch(category='Regional Overseer', fields='name,phone,bogus')
+        self.assertEqual(data, [{'name': 'Carol', 'phone': '+254711000003'}])
+
+    def test_etag_returns_not_modified(self):
+        first = self.client.get(self.url, {'category': 'Pastor'})
+        etag = first['ETag']
+
+        again = self.client.get(self.url, {'category': 'Pastor'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+
+        Contact.objects.create(category=self.pastor, name='Dan', phone='0711000004')
+        changed = self.client.get(self.url, {'category': 'Pastor'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(len(changed.json()['pastors']), 3)
+
+
+class PhoneNormalizationTests(SimpleTestCase):
+
+    def test_kenyan_spellings(self):
+        for raw in ['0712345678', '712345678', '254712345678', '+254 712 345 678',
+                    '0712-345-678', '00254712345678', 712345678.0, ' 0712345678 ']:
+            self.assertEqual(normalize_phone(raw), '+254712345678', raw)
+
+    def test_international_numbers_need_a_prefix(self):
+        self.assertEqual(normalize_phone('+44 20 7946 0958'), '+442079460958')
+        self.assertEqual(normalize_phone('0044 20 7946 0958'), '+442079460958')
+        self.assertIsNone(normalize_phone('442079460958'))
+
+    def test_rejects_unusable_values(self):
+        for raw in [None, '', '   ', 'pastor', '07123', '+2547123456789', '+1234567', '+1234567890123456']:
+            self.assertIsNone(normalize_phone(raw), raw)
+
+    def test_longest_number_fits_the_phone_columns(self):
+        phone = normalize_phone('+123456789012345')
+        self.assertEqual(phone, '+123456789012345')
+        for model in (Contact, Pastor, SMSRecipient):
+            self.assertLessEqual(len(phone), model._meta.get_field('phone').max_length)
+
+    def test_normalize_recipients_dedupes_and_reports_invalid(self):
+        valid, invalid = normalize_recipients(
+            ['0712345678', '+254712345678', '0722000000', 'n/a', '', None, ' 123 ', '712345678']
+        )
+        self.assertEqual(valid, ['+254712345678', '+254722000000'])
+        self.assertEqual(invalid, ['n/a', '123'])
+
+    def test_partial_number_prefix(self):
+        self.assertEqual(normalize_phone_prefix('0712 34'), '+25471234')
+        self.assertEqual(normalize_phone_prefix('71234'), '+25471234')
+        self.assertEqual(normalize_phone_prefix('+4420'), '+4420')
+        self.assertIsNone(normalize_phone_prefix('07'))
+        self.assertIsNone(normalize_phone_prefix('Alice'))
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('operator', password='pass')
+        pastor = Category.objects.create(name='Pastor')
+        Contact.objects.create(category=pastor, name='Alice Wanjiru', phone='0711000001')
+        Contact.objects.create(category=pastor, name='Bob Otieno', phone='0711000002')
+        SMSLog.objects.create(sender=cls.user, message='Prayer meeting on Sunday', recipient_count=2, status='ok')
+        SMSLog.objects.create(sender=cls.user, message='Conference fees reminder', recipient_count=2, status='ok')
+
+    def test_contact_name_prefix_and_phone(self):
+        contacts = Contact.objects.all()
+        self.assertEqual([c.name for c in search_contacts(contacts, 'wanj')], ['Alice Wanjiru'])
+        self.assertEqual([c.name for c in search_contacts(contacts, '+254711000002')], ['Bob Otieno'])
+        self.assertFalse(search_contacts(contacts, 'nobody').exists())
+
+    def test_contact_partial_phone(self):
+        contacts = Contact.objects.order_by('name')
+        self.assertEqual([c.name for c in search_contacts(contacts, '0711 000')], ['Alice Wanjiru', 'Bob Otieno'])
+        self.assertEqual([c.name for c in search_contacts(contacts, '+25471100000')], ['Alice Wanjiru', 'Bob Otieno'])
+        self.assertFalse(search_contacts(contacts, '0712').exists())
+
+    def test_log_search_by_sender_username(self):
+        other = get_user_model().objects.create_user('other', password='pass')
+        SMSLog.objects.create(sender=other, message='Choir practice', recipient_count=1, status='ok')
+        with CaptureQueriesContext(connection) as ctx:
+            messages = list(search_logs(SMSLog.objects.all(), 'OPERATOR').values_list('message', flat=True))
+        self.assertCountEqual(messages, ['Prayer meeting on Sunday', 'Conference fees reminder'])
+        self.assertNotIn('JOIN', ctx.captured_queries[-1]['sql'])
+
+    def test_log_search_tracks_updates_and_deletes(self):
+        self.assertEqual(search_logs(SMSLog.objects.all(), 'prayer sunday').count(), 1)
+        SMSLog.objects.filter(message__startswith='Conference').update(message='Prayer retreat')
+        self.assertEqual(search_logs(SMSLog.objects.all(), 'prayer').count(), 2)
+        SMSLog.objects.filter(message='Prayer retreat').delete()
+        self.assertEqual(search_logs(SMSLog.objects.all(), 'prayer').count(), 1)
+
+    def test_search_api(self):
+        self.client.force_login(self.user)
+        data = self.client.get(reverse('smsapp:search'), {'q': 'reminder'}).json()
+        self.assertEqual(data['contacts'], [])
+        self.assertEqual([log['message'] for log in data['logs']], ['Conference fees reminder'])
+        self.assertEqual(self.client.get(reverse('smsapp:search')).status_code, 400)
+
+
+class LogPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('operator', password='pass')
+        logs = SMSLog.objects.bulk_create(
+            SMSLog(sender=cls.user, message=f'Message {i}', recipient_count=1, status='ok') for i in range(9)
+        )
+        # Broadcasts queued in the same instant share sent_at; only the id breaks the tie
+        same_moment = timezone.now() - timedelta(hours=1)
+        SMSLog.objects.filter(pk__in=[log.pk for log in logs[:7]]).update(sent_at=same_moment)
+        SMSLog.objects.filter(pk=logs[7].pk).update(sent_at=same_moment - timedelta(seconds=1))
+        cls.expected = list(SMSLog.objects.order_by('-sent_at', '-id').values_list('pk', flat=True))
+
+    def walk(self, fetch, limit):
+        seen, cursor = [], None
+        while True:
+            ids, cursor = fetch({'limit': limit, **({'cursor': cursor} if cursor else {})})
+            seen.extend(ids)
+            if not cursor:
+                return seen
+
+    def test_cursor_walks_ties_on_sent_at_without_gaps_or_repeats(self):
+        def fetch(params):
+            page = get_log_page(params)
+            return [log.pk for log in page['logs']], page['next_cursor']
+
+        for limit in (1, 2, 3, 4, 9, 10):
+            self.assertEqual(self.walk(fetch, limit), self.expected, limit)
+
+    def test_cursor_breaks_inside_a_tie(self):
+        page = get_log_page({'limit': 3})
+        sent_at, pk = decode_cursor(page['next_cursor'])
+        self.assertEqual(pk, self.expected[2])
+        self.assertEqual(SMSLog.objects.get(pk=self.expected[3]).sent_at, sent_at)
+
+    def test_api_pages_through_ties(self):
+        self.client.force_login(self.user)
+
+        def fetch(params):
+            data = self.client.get(reverse('smsapp:sms_log_list'), params).json()
+            return [log['id'] for log in data['logs']], data['next_cursor']
+
+        self.assertEqual(self.walk(fetch, 2), self.expected)
+
+    def test_malformed_cursor_starts_from_the_top(self):
+        page = get_log_page({'limit': 2, 'cursor': 'not-a-cursor'})
+        self.assertEqual([log.pk for log in page['logs']], self.expected[:2])
+
+
+class SegmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('operator', password='pass')
+        cls.pastor = Category.objects.create(name='Pastor')
+        regional = Category.objects.create(name='Regional')
+        cls.nairobi = Region.objects.create(name='Nairobi')
+        mombasa = Region.objects.create(name='Mombasa')
+        Contact.objects.create(category=cls.pastor, name='Alice', phone='0711000001', region=cls.nairobi)
+        Contact.objects.create(category=cls.pastor, name='Bob', phone='0711000002', region=mombasa)
+        Contact.objects.create(category=regional, name='Carol', phone='0711000003', region=cls.nairobi)
+        cls.segment = Segment.objects.create(name='Nairobi pastors', region=cls.nairobi)
+        cls.segment.categories.add(cls.pastor)
+
+    def setUp(self):
+        cache.clear()
+        self.segment.refresh_from_db()
+
+    def test_resolves_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            phones = resolve_segment(self.segment)
+        self.assertEqual(phones, ['+254711000001'])
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_count_is_cached_until_contacts_change(self):
+        self.assertEqual(segment_count(self.segment), 1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(segment_count(self.segment), 1)
+        # Only cache reads (the database cache backend queries its own table)
+        self.assertFalse([q for q in ctx.captured_queries if 'smsapp_contact' in q['sql']])
+
+        Contact.objects.create(category=self.pastor, name='Dan', phone='0711000004', region=self.nairobi)
+        self.assertEqual(segment_count(self.segment), 2)
+
+    def test_send_by_segment(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('smsapp:dashboard'), {'segment': self.segment.pk, 'message': 'Hello'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 202)
+        job = SMSJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual(job.recipients, ['+254711000001'])
+        self.assertEqual(job.category, 'Nairobi pastors')
+
+
+class CacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('operator', password='pass')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def log_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q for q in ctx.captured_queries if 'FROM "smsapp_smslog"' in q['sql']]
+
+    def test_categories_follow_category_writes(self):
+        Category.objects.create(name='Pastor')
+        self.assertEqual([c['name'] for c in get_categories()], ['Pastor'])
+        Category.objects.create(name='Bishop')
+        self.assertEqual([c['name'] for c in get_categories()], ['Bishop', 'Pastor'])
+
+    def test_dashboard_log_fragment_is_cached_until_a_log_is_saved(self):
+        url = reverse('smsapp:dashboard')
+        SMSLog.objects.create(sender=self.user, message='First broadcast', recipient_count=1, status='ok')
+        self.assertContains(self.log_queries(url)[0], 'First broadcast')
+
+        response, queries = self.log_queries(url)
+        self.assertContains(response, 'First broadcast')
+        self.assertEqual(queries, [])
+
+        SMSLog.objects.create(sender=self.user, message='Second broadcast', recipient_count=1, status='ok')
+        self.assertContains(self.client.get(url), 'Second broadcast')
+
+    def test_log_api_pages_are_cached_until_a_log_is_saved(self):
+        url = reverse('smsapp:sms_log_list')
+        log = SMSLog.objects.create(sender=self.user, message='Hello', recipient_count=1, status='queued')
+        self.assertEqual(self.client.get(url).json()['logs'][0]['status'], 'queued')
+        self.assertEqual(self.log_queries(url)[1], [])
+
+        log.status = 'ok'
+        log.save(update_fields=['status'])
+        self.assertEqual(self.client.get(url).json()['logs'][0]['status'], 'ok')
+
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_user('admin', password='pass', is_staff=True)
+        pastor = Category.objects.create(name='Pastor')
+        cls.first = Contact.objects.create(category=pastor, name='Contact 0', phone='0711000000')
+        for i in range(1, 5):
+            Contact.objects.create(category=pastor, name=f'Contact {i}', phone=f'07110000{i:02d}')
+
+    def test_wsgi_csv_export(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('smsapp:export_contacts'))
+        self.assertFalse(response.is_async)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,name,phone,category,region,subregion')
+        self.assertEqual(len(lines), 6)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    async def test_asgi_csv_export_is_streamed_not_buffered(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('smsapp:export_contacts'))
+        # A sync iterator would make Django collect the whole body with sync_to_async(list)
+        self.assertTrue(response.is_async)
+
+        parts = aiter(response.streaming_content)
+        self.assertEqual(await anext(parts), b'id,name,phone,category,region,subregion\r\n')
+        self.assertTrue((await anext(parts)).startswith(f'{self.first.pk},Contact 0,'.encode()))
+        remaining = [part async for part in parts]
+        self.assertEqual(len(remaining), 4)
+
+    async def test_asgi_xlsx_export_is_streamed(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('smsapp:export_contacts'), {'format': 'xlsx'})
+        self.assertTrue(response.is_async)
+        body = b''.join([part async for part in response.streaming_content])
+        self.assertEqual(len(body), int(response['Content-Length']))
+        sheet = openpyxl.load_workbook(io.BytesIO(body)).active
+        self.assertEqual(sheet.max_row, 6)
+
+
+@override_settings(CELCOM_DLR_TOKEN='dlr-secret', DLR_FLUSH_INTERVAL=3600, DLR_BATCH_SIZE=500)
+class DeliveryReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        log = SMSLog.objects.create(message='Hello', recipient_count=2, status='ok')
+        cls.sent = SMSRecipient.objects.create(log=log, phone='+254711000001', status='sent', provider_message_id='m-1')
+        cls.pending = SMSRecipient.objects.create(log=log, phone='+254711000002', status='sent')
+
+    def setUp(self):
+        reset_buffer()
+        self.addCleanup(reset_buffer)
+        self.url = reverse('smsapp:celcom_dlr')
+
+    def post(self, reports, **headers):
+        return self.client.post(self.url, reports, content_type='application/json', **headers)
+
+    def test_rejected_without_configured_token(self):
+        with override_settings(CELCOM_DLR_TOKEN=''):
+            response = self.post({'messageid': 'm-1', 'status': 'DELIVRD'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.post({'messageid': 'm-1', 'status': 'DELIVRD'}).status_code, 403)
+        self.assertFalse(DeliveryReport.objects.exists())
+
+    def test_reports_are_stored_before_acknowledging(self):
+        response = self.post([{'messageid': 'm-1', 'status': 'DELIVRD'}], HTTP_X_DLR_TOKEN='dlr-secret')
+        self.assertEqual(response.json(), {'status': 'ok', 'accepted': 1})
+        # Not applied yet, but durable: a restart before the flush loses nothing
+        self.assertEqual(DeliveryReport.objects.count(), 1)
+
+        self.assertEqual(apply_pending_reports(), 1)
+        self.sent.refresh_from_db()
+        self.assertEqual(self.sent.status, SMSRecipient.STATUS_DELIVERED)
+        self.assertFalse(DeliveryReport.objects.exists())
+
+    def test_early_report_is_kept_until_the_message_id_is_recorded(self):
+        self.post({'messageid': 'm-2', 'status': 'UNDELIV'}, HTTP_X_DLR_TOKEN='dlr-secret')
+        self.assertEqual(apply_pending_reports(), 0)
+        self.assertEqual(DeliveryReport.objects.get().attempts, 1)
+
+        SMSRecipient.objects.filter(pk=self.pending.pk).update(provider_message_id='m-2')
+        self.assertEqual(apply_reports_for(['m-2']), 1)
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.status, SMSRecipient.STATUS_UNDELIVERED)
+        self.assertFalse(DeliveryReport.objects.exists())
+
+    @override_settings(DLR_UNMATCHED_TTL=0)
+    def test_unmatched_reports_expire(self):
+        self.post({'messageid': 'unknown', 'status': 'DELIVRD'}, HTTP_X_DLR_TOKEN='dlr-secret')
+        with self.assertLogs('smsapp.dlr', 'WARNING'):
+            apply_pending_reports()
+        self.assertFalse(DeliveryReport.objects.exists())
+
+
+class ContactImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.create(name='Pastor')
+        Contact.objects.create(category=Category.objects.get(), name='Old Name', phone='0711000001')
+
+    def workbook(self, rows):
+        wb = openpyxl.Workbook()
+        wb.active.append(['name', 'phone', 'category', 'region', 'subregion'])
+        for row in rows:
+            wb.active.append(row)
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        buffer.seek(0)
+        return buffer
+
+    def test_batches_and_per_row_outcomes(self):
+        rows = [
+            ['Updated Name', '0711000001', 'Pastor', 'Nairobi', 'Westlands'],
+            ['New One', '+254711000002', 'Elder', None, None],
+            ['No Phone', None, 'Pastor', None, None],
+            ['Bad Phone', '12345', 'Pastor', None, None],
+            ['Repeated', '0711000002', 'Elder', None, None],
+            [None, None, None, None, None],
+            ['New Two', '711000003', 'Pastor', None, None],
+        ]
+        progress = []
+        stats = import_contacts(self.workbook(rows), batch_size=2, on_progress=lambda s: progress.append(dict(s)))
+
+        self.assertEqual(stats, {"processed": 6, "inserted": 2, "updated": 2, "skipped": 1, "failed": 1})
+        self.assertEqual(len(progress), 2)  # one call per flushed batch
+        self.assertEqual(Contact.objects.get(phone='+254711000001').name, 'Updated Name')
+        self.assertEqual(Contact.objects.get(phone='+254711000002').name, 'Repeated')
+        self.assertEqual(Contact.objects.count(), 3)
+
+    @override_settings(IMPORT_UPLOAD_CHUNK_SIZE=1024)
+    def test_job_reassembles_the_stored_chunks_and_removes_them(self):
+        content = self.workbook([['New', '0711000009', 'Pastor', None, None]]).read()
+        job = enqueue_import(None, SimpleUploadedFile('contacts.xlsx', content))
+        chunks = list(job.chunks.values_list('data', flat=True))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(data) <= 1024 for data in chunks))
+        self.assertEqual(b''.join(bytes(data) for data in chunks), content)
+
+        job = process_import_job(claim_next_job(ImportJob))
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual((job.rows_processed, job.rows_inserted), (1, 1))
+        self.assertFalse(ImportUploadChunk.objects.exists())
+
+    def test_unreadable_upload_fails_the_job(self):
+        job = enqueue_import(None, SimpleUploadedFile('contacts.xlsx', b'not a workbook'))
+        job = process_import_job(claim_next_job(ImportJob))
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertIn('Error processing file', job.error)
+        self.assertFalse(job.chunks.exists())
+
+
+class RetentionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('operator', password='pass')
+
+    def rollups(self, day):
+        return sorted(SMSDailyRollup.objects.filter(day=day).values_list('status', 'message_count'))
+
+    def create_logs(self, count, days_ago, status='ok'):
+        logs = [SMSLog.objects.create(sender=self.user, message=f'Msg {i}', recipient_count=2, status=status)
+                for i in range(count)]
+        sent_at = timezone.now() - timedelta(days=days_ago)
+        SMSLog.objects.filter(pk__in=[log.pk for log in logs]).update(sent_at=sent_at)
+        return logs, timezone.localtime(sent_at).date()
+
+    def test_rerun_replaces_groups_that_no_longer_exist(self):
+        (log,), day = self.create_logs(1, days_ago=0, status='queued')
+        rollup_days(day, day + timedelta(days=1))
+        self.assertEqual(self.rollups(day), [('queued', 1)])
+
+        SMSLog.objects.filter(pk=log.pk).update(status='ok')
+        rollup_days(day, day + timedelta(days=1))
+        self.assertEqual(self.rollups(day), [('ok', 1)])
+
+    def test_partial_archive_keeps_the_boundary_day_rollup(self):
+        _, day = self.create_logs(4, days_ago=40)
+
+        self.assertEqual(archive_logs(retention_days=30, batch_size=1, max_batches=1), (1, 1))
+        self.assertEqual(self.rollups(day), [('ok', 4)])
+
+        archive_logs(retention_days=30, batch_size=1, max_batches=1)
+        self.assertEqual(self.rollups(day), [('ok', 4)])
+
+        archive_logs(retention_days=30, batch_size=10)
+        self.assertEqual(self.rollups(day), [('ok', 4)])
+        self.assertFalse(SMSLog.objects.exists())
+        self.assertEqual(sum(SMSLogArchive.objects.values_list('log_count', flat=True)), 4)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'smsapp_cache',
+}})
+class AsyncCacheCallerTests(TestCase):
+    """Coroutines must not touch the (database) cache synchronously."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_user('admin', password='pass', is_staff=True)
+
+    @mock.patch('smsapp.balance._start_refresh_thread')
+    async def test_stale_balance_is_refreshed_from_async_view(self, start_refresh):
+        await cache.aset(BALANCE_CACHE_KEY, {"data": {"credit": 5}, "fetched_at": 0}, timeout=None)
+        await self.async_client.aforce_login(self.staff)
+
+        response = await self.async_client.get(reverse('smsapp:check_balance'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(await cache.aget(REFRESH_LOCK_KEY))
+
+        await self.async_client.get(reverse('smsapp:check_balance'))
+        start_refresh.assert_called_once()  # second call sees the refresh lock
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'smsapp_cache',
+}})
+class CircuitPublishTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_state_change_inside_event_loop_is_published(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+
+        async def fail():
+            breaker.record_failure()
+
+        async_to_sync(fail)()
+        for thread in threading.enumerate():
+            if thread.name == 'circuit-publish':
+                thread.join(timeout=5)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(cache.get(CIRCUIT_CACHE_KEY)['state'], CircuitBreaker.OPEN)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CircuitBreakerTests(TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch('smsapp.circuit.time.monotonic', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, half_open_calls=1)
+
+    def open_and_wait(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 31
+
+    def test_gauge_reports_the_published_state(self):
+        cache.set(CIRCUIT_CACHE_KEY, {'state': CircuitBreaker.OPEN, 'changed_at': 0}, timeout=None)
+        self.assertEqual(metrics.collect_gauges()['celcom_circuit_state'][1], 2.0)
+        cache.delete(CIRCUIT_CACHE_KEY)
+        self.assertEqual(metrics.collect_gauges()['celcom_circuit_state'][1], 0.0)
+
+    def test_opens_after_threshold_and_rejects_until_timeout(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.now += 31
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_single_probe_closes_or_reopens(self):
+        self.open_and_wait()
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        self.now += 31
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.before_call()
+
+    def make_client(self, client_class, post):
+        client = client_class.from_settings()
+        target = client.session if client_class is CelcomClient else client.client
+        patches = [
+            mock.patch.object(target, 'post', side_effect=post),
+            mock.patch('smsapp.celcom.get_breaker', return_value=self.breaker),
+            mock.patch('smsapp.celcom.get_limiter', return_value=mock.Mock(reserve=mock.Mock(return_value=0))),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        return client
+
+    def test_unexpected_error_releases_the_probe(self):
+        client = self.make_client(CelcomClient, ValueError('bad payload'))
+        self.open_and_wait()
+        with self.assertRaises(ValueError):
+            client.send({"mobile": "254711000001"})
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.before_call()
+
+    def test_cancelled_async_call_releases_the_probe(self):
+        client = self.make_client(AsyncCelcomClient, asyncio.CancelledError())
+        self.open_and_wait()
+
+        async def send():
+            with self.assertRaises(asyncio.CancelledError):
+                await client.send({"mobile": "254711000001"})
+            await client.aclose()
+
+        async_to_sync(send)()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.before_call()
+
+
+class RateLimiterTests(TestCase):
+
+    def setUp(self):
+        self.now = 1_000_000.0
+        clock = mock.patch('smsapp.ratelimit.time.time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def limiter(self, **kwargs):
+        return AdaptiveRateLimiter(**{'request_rate': 2, 'recipient_rate': 0, 'burst_seconds': 1, **kwargs})
+
+    def test_bucket_refills_over_time(self):
+        limiter = self.limiter()
+        self.assertEqual([limiter.reserve(), limiter.reserve()], [0.0, 0.0])
+        self.assertAlmostEqual(limiter.reserve(), 0.5)
+        self.now += 1.5
+        self.assertEqual(limiter.reserve(), 0.0)
+        self.assertAlmostEqual(limiter.snapshot()['request_tokens'], 1.0)
+
+    def test_large_call_goes_into_debt(self):
+        limiter = self.limiter(request_rate=0, recipient_rate=100)
+        self.assertEqual(limiter.reserve(recipients=100), 0.0)
+        self.assertAlmostEqual(limiter.reserve(recipients=500), 5.0)
+
+    def test_budget_is_shared_between_processes(self):
+        web, worker = self.limiter(), self.limiter()
+        web.reserve()
+        web.reserve()
+        self.assertAlmostEqual(worker.reserve(), 0.5)
+
+    def test_429_halves_rate_pauses_and_recovers(self):
+        limiter = self.limiter(recovery_step=0.25)
+        with self.assertLogs('smsapp.ratelimit', 'WARNING'):
+            limiter.record_response(429, retry_after=10)
+        self.assertEqual(limiter.snapshot()['rate_factor'], 0.5)
+        self.assertAlmostEqual(self.limiter().reserve(), 10.0)
+
+        self.now += 10
+        limiter.record_response(503)
+        self.assertEqual(limiter.snapshot()['rate_factor'], 0.25)
+        # At a quarter of 2/s each request takes 2s of the 4s burst
+        self.assertEqual([limiter.reserve(), limiter.reserve()], [0.0, 0.0])
+        self.assertAlmostEqual(limiter.reserve(), 2.0)
+
+        for _ in range(4):
+            limiter.record_response(200)
+        self.assertEqual(limiter.snapshot()['rate_factor'], 1.0)
+        limiter.record_response(404)
+        self.assertEqual(limiter.snapshot()['rate_factor'], 1.0)
+
+    def test_falls_back_to_local_buckets_when_database_fails(self):
+        limiter = self.limiter()
+        locked = mock.patch('smsapp.ratelimit.RateLimitState.objects.filter',
+                            side_effect=OperationalError('database is locked'))
+        with locked, self.assertLogs('smsapp.ratelimit', 'WARNING') as logs:
+            self.assertAlmostEqual(limiter.reserve(), 0.0, places=2)
+            self.assertAlmostEqual(limiter.reserve(), 0.0, places=2)
+            self.assertAlmostEqual(limiter.reserve(), 0.5, places=2)
+            limiter.record_response(429)
+            limiter.record_response(200)
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(limiter._local_factor, 0.55)
+
+        self.assertEqual(limiter.reserve(), 0.0)
+        self.assertAlmostEqual(limiter.snapshot()['request_tokens'], 1.0)
+
+
+@override_settings(SMS_PROVIDER_BACKEND='smsapp.providers.locmem.InMemoryProvider', SMS_STUB_FAILURE_RATE=0)
+class InMemoryProviderTests(TestCase):
+
+    def setUp(self):
+        locmem.clear_outbox()
+
+    def test_job_is_sent_through_configured_backend(self):
+        enqueue_sms(None, 'Hello', ['0711000001', '0711000002'])
+        job = process_job(claim_next_job())
+
+        self.assertEqual(job.status, SMSJob.STATUS_DONE)
+        self.assertEqual(len(locmem.outbox), 1)
+        self.assertEqual(locmem.outbox[0]['recipients'], ['+254711000001', '+254711000002'])
+        ids = set(SMSRecipient.objects.values_list('provider_message_id', flat=True))
+        self.assertEqual(ids, set(locmem.outbox[0]['message_ids']))
+
+
+class CelcomRetryClassificationTests(TestCase):
+
+    def setUp(self):
+        self.provider = CelcomProvider()
+
+    def send_raising(self, exc):
+        client = mock.Mock(send=mock.Mock(side_effect=exc))
+        with mock.patch('smsapp.providers.celcom.get_client', return_value=client):
+            return self.provider.send('Hi', ['+254711000001'], 'Church', idempotency_key='k')
+
+    def asend_raising(self, exc):
+        client = mock.Mock(send=mock.AsyncMock(side_effect=exc))
+        with mock.patch('smsapp.providers.celcom.get_async_client', return_value=client):
+            return async_to_sync(self.provider.asend)('Hi', ['+254711000001'], 'Church', idempotency_key='k')
+
+    def test_only_refused_responses_are_retryable(self):
+        self.assertTrue(self.provider.send_result(httpx.Response(429, json={}))['retryable'])
+        for status in (500, 502, 503):
+            result = self.provider.send_result(httpx.Response(status, json={}))
+            self.assertFalse(result['retryable'])
+            self.assertIn('not resent automatically', result['message'])
+
+    def test_connection_failures_are_retryable(self):
+        try:
+            requests.post('http://127.0.0.1:9/', timeout=1)
+        except requests.exceptions.ConnectionError as e:
+            refused = e
+        self.assertTrue(self.send_raising(refused)['retryable'])
+        self.assertTrue(self.send_raising(requests.exceptions.ConnectTimeout())['retryable'])
+        self.assertTrue(self.asend_raising(httpx.ConnectError('refused'))['retryable'])
+
+    def test_errors_after_the_request_was_sent_are_not_retried(self):
+        self.assertFalse(self.send_raising(requests.exceptions.ReadTimeout())['retryable'])
+        self.assertFalse(self.send_raising(requests.exceptions.ChunkedEncodingError())['retryable'])
+        self.assertFalse(self.asend_raising(httpx.ReadTimeout('slow'))['retryable'])
+        self.assertFalse(self.asend_raising(httpx.RemoteProtocolError('dropped'))['retryable'])
+
+
+class CelcomResponseParsingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.provider = CelcomProvider()
+
+    def test_send_payload_uses_msisdns_and_client_id(self):
+        payload = self.provider.send_payload('Hi', ['+254711000001', '+254711000002'], 'Church', idempotency_key='k1')
+
+        self.assertEqual(payload['mobile'], '254711000001,254711000002')
+        self.assertEqual(payload['shortcode'], 'Church')
+        self.assertEqual(payload['clientsmsid'], 'k1')
+        self.assertNotIn('clientsmsid', self.provider.send_payload('Hi', ['+254711000001'], 'Church'))
+
+    def test_send_result(self):
+        ok = self.provider.send_result(httpx.Response(200, json={'responses': []}))
+        self.assertEqual(ok, {'status': 'ok', 'response': {'responses': []}})
+
+        error = self.provider.send_result(httpx.Response(400, text='bad shortcode'))
+        self.assertEqual(error['status'], 'error')
+        self.assertEqual(error['http_status'], 400)
+        self.assertEqual(error['response'], {'raw': 'bad shortcode'})
+        self.assertFalse(error['retryable'])
+
+    def test_extract_message_ids(self):
+        response = {'responses': [
+            {'mobile': 254711000001, 'messageid': 11},
+            {'mobile': '254711000002', 'messageID': 'a2'},
+            {'mobile': 254711000003},
+            {'messageid': 14},
+            'garbage',
+        ]}
+
+        self.assertEqual(self.provider.extract_message_ids(response),
+                         {'+254711000001': '11', '+254711000002': 'a2'})
+        self.assertEqual(self.provider.extract_message_ids({'raw': 'x'}), {})
+        self.assertEqual(self.provider.extract_message_ids(['x']), {})
+
+    def test_balance_result(self):
+        self.assertEqual(self.provider.balance_result(httpx.Response(200, json={'credit': 5})), {'credit': 5})
+        self.assertEqual(self.provider.balance_result(httpx.Response(401, text='denied')),
+                         {'status': 'error', 'response': {'raw': 'denied'}})
+
+
+class StandInServerTests(SimpleTestCase):
+
+    def start(self, **options):
+        server = StandInServer(('127.0.0.1', 0), latency=0, **options)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+    def mobiles(self, count):
+        return ','.join(str(254711000000 + i) for i in range(count))
+
+    def test_send_and_balance(self):
+        server, url = self.start(credit=10)
+
+        sent = requests.post(url, json={'mobile': self.mobiles(2), 'message': 'Hi'}, timeout=5)
+        balance = requests.post(url, json={'partnerID': 'p'}, timeout=5)
+
+        self.assertEqual(sent.status_code, 200)
+        ids = CelcomProvider().extract_message_ids(sent.json())
+        self.assertEqual(ids, {'+254711000000': '1', '+254711000001': '2'})
+        self.assertEqual(balance.json()['credit'], 8)
+
+    def test_chunk_over_the_cap_is_admitted_then_throttled(self):
+        server, url = self.start(max_recipients=50)
+
+        first = requests.post(url, json={'mobile': self.mobiles(100)}, timeout=5)
+        second = requests.post(url, json={'mobile': self.mobiles(100)}, timeout=5)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.json()['responses']), 100)
+        self.assertEqual(second.status_code, 429)
+        self.assertEqual(second.headers['Retry-After'], '2')
+
+    def test_oversized_chunk_waits_for_a_full_bucket(self):
+        server = StandInServer(('127.0.0.1', 0), latency=0, max_recipients=50)
+        self.addCleanup(server.server_close)
+        now = server.recipient_bucket.updated
+        with mock.patch('smsapp.providers.standin.time.monotonic', return_value=now):
+            self.assertIsNone(server.admit(100))
+            self.assertAlmostEqual(server.admit(100), 2.0)
+        with mock.patch('smsapp.providers.standin.time.monotonic', return_value=now + 1.5):
+            self.assertAlmostEqual(server.admit(100), 0.5)
+        with mock.patch('smsapp.providers.standin.time.monotonic', return_value=now + 2):
+            self.assertIsNone(server.admit(100))
+        self.assertEqual(server.stats['throttled'], 2)
+
+    def test_request_cap(self):
+        server = StandInServer(('127.0.0.1', 0), latency=0, max_rps=2)
+        self.addCleanup(server.server_close)
+        now = server.request_bucket.updated
+        with mock.patch('smsapp.providers.standin.time.monotonic', return_value=now):
+            self.assertIsNone(server.admit(1))
+            self.assertIsNone(server.admit(1))
+            self.assertAlmostEqual(server.admit(1), 0.5)
+
+
+class JobQueueTests(TestCase):
+
+    def test_claims_oldest_queued_job_once(self):
+        first = enqueue_sms(None, 'One', ['0711000001'])
+        second = enqueue_sms(None, 'Two', ['0711000002'])
+
+        claimed = claim_next_job()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, SMSJob.STATUS_RUNNING)
+        self.assertEqual(claimed.heartbeat_at, claimed.started_at)
+        self.assertEqual(claim_next_job().pk, second.pk)
+        self.assertIsNone(claim_next_job())
+
+    def test_claim_skips_a_job_taken_by_another_worker(self):
+        first = enqueue_sms(None, 'One', ['0711000001'])
+        second = enqueue_sms(None, 'Two', ['0711000002'])
+        real_first = QuerySet.first
+
+        def first_then_lose(qs):
+            # Another worker wins the race between our SELECT and UPDATE
+            pk = real_first(qs)
+            if pk == first.pk:
+                SMSJob.objects.filter(pk=pk).update(status=SMSJob.STATUS_RUNNING)
+            return pk
+
+        with mock.patch.object(QuerySet, 'first', first_then_lose):
+            self.assertEqual(claim_next_job().pk, second.pk)
+
+    @override_settings(SMS_JOB_STALE_AFTER=600)
+    def test_requeue_uses_heartbeat_not_start_time(self):
+        long_running = enqueue_sms(None, 'Long', ['0711000001'])
+        crashed = enqueue_sms(None, 'Crashed', ['0711000002'])
+        claim_next_job()
+        claim_next_job()
+        now = timezone.now()
+        SMSJob.objects.update(started_at=now - timedelta(hours=2))
+        SMSJob.objects.filter(pk=long_running.pk).update(heartbeat_at=now - timedelta(seconds=30))
+        SMSJob.objects.filter(pk=crashed.pk).update(heartbeat_at=now - timedelta(minutes=20))
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(SMSJob.objects.get(pk=long_running.pk).status, SMSJob.STATUS_RUNNING)
+        self.assertEqual(SMSJob.objects.get(pk=crashed.pk).status, SMSJob.STATUS_QUEUED)
+        self.assertEqual(requeue_stale_jobs(ImportJob), 0)
+
+    @override_settings(SMS_PROVIDER_BACKEND='smsapp.providers.locmem.InMemoryProvider',
+                       SMS_STUB_FAILURE_RATE=0, CELCOM_CHUNK_SIZE=1)
+    def test_progress_bumps_heartbeat(self):
+        enqueue_sms(None, 'Hello', ['0711000001', '0711000002'])
+        job = claim_next_job()
+        SMSJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        job.refresh_from_db()
+        stale = job.heartbeat_at
+        process_job(job)
+        self.assertGreater(SMSJob.objects.get(pk=job.pk).heartbeat_at, stale)
+
+
+class ConcurrentClaimTests(TransactionTestCase):
+
+    def test_workers_never_claim_the_same_job(self):
+        for i in range(6):
+            enqueue_sms(None, f'Job {i}', ['0711000001'])
+        claimed = []
+        barrier = threading.Barrier(3)
+
+        def worker():
+            barrier.wait()
+            try:
+                while (job := claim_next_job()) is not None:
+                    claimed.append(job.pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        self.assertEqual(sorted(claimed), sorted(SMSJob.objects.values_list('pk', flat=True)))
+
+
+class DispatchRetryTests(TestCase):
+
+    def setUp(self):
+        sleep = mock.patch('smsapp.utils.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_retryable_failure_is_retried_up_to_the_limit(self):
+        failure = {"status": "error", "retryable": True}
+        with mock.patch('smsapp.utils.send_sms', return_value=failure) as send:
+            result = send_chunk('Hi', ['+254711000001'], 'Church', 'key-1', retries=2)
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(result['attempts'], 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertTrue(all(c.kwargs['idempotency_key'] == 'key-1' for c in send.call_args_list))
+
+    def test_permanent_failure_and_success_are_not_retried(self):
+        for response in ({"status": "error", "retryable": False}, {"status": "ok"}):
+            with mock.patch('smsapp.utils.send_sms', return_value=response) as send:
+                result = send_chunk('Hi', ['+254711000001'], 'Church', 'key-1', retries=5)
+            self.assertEqual(send.call_count, 1)
+            self.assertEqual(result['attempts'], 1)
+        self.sleep.assert_not_called()
+
+    def test_backoff_delay_is_bounded(self):
+        for attempt in range(8):
+            for _ in range(50):
+                delay = backoff_delay(attempt, base=0.5, cap=4)
+                self.assertGreaterEqual(delay, 0)
+                self.assertLessEqual(delay, min(4, 0.5 * 2 ** attempt))
+
+    def test_pool_threads_close_their_connections(self):
+        with mock.patch('smsapp.utils.send_sms', return_value={"status": "ok"}), \
+                mock.patch('smsapp.utils.connection') as conn:
+            results = send_sms_batch('Hi', ['+254711000001', '+254711000002', '+254711000003'],
+                                     chunk_size=1, concurrency=2)
+        self.assertEqual([r['status'] for r in results], ['ok'] * 3)
+        self.assertEqual(conn.close.call_count, 3)
+
+    @override_settings(SMS_PROVIDER_BACKEND='smsapp.providers.locmem.InMemoryProvider',
+                       SMS_STUB_FAILURE_RATE=1, CELCOM_SEND_RETRIES=0, CELCOM_CHUNK_SIZE=2)
+    def test_rerun_reuses_chunk_keys(self):
+        job = enqueue_sms(None, 'Hello', [f'07110000{i:02d}' for i in range(5)])
+        process_job(claim_next_job())
+        first = dict(SMSRecipient.objects.values_list('phone', 'dispatch_key'))
+        self.assertEqual(len(set(first.values())), 3)
+
+        # A later row update must not change the order chunks are cut in
+        SMSRecipient.objects.filter(phone='+254711000000').update(status=SMSRecipient.STATUS_QUEUED)
+        job.refresh_from_db()
+        self.assertTrue(retry_failed(job))
+        with CaptureQueriesContext(connection) as ctx:
+            process_job(claim_next_job())
+        pending_sql = next(q['sql'] for q in ctx.captured_queries
+                           if q['sql'].startswith('SELECT "smsapp_smsrecipient"."phone"'))
+        self.assertIn('ORDER BY "smsapp_smsrecipient"."id"', pending_sql)
+        self.assertEqual(dict(SMSRecipient.objects.values_list('phone', 'dispatch_key')), first)
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_user('admin', password='pass', is_staff=True)
+        cls.operator = get_user_model().objects.create_user('operator', password='pass')
+
+    def query_samples(self, view):
+        return {name: value for name, labels, value in REQUEST_QUERIES.samples()
+                if labels.get('view') == view and name.endswith(('_sum', '_count'))}
+
+    def test_requires_staff_or_token(self):
+        url = reverse('smsapp:metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.operator)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.logout()
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+    def test_request_latency_and_queries_are_exposed(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse('smsapp:get_pastors'))
+
+        body = self.client.get(reverse('smsapp:metrics')).content.decode()
+        self.assertIn('http_requests_total{view="smsapp:get_pastors",method="GET",status="200"}', body)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('# TYPE celcom_circuit_state gauge', body)
+
+    @mock.patch('smsapp.balance._start_refresh_thread')
+    def test_queries_of_async_views_are_attributed(self, start_refresh):
+        self.client.force_login(self.staff)
+        before = self.query_samples('smsapp:dashboard')
+        self.client.get(reverse('smsapp:dashboard'))
+        after = self.query_samples('smsapp:dashboard')
+
+        self.assertEqual(after['http_request_db_queries_count'] - before.get('http_request_db_queries_count', 0), 1)
+        self.assertGreater(after['http_request_db_queries_sum'] - before.get('http_request_db_queries_sum', 0), 0)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('test_seconds', 'Test.', labels=('kind',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, kind='a')
+        samples = {(name, labels.get('le')): value for name, labels, value in histogram.samples()}
+
+        self.assertEqual(samples[('test_seconds_bucket', '0.1')], 1)
+        self.assertEqual(samples[('test_seconds_bucket', '1')], 2)
+        self.assertEqual(samples[('test_seconds_bucket', '+Inf')], 3)
+        self.assertEqual(samples[('test_seconds_count', None)], 3)
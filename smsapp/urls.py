@@ -1,16 +1,30 @@
 from django.urls import path
 from . import views
-from .views import DashboardView, UploadContactsView, GetPastorsView, CheckBalanceView
+from .views import (
+    UploadContactsView, GetPastorsView, CheckBalanceView, SMSJobStatusView,
+    RetrySMSJobView, ImportJobStatusView, DeliveryReportView, SMSLogListView, SMSLogPageView,
+    ExportSMSLogsView, ExportContactsView, SearchView, SegmentListView, MetricsView,
+)
 
 
 app_name = "smsapp"
 
 urlpatterns = [
     path('upload/', UploadContactsView.as_view(), name='upload_contacts'),
+    path('upload/jobs/<int:pk>/', ImportJobStatusView.as_view(), name='import_job_status'),
     path('get_pastors/', GetPastorsView.as_view(), name='get_pastors'),
     path('', views.DashboardView.as_view(), name='dashboard'),
     path('check-balance/', CheckBalanceView.as_view(), name='check_balance'),
-    path('sms_logs/', DashboardView.as_view(), name='sms_logs'),
+    path('sms_logs/', SMSLogPageView.as_view(), name='sms_logs'),
+    path('api/sms_logs/', SMSLogListView.as_view(), name='sms_log_list'),
+    path('api/search/', SearchView.as_view(), name='search'),
+    path('api/segments/', SegmentListView.as_view(), name='segment_list'),
+    path('export/sms_logs/', ExportSMSLogsView.as_view(), name='export_sms_logs'),
+    path('export/contacts/', ExportContactsView.as_view(), name='export_contacts'),
+    path('sms_jobs/<int:pk>/', SMSJobStatusView.as_view(), name='sms_job_status'),
+    path('sms_jobs/<int:pk>/retry/', RetrySMSJobView.as_view(), name='sms_job_retry'),
+    path('dlr/celcom/', DeliveryReportView.as_view(), name='celcom_dlr'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     
 
 
@@ -1,6 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from asgiref.sync import sync_to_async
 from django.conf import settings
-import requests
+from django.db import connection
+import asyncio
+import hashlib
 import logging
+import random
+import time
+from .providers import get_provider
 
 logger = logging.getLogger(__name__)
 
@@ -8,89 +15,225 @@ logger = logging.getLogger(__name__)
 # ============================
 # SEND SMS
 # ============================
-def send_sms(message, recipients, sender_id="BelovedChurch"):
+def send_sms(message, recipients, sender_id="BelovedChurch", idempotency_key=None):
     """
-    Send SMS via Celcom Africa API.
+    Send SMS through the configured provider (settings.SMS_PROVIDER_BACKEND).
     :param message: Text message to send.
     :param recipients: List of phone numbers (list or comma-separated).
-    :param sender_id: Sender ID registered in Celcom.
-    :return: dict response from API.
+    :param sender_id: Sender ID registered with the provider.
+    :param idempotency_key: Passed to the provider (Celcom: clientsmsid and an
+                            Idempotency-Key header) so a repeated submit can be recognised.
+    :return: dict response from the provider. Errors carry "retryable": True when the
+             provider certainly did not accept the message (no connection, HTTP 429).
     """
+    recipients, error = _validate(message, recipients)
+    if error:
+        return error
+    return get_provider().send(message, recipients, sender_id, idempotency_key=idempotency_key)
+
+
+async def asend_sms(message, recipients, sender_id="BelovedChurch", idempotency_key=None):
+    """Async send_sms(); same arguments and result."""
+    recipients, error = _validate(message, recipients)
+    if error:
+        return error
+    return await get_provider().asend(message, recipients, sender_id, idempotency_key=idempotency_key)
+
+
+def _validate(message, recipients):
+    """Recipient list, or (None, error dict) when there is nothing to send."""
 
     # --- Validate message ---
     if not message or not str(message).strip():
-        return {"status": "error", "message": "Message cannot be empty."}
+        return None, {"status": "error", "message": "Message cannot be empty."}
 
     # --- Normalize recipients ---
-    if isinstance(recipients, (list, tuple)):
-        recipients = [str(r).strip() for r in recipients if r and str(r).strip()]
-        mobile = ",".join(recipients)
-    else:
-        mobile = str(recipients).strip()
-
-    if not mobile:
-        return {"status": "error", "message": "No valid recipients provided."}
-
-    payload = {
-        "partnerID": settings.CELCOM_PARTNER_ID,
-        "apikey": settings.CELCOM_API_KEY,
-        "mobile": mobile,
-        "shortcode": sender_id,
-        "message": message,
-        "pass_type": "plain"
-    }
-
-    logger.info(f"Sending SMS to {mobile} via Celcom API...")
-    logger.debug(f"Payload: {payload}")
+    if not isinstance(recipients, (list, tuple)):
+        recipients = str(recipients).split(",")
+    recipients = [str(r).strip() for r in recipients if r and str(r).strip()]
 
-    try:
-        response = requests.post(settings.CELCOM_API_URL, json=payload, timeout=15)
+    if not recipients:
+        return None, {"status": "error", "message": "No valid recipients provided."}
+    return recipients, None
 
-        try:
-            data = response.json()
-        except ValueError:
-            data = {"raw": response.text}
 
-        if response.status_code >= 400:
-            logger.error(f"Celcom returned HTTP error {response.status_code}: {data}")
-            return {"status": "error", "http_status": response.status_code, "response": data}
+def extract_message_ids(response):
+    """Map E.164 number -> provider message id from a successful send response."""
+    return get_provider().extract_message_ids(response)
 
-        logger.info(f"Celcom SMS Response: {data}")
 
-        return {"status": "ok", "response": data}
+# ============================
+# BATCH DISPATCH
+# ============================
+def chunk_recipients(recipients, chunk_size):
+    """Split a recipient list into consecutive chunks of at most chunk_size."""
+    chunk_size = max(1, int(chunk_size))
+    return [recipients[i:i + chunk_size] for i in range(0, len(recipients), chunk_size)]
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Exception sending SMS: {str(e)}")
-        return {"status": "error", "message": str(e)}
 
+def chunk_idempotency_key(prefix, message, chunk):
+    """
+    Key derived from the message and the chunk's numbers, so re-sending the
+    same numbers for the same broadcast always reuses the same key.
+    """
+    digest = hashlib.sha256("\n".join([message, *sorted(chunk)]).encode()).hexdigest()[:20]
+    return f"{prefix}-{digest}" if prefix else digest
 
-# ============================
-# GET BALANCE
-# ============================
-def get_celcom_balance():
-    payload = {
-        "partnerID": settings.CELCOM_PARTNER_ID,
-        "apikey": settings.CELCOM_API_KEY
-    }
 
-    logger.info("Checking Celcom Balance...")
+def backoff_delay(attempt, base=None, cap=None):
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    base = settings.CELCOM_RETRY_BACKOFF if base is None else base
+    cap = settings.CELCOM_RETRY_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def send_chunk(message, chunk, sender_id, idempotency_key, retries):
+    """
+    Send one chunk, retrying failures the provider marks retryable (the chunk
+    was certainly not accepted) with jittered backoff.
+    """
+    attempt = 0
+    while True:
+        result = send_sms(message, chunk, sender_id, idempotency_key=idempotency_key)
+        if result.get("status") == "ok" or not result.get("retryable") or attempt >= retries:
+            return {**result, "attempts": attempt + 1}
+
+        delay = backoff_delay(attempt)
+        logger.warning(f"Chunk {idempotency_key} failed (attempt {attempt + 1}); retrying in {delay:.1f}s")
+        time.sleep(delay)
+        attempt += 1
+
 
+def _send_chunk_in_pool(*args):
+    """send_chunk() on a pool thread; closes the DB connection the rate limiter opened there."""
     try:
-        response = requests.post(settings.CELCOM_BALANCE_URL, json=payload, timeout=10)
+        return send_chunk(*args)
+    finally:
+        connection.close()
+
+
+async def asend_chunk(message, chunk, sender_id, idempotency_key, retries):
+    """Async send_chunk(): backoff waits with asyncio.sleep."""
+    attempt = 0
+    while True:
+        result = await asend_sms(message, chunk, sender_id, idempotency_key=idempotency_key)
+        if result.get("status") == "ok" or not result.get("retryable") or attempt >= retries:
+            return {**result, "attempts": attempt + 1}
 
-        try:
-            data = response.json()
-        except ValueError:
-            data = {"raw": response.text}
+        delay = backoff_delay(attempt)
+        logger.warning(f"Chunk {idempotency_key} failed (attempt {attempt + 1}); retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
 
-        if response.status_code >= 400:
-            logger.error(f"Balance API error {response.status_code}: {data}")
-            return {"status": "error", "response": data}
 
-        logger.info(f"Celcom Balance Response: {data}")
+def send_sms_batch(message, recipients, sender_id="BelovedChurch",
+                   chunk_size=None, concurrency=None, on_result=None,
+                   retries=None, idempotency_prefix=""):
+    """
+    Send one message to many recipients in chunks, several chunks at a time.
+    Only chunks the provider certainly refused are retried; each chunk keeps
+    the same idempotency key across attempts. Chunks that may have been
+    delivered (timeouts, 5xx) are reported failed and left for retry_failed().
+    :param message: Text message to send.
+    :param recipients: List of phone numbers.
+    :param sender_id: Sender ID registered in Celcom.
+    :param chunk_size: Recipients per Celcom request (default CELCOM_CHUNK_SIZE).
+    :param concurrency: Chunks in flight at once (default CELCOM_CONCURRENCY).
+    :param on_result: Optional callback called with each chunk result as it completes.
+    :param retries: Extra attempts per failed chunk (default CELCOM_SEND_RETRIES).
+    :param idempotency_prefix: Prefix for chunk keys, e.g. "sms-job-42".
+    :return: list of per-chunk dicts, in chunk order, each with "chunk",
+             "recipients", "idempotency_key", "attempts" and the send_sms() result keys.
+    """
+    chunk_size = chunk_size or settings.CELCOM_CHUNK_SIZE
+    concurrency = concurrency or settings.CELCOM_CONCURRENCY
+    retries = settings.CELCOM_SEND_RETRIES if retries is None else retries
+
+    recipients = [str(r).strip() for r in recipients if r and str(r).strip()]
+    chunks = chunk_recipients(recipients, chunk_size)
+    if not chunks:
+        return []
+
+    logger.info(
+        f"Dispatching {len(recipients)} recipients in {len(chunks)} chunk(s) "
+        f"of {chunk_size}, concurrency {concurrency}"
+    )
+
+    results = [None] * len(chunks)
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as pool:
+        keys = [chunk_idempotency_key(idempotency_prefix, message, chunk) for chunk in chunks]
+        futures = {
+            pool.submit(_send_chunk_in_pool, message, chunk, sender_id, keys[index], retries): index
+            for index, chunk in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.exception(f"Chunk {index} crashed")
+                result = {"status": "error", "message": str(e)}
+
+            result = {"chunk": index, "recipients": chunks[index], "idempotency_key": keys[index], **result}
+            results[index] = result
+            if on_result:
+                on_result(result)
+
+    return results
+
+
+async def asend_sms_batch(message, recipients, sender_id="BelovedChurch",
+                          chunk_size=None, concurrency=None, on_result=None,
+                          retries=None, idempotency_prefix=""):
+    """
+    Async send_sms_batch(): chunks are coroutines on one event loop instead
+    of threads, so `concurrency` (default CELCOM_ASYNC_CONCURRENCY) can be
+    in the hundreds. `on_result` is a plain function; it runs through
+    sync_to_async, so it may use the ORM. Same return value.
+    """
+    chunk_size = chunk_size or settings.CELCOM_CHUNK_SIZE
+    concurrency = concurrency or settings.CELCOM_ASYNC_CONCURRENCY
+    retries = settings.CELCOM_SEND_RETRIES if retries is None else retries
+
+    recipients = [str(r).strip() for r in recipients if r and str(r).strip()]
+    chunks = chunk_recipients(recipients, chunk_size)
+    if not chunks:
+        return []
+
+    logger.info(
+        f"Dispatching {len(recipients)} recipients in {len(chunks)} chunk(s) "
+        f"of {chunk_size}, async concurrency {concurrency}"
+    )
+
+    keys = [chunk_idempotency_key(idempotency_prefix, message, chunk) for chunk in chunks]
+    results = [None] * len(chunks)
+    slots = asyncio.Semaphore(concurrency)
+    report = sync_to_async(on_result) if on_result else None
+
+    async def run(index):
+        async with slots:
+            try:
+                result = await asend_chunk(message, chunks[index], sender_id, keys[index], retries)
+            except Exception as e:
+                logger.exception(f"Chunk {index} crashed")
+                result = {"status": "error", "message": str(e)}
+
+        result = {"chunk": index, "recipients": chunks[index], "idempotency_key": keys[index], **result}
+        results[index] = result
+        if report:
+            await report(result)
+
+    await asyncio.gather(*(run(index) for index in range(len(chunks))))
+    return results
+
+
+# ============================
+# GET BALANCE
+# ============================
+def get_celcom_balance():
+    """Account balance from the configured provider."""
+    return get_provider().balance()
 
-        return data
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Exception fetching balance: {str(e)}")
-        return {"status": "error", "message": str(e)}
+async def aget_celcom_balance():
+    return await get_provider().abalance()
@@ -1,14 +1,38 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views import View
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
-from .models import Category, Contact, SMSLog
+from django.http import JsonResponse, HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from .models import Contact, SMSLog, SMSJob, ImportJob, Segment
 from .forms import UploadContactsForm
-import openpyxl
 import json
-from .utils import send_sms, get_celcom_balance
+import logging
+from .balance import aget_cached_balance, get_cached_balance
+from .circuit import get_circuit_state
+from .cache import (
+    get_categories, get_contacts_version, get_contacts_payload, get_log_page_payload, get_logs_version,
+    params_digest,
+)
+from .jobs import enqueue_sms, retry_failed
+from .importer import enqueue_import
+from .phone import normalize_recipients
+from .dlr import get_buffer, parse_reports
+from .logs import get_log_page, log_as_dict
+from .search import search_contacts, search_logs
+from .audience import resolve_segment, segment_counts
+from .regions import get_region_lookup
+from .exports import contact_rows, export_response, sms_log_rows, sms_recipient_rows
+from .metrics import render_prometheus
 from django.contrib import messages  # <-- add this
 
+logger = logging.getLogger(__name__)
+
 
 # ==========================
 # Admin-only mixin
@@ -24,10 +48,27 @@ class AdminRequiredMixin(UserPassesTestMixin):
         })
 
 
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """
+    LoginRequiredMixin for views with async handlers. The user is loaded with
+    request.auser() (no sync DB access on the event loop), then test_func()
+    is checked if the view defines one.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        test_func = getattr(self, 'test_func', None)
+        if test_func and not test_func():
+            return self.handle_no_permission()
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+
+
 # ==========================
 # Celcom Balance View (Admin-only)
 # ==========================
-class CheckBalanceView(LoginRequiredMixin, UserPassesTestMixin, View):
+class CheckBalanceView(AsyncLoginRequiredMixin, View):
     """Admin-only view to check Celcom balance."""
     
     login_url = '/accounts/login/'  # redirect if not logged in
@@ -39,8 +80,8 @@ class CheckBalanceView(LoginRequiredMixin, UserPassesTestMixin, View):
         messages.error(self.request, "Admin access required.")
         return redirect('/')  # fallback for non-admin
 
-    def get(self, request, *args, **kwargs):
-        balance = get_celcom_balance()
+    async def get(self, request, *args, **kwargs):
+        balance = await aget_cached_balance(wait_if_missing=True)
         messages.info(request, f"Current Celcom Balance: {balance}")
         return redirect('smsapp:dashboard')  # redirect back to dashboard
 
@@ -50,27 +91,71 @@ class CheckBalanceView(LoginRequiredMixin, UserPassesTestMixin, View):
 # ==========================
 class GetPastorsView(LoginRequiredMixin, View):
     """Return JSON of contacts for a given category."""
-    
-    def get(self, request, *args, **kwargs):
-        category_param = request.GET.get('category')  # e.g., "Regional", "Subregional", "Pastor"
+
+    # Output key -> ORM lookup. Category name comes from a JOIN, not a query per row.
+    FIELDS = {
+        'id': 'id',
+        'name': 'name',
+        'phone': 'phone',
+        'region': 'region__name',
+        'subregion': 'subregion__name',
+        'category': 'category__name',
+    }
+
+    def get_fields(self):
+        """Fields requested via ?fields=name,phone (defaults to all)."""
+        requested = [f.strip() for f in self.request.GET.get('fields', '').split(',') if f.strip()]
+        fields = [f for f in requested if f in self.FIELDS]
+        return fields or list(self.FIELDS)
+
+    def get_params(self):
+        """Query parameters that shape the response (used for cache keys/ETags)."""
+        return {
+            'category': (self.request.GET.get('category') or '').lower(),
+            'region': (self.request.GET.get('region') or '').lower(),
+            'subregion': (self.request.GET.get('subregion') or '').lower(),
+            'fields': ','.join(self.get_fields()),
+        }
+
+    def get_etag(self, params):
+        return f'"contacts-{get_contacts_version()}-{params_digest(params)}"'
+
+    def build_payload(self):
+        category_param = self.request.GET.get('category')  # e.g., "Regional", "Subregional", "Pastor"
+        region = self.request.GET.get('region')
+        subregion = self.request.GET.get('subregion')
         contacts = Contact.objects.all()
-        
+
         if category_param:
             contacts = contacts.filter(category__name__iexact=category_param)
+        # Names resolve to ids in memory, so these are plain indexed FK filters
+        lookup = get_region_lookup()
+        region_id = None
+        if region:
+            region_id = lookup.region_id(region)
+            contacts = contacts.filter(region_id=region_id) if region_id else contacts.none()
+        if subregion:
+            contacts = contacts.filter(subregion_id__in=lookup.subregion_ids(subregion, region_id))
 
-        data = [
-            {
-                'id': c.id,
-                'name': c.name,
-                'phone': c.phone,
-                'region': c.region,
-                'subregion': c.subregion,
-                'category': c.category.name
-            }
-            for c in contacts
-        ]
+        fields = self.get_fields()
+        rows = contacts.values_list(*(self.FIELDS[f] for f in fields))
+        data = [dict(zip(fields, row)) for row in rows]
+
+        return json.dumps({'pastors': data}, cls=DjangoJSONEncoder).encode()
+
+    def get(self, request, *args, **kwargs):
+        params = self.get_params()
+        etag = self.get_etag(params)
 
-        return JsonResponse({'pastors': data})
+        # If-None-Match matched: 304 without touching the database
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            payload = get_contacts_payload(params, self.build_payload)
+            response = HttpResponse(payload, content_type='application/json')
+        response['ETag'] = etag
+        # Browsers keep the body and revalidate with the ETag on each tab click
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
 
 # ==========================
@@ -78,35 +163,58 @@ class GetPastorsView(LoginRequiredMixin, View):
 # ==========================
 
 
-class DashboardView(LoginRequiredMixin, View):
+class DashboardView(AsyncLoginRequiredMixin, View):
     template_name = "smsapp/dashboard.html"
 
-    def get(self, request):
+    async def get(self, request):
+        return await sync_to_async(self.render_dashboard)(request)
+
+    def render_dashboard(self, request):
         """
         Display the dashboard with categories, SMS logs, and optionally Celcom balance.
         """
-        categories = Category.objects.all()
+        categories = get_categories()
+        segments = list(Segment.objects.all())
+        counts = segment_counts(segments)
+        for segment in segments:
+            segment.recipient_count = counts[segment.pk]
         context = {
             "categories": categories,
-            "sms_logs": SMSLog.objects.order_by('-sent_at')[:20]  # visible to all users
+            "segments": segments,
+            # Lazy: only evaluated when the cached fragment has expired
+            "sms_logs": SMSLog.objects.select_related('sender').order_by('-sent_at', '-id')[:20],  # visible to all users
+            "logs_version": get_logs_version(),
+            "fragment_timeout": settings.DASHBOARD_CACHE_TIMEOUT,
         }
 
-        # Celcom balance — only staff
+        # Celcom balance — only staff (cached, refreshed in the background)
         if request.user.is_staff:
-            context["celcom_balance"] = get_celcom_balance()
+            context["celcom_balance"] = get_cached_balance()
+            context["celcom_circuit"] = get_circuit_state()
 
         return render(request, self.template_name, context)
 
-    def post(self, request):
+    async def post(self, request):
     # Detect JSON
         try:
             data = json.loads(request.body)
             category = data.get("category")
             message = data.get("message", "").strip()
             recipients = data.get("recipients", [])
+            segment_id = data.get("segment")
         except json.JSONDecodeError:
             return JsonResponse({"status": "error", "message": "Invalid request data"}, status=400)
 
+    # A saved segment replaces the client-side recipient list
+        if segment_id:
+            segment = await Segment.objects.filter(pk=segment_id).afirst() if str(segment_id).isdigit() else None
+            if segment is None:
+                return JsonResponse({"status": "error", "message": "Unknown audience segment."}, status=404)
+            category = category or segment.name
+            recipients = await sync_to_async(resolve_segment)(segment)
+            if not recipients:
+                return JsonResponse({"status": "error", "message": "This segment has no contacts."})
+
     # Validation
         if not category:
             return JsonResponse({"status": "error", "message": "Please select a category."})
@@ -115,24 +223,248 @@ class DashboardView(LoginRequiredMixin, View):
         if not message:
             return JsonResponse({"status": "error", "message": "Message cannot be empty."})
 
-    # Send SMS
+        recipients, invalid = normalize_recipients(recipients)
+        if not recipients:
+            return JsonResponse({"status": "error", "message": "None of the selected phone numbers are valid."})
+
+    # Queue SMS for the background worker
         sender_id = "BELOVEDCHKE"
-        result = send_sms(message, recipients, sender_id)
-
-    # Log SMS
-        SMSLog.objects.create(
-            sender=request.user,
-            message=message,
-            recipients=", ".join(recipients),
-            status=result.get("status", "unknown")
-        )
+        job = await sync_to_async(enqueue_sms)(request.user, message, recipients, category=category, sender_id=sender_id)
 
+        reply = f"SMS queued for {job.total} recipient(s)."
+        if invalid:
+            reply += f" {len(invalid)} invalid number(s) skipped."
         return JsonResponse({
-            "status": result.get("status", "unknown"),
-            "message": result.get("message", "SMS sent successfully")
+            "status": "queued",
+            "job_id": job.pk,
+            "message": reply
+        }, status=202)
+
+
+# ==========================
+# Audience Segments
+# ==========================
+class SegmentListView(LoginRequiredMixin, View):
+    """Saved segments with their (cached) recipient counts."""
+
+    def get(self, request, *args, **kwargs):
+        segments = list(Segment.objects.select_related('region', 'subregion').prefetch_related('categories'))
+        counts = segment_counts(segments)
+        return JsonResponse({"segments": [
+            {
+                "id": segment.pk,
+                "name": segment.name,
+                "categories": [c.name for c in segment.categories.all()],
+                "region": segment.region.name if segment.region else "",
+                "subregion": segment.subregion.name if segment.subregion else "",
+                "recipient_count": counts[segment.pk],
+            }
+            for segment in segments
+        ]})
+
+
+# ==========================
+# SMS Log Browsing (keyset paginated)
+# ==========================
+class SMSLogListView(LoginRequiredMixin, View):
+    """JSON page of SMS logs; pass `next_cursor` back as ?cursor= for older rows."""
+
+    def build_payload(self):
+        page = get_log_page(self.request.GET)
+        return json.dumps({
+            "logs": [log_as_dict(log) for log in page["logs"]],
+            "next_cursor": page["next_cursor"],
+        }, cls=DjangoJSONEncoder).encode()
+
+    def get(self, request, *args, **kwargs):
+        payload = get_log_page_payload(request.GET.dict(), self.build_payload)
+        return HttpResponse(payload, content_type='application/json')
+
+
+class SearchView(LoginRequiredMixin, View):
+    """
+    Full-text search: ?q=...&type=contacts|logs (both by default)&limit=20.
+    """
+    MAX_LIMIT = 100
+
+    def get(self, request, *args, **kwargs):
+        term = (request.GET.get('q') or '').strip()
+        if not term:
+            return JsonResponse({"status": "error", "message": "Missing search term."}, status=400)
+        try:
+            limit = min(self.MAX_LIMIT, max(1, int(request.GET.get('limit') or 20)))
+        except ValueError:
+            limit = 20
+
+        kind = request.GET.get('type')
+        data = {"query": term}
+        if kind in (None, '', 'contacts'):
+            contacts = search_contacts(Contact.objects.all(), term).order_by('name', 'id')
+            data["contacts"] = [
+                {"id": pk, "name": name, "phone": phone, "category": category}
+                for pk, name, phone, category in contacts.values_list('id', 'name', 'phone', 'category__name')[:limit]
+            ]
+        if kind in (None, '', 'logs'):
+            logs = search_logs(SMSLog.objects.select_related('sender'), term).order_by('-sent_at', '-id')
+            data["logs"] = [log_as_dict(log) for log in logs[:limit]]
+        return JsonResponse(data)
+
+
+class SMSLogPageView(LoginRequiredMixin, View):
+    """HTML page for browsing the full SMS history with filters."""
+    template_name = "smsapp/sms_logs.html"
+
+    def get(self, request, *args, **kwargs):
+        page = get_log_page(request.GET)
+        filters = request.GET.copy()
+        filters.pop("cursor", None)
+        return render(request, self.template_name, {
+            "sms_logs": page["logs"],
+            "next_cursor": page["next_cursor"],
+            "filters": filters,
+            "filter_query": filters.urlencode(),
         })
 
 
+# ==========================
+# Streaming Exports (Admin-only)
+# ==========================
+class ExportSMSLogsView(LoginRequiredMixin, AdminRequiredMixin, View):
+    """
+    Download SMS history as ?format=csv (default) or xlsx. Accepts the same
+    filters as the log page; ?detail=recipients gives one row per number.
+    """
+    login_url = '/accounts/login/'
+
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('detail') == 'recipients':
+            header, rows = sms_recipient_rows(request.GET)
+            filename = "sms_recipients"
+        else:
+            header, rows = sms_log_rows(request.GET)
+            filename = "sms_logs"
+        return export_response(request, filename, header, rows)
+
+
+class ExportContactsView(LoginRequiredMixin, AdminRequiredMixin, View):
+    """Download the contact book as ?format=csv (default) or xlsx."""
+    login_url = '/accounts/login/'
+
+    def get(self, request, *args, **kwargs):
+        header, rows = contact_rows(request.GET)
+        return export_response(request, "contacts", header, rows)
+
+
+# ==========================
+# SMS Job Status (polled by dashboard)
+# ==========================
+class SMSJobStatusView(LoginRequiredMixin, View):
+    """Return progress of a queued broadcast as JSON."""
+
+    def get(self, request, pk, *args, **kwargs):
+        jobs = SMSJob.objects.all()
+        if not request.user.is_staff:
+            jobs = jobs.filter(created_by=request.user)
+
+        job = jobs.filter(pk=pk).first()
+        if job is None:
+            return JsonResponse({"status": "error", "message": "Job not found."}, status=404)
+
+        return JsonResponse({"job": job.as_dict()})
+
+
+class RetrySMSJobView(LoginRequiredMixin, View):
+    """Re-queue only the failed recipients of a finished broadcast."""
+
+    def post(self, request, pk, *args, **kwargs):
+        jobs = SMSJob.objects.all()
+        if not request.user.is_staff:
+            jobs = jobs.filter(created_by=request.user)
+
+        job = jobs.filter(pk=pk).first()
+        if job is None:
+            return JsonResponse({"status": "error", "message": "Job not found."}, status=404)
+
+        failed = job.failed
+        if not retry_failed(job):
+            return JsonResponse({"status": "error", "message": "This job has no failed recipients to resend."})
+
+        return JsonResponse({
+            "status": "queued",
+            "job_id": job.pk,
+            "message": f"Resending to {failed} failed recipient(s)."
+        }, status=202)
+
+
+
+# ==========================
+# Celcom Delivery Report Webhook
+# ==========================
+@method_decorator(csrf_exempt, name='dispatch')
+class DeliveryReportView(View):
+    """
+    Receive Celcom delivery reports (one or many per call, JSON, form or
+    query string). Reports are buffered and applied in bulk; see smsapp.dlr.
+    """
+
+    def authorized(self, request):
+        expected = settings.CELCOM_DLR_TOKEN
+        if not expected:
+            # Fail closed: without a secret anyone could mark messages delivered
+            logger.error("Delivery report rejected: CELCOM_DLR_TOKEN is not configured")
+            return False
+        supplied = request.headers.get('X-DLR-Token') or request.GET.get('token', '')
+        return constant_time_compare(supplied, expected)
+
+    def parse(self, request):
+        if request.method == 'GET':
+            return request.GET.dict()
+        if request.content_type == 'application/json':
+            return json.loads(request.body or b'{}')
+        return request.POST.dict()
+
+    def handle(self, request):
+        if not self.authorized(request):
+            return JsonResponse({"status": "error", "message": "Invalid token."}, status=403)
+
+        try:
+            reports = parse_reports(self.parse(request))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return JsonResponse({"status": "error", "message": "Invalid request data"}, status=400)
+
+        accepted = get_buffer().add(reports)
+        return JsonResponse({"status": "ok", "accepted": accepted})
+
+    def get(self, request, *args, **kwargs):
+        return self.handle(request)
+
+    def post(self, request, *args, **kwargs):
+        return self.handle(request)
+
+
+# ==========================
+# Prometheus Metrics
+# ==========================
+class MetricsView(View):
+    """
+    Prometheus text exposition of this process's metrics. Open to staff
+    sessions, or to scrapers sending `Authorization: Bearer <METRICS_TOKEN>`.
+    """
+
+    def authorized(self, request):
+        expected = settings.METRICS_TOKEN
+        auth = request.headers.get('Authorization', '')
+        if expected and auth.startswith('Bearer ') and constant_time_compare(auth[7:], expected):
+            return True
+        return request.user.is_authenticated and request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        if not self.authorized(request):
+            return JsonResponse({"status": "error", "message": "Admin access required."}, status=403)
+        response = HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+        patch_cache_control(response, no_store=True)
+        return response
+
 
 # ==========================
 # Upload Contacts (Admin-only)
@@ -147,40 +479,36 @@ class UploadContactsView(LoginRequiredMixin, AdminRequiredMixin, View):
 
     def post(self, request):
         form = UploadContactsForm(request.POST, request.FILES)
-        message = error = None
+        message = error = import_job = None
 
         if form.is_valid():
-            excel_file = request.FILES['excel_file']
-            try:
-                wb = openpyxl.load_workbook(excel_file)
-                sheet = wb.active
-                added_count = 0
-
-                for row in sheet.iter_rows(min_row=2, values_only=True):
-                    if row[0] and row[1] and row[2]:
-                        name, phone, category_name = row[:3]
-                        region = row[3] if len(row) > 3 else None
-                        subregion = row[4] if len(row) > 4 else None
-
-                        category, _ = Category.objects.get_or_create(name=category_name.strip())
-                        Contact.objects.create(
-                            name=name.strip(),
-                            phone=str(phone).strip(),
-                            category=category,
-                            region=region.strip() if region else None,
-                            subregion=subregion.strip() if subregion else None
-                        )
-                        added_count += 1
-
-                message = f"{added_count} contacts uploaded successfully!"
-
-            except Exception as e:
-                error = f"Error processing file: {str(e)}"
+            # Parsing happens in `process_import_jobs`; the request returns at once
+            import_job = enqueue_import(request.user, request.FILES['excel_file'])
+            message = f"Upload received. Importing contacts (job #{import_job.pk})..."
         else:
             error = "Invalid file. Please upload a valid Excel (.xlsx) file."
 
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            if error:
+                return JsonResponse({"status": "error", "message": error}, status=400)
+            return JsonResponse({"status": "queued", "job_id": import_job.pk, "message": message}, status=202)
+
         return render(
             request,
             self.template_name,
-            {"form": form, "message": message, "error": error}
+            {"form": form, "message": message, "error": error, "import_job": import_job}
         )
+
+
+# ==========================
+# Import Job Progress (Admin-only)
+# ==========================
+class ImportJobStatusView(LoginRequiredMixin, AdminRequiredMixin, View):
+    """Return row counts of a contact import as JSON."""
+    login_url = '/accounts/login/'
+
+    def get(self, request, pk, *args, **kwargs):
+        job = ImportJob.objects.filter(pk=pk).first()
+        if job is None:
+            return JsonResponse({"status": "error", "message": "Import job not found."}, status=404)
+        return JsonResponse({"job": job.as_dict()})